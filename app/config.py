@@ -25,14 +25,125 @@ class Settings(BaseSettings):
     frontend_url: str = "http://localhost:5173"
     
     # RAG parameters
-    chunk_size: int = 1000
-    chunk_overlap: int = 200
+    chunk_size: int = 256      # tokens (tokenizer_encoding)
+    chunk_overlap: int = 48    # tokens repeated between consecutive chunks
     top_k_results: int = 5
+    max_context_tokens: int = 2000     # prompt budget for retrieved passages (headers included)
+    
+    # Document extraction: large PDFs are parsed by a process pool in page ranges
+    pdf_workers: int = 0                # 0 = one per CPU
+    pdf_parallel_min_pages: int = 32    # smaller PDFs are parsed in-process
+    pdf_pages_per_task: int = 8
+    upload_spool_dir: str = ""          # where uploads are spooled to disk ("" = system temp dir)
+    
+    # Background ingestion jobs (POST /ingest/jobs)
+    ingest_job_workers: int = 2            # concurrent jobs per API process (0 = don't run jobs here)
+    ingest_job_dir: str = "ingest_jobs"    # spooled uploads waiting for a worker; must survive restarts
+    ingest_job_poll_seconds: float = 2.0
+    ingest_job_heartbeat_seconds: int = 15
+    ingest_job_stale_seconds: int = 120    # running jobs without a heartbeat this long are resumed
+    ingest_job_max_attempts: int = 3
+    
+    # Embedding pipeline (ingestion)
+    tokenizer_encoding: str = "cl100k_base"
+    embedding_batch_max_tokens: int = 20000  # per embeddings.create call (API limit: 300k)
+    embedding_batch_max_inputs: int = 512    # per embeddings.create call (API limit: 2048)
+    embedding_concurrency: int = 4           # batches in flight at once
+    embedding_max_retries: int = 6
+    embedding_retry_base_delay: float = 1.0
+    embedding_retry_max_delay: float = 60.0
+    
+    # Vector storage / search backend
+    # "memory": JSON column + in-process NumPy index
+    # "pgvector": native vector column, nearest-neighbour search inside PostgreSQL
+    vector_backend: str = "memory"
+    embedding_dimensions: int = 1536
+    # Column encoding for the memory backend: "json", "float32", "float16" or "int8" (BYTEA)
+    embedding_codec: str = "json"
+    vector_index_refresh_seconds: int = 30  # how often to check for changes made by other workers
+    # Approximate search for large corpora (memory backend): from VECTOR_ANN_MIN_VECTORS chunks on,
+    # vectors are clustered by k-means (IVF) and a query scores only its VECTOR_ANN_NPROBE nearest
+    # clusters; more probes = higher recall, slower queries. VECTOR_ANN_LISTS=0 uses sqrt(N) clusters.
+    # Off by default (exact search); 96 probes keep recall@10 >= 0.95 in benchmarks/bench_ann_recall.py.
+    vector_ann_enabled: bool = False
+    vector_ann_min_vectors: int = 50000
+    vector_ann_lists: int = 0
+    vector_ann_nprobe: int = 96
+    vector_ann_path: str = "vector_index.ivf.npz"  # trained clusters, reused across restarts
+    # Memory-mapped snapshot of the index, written after every change: workers open it with
+    # np.memmap (shared page cache, near-instant startup) and swap to newer versions
+    vector_snapshot_enabled: bool = True
+    vector_snapshot_dir: str = "vector_snapshot"
+    
+    # Hybrid retrieval: vector and lexical (BM25 in memory / PostgreSQL full-text
+    # with pgvector) rankings merged by weighted reciprocal rank fusion
+    hybrid_search_enabled: bool = True
+    hybrid_vector_weight: float = 1.0
+    hybrid_lexical_weight: float = 1.0
+    hybrid_candidates: int = 50        # candidates taken from each ranking before fusion
+    rrf_k: int = 60                    # RRF damping constant: score = sum(w / (rrf_k + rank))
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    fulltext_language: str = "english"  # PostgreSQL text search configuration
+    
+    # Query-embedding cache: "memory" (per worker), "sqlite" or "postgres" (shared), "none"
+    embedding_cache_backend: str = "memory"
+    embedding_cache_max_entries: int = 10000
+    embedding_cache_ttl_seconds: int = 86400
+    embedding_cache_sqlite_path: str = "embedding_cache.sqlite3"
+    
+    # JSON Q&A datasets: one chunk per entry, embedded by its question. A question this
+    # similar to an entry's question is answered with the stored answer (no completion)
+    qa_structured_ingest: bool = True
+    qa_direct_answer_enabled: bool = True
+    qa_direct_answer_threshold: float = 0.92
+    
+    # FAQ fast path: known Q&A questions answered before embedding/retrieval, by normalized
+    # text or by a MinHash (character trigram) near-duplicate with at least this Jaccard similarity
+    faq_fast_path_enabled: bool = True
+    faq_near_duplicate_threshold: float = 0.85
+    faq_minhash_permutations: int = 64
+    faq_minhash_bands: int = 16
+    
+    # Semantic answer cache (keyed on retrieved chunk ids + question similarity)
+    answer_cache_enabled: bool = True
+    answer_cache_max_entries: int = 5000
+    answer_cache_ttl_seconds: int = 3600
+    answer_cache_similarity_threshold: float = 0.95
+    
+    # Observability: Prometheus metrics on GET /metrics, per-stage Server-Timing response headers
+    metrics_enabled: bool = True
+    server_timing_enabled: bool = False
+    
+    # POST /chat/batch
+    chat_batch_max_questions: int = 500
+    chat_batch_concurrency: int = 8        # completions in flight at once per batch
+    
+    # Conversation sessions (ChatRequest.session_id): per-worker LRU, persisted to chat_sessions
+    session_max_entries: int = 10000       # sessions kept in memory per process
+    session_ttl_seconds: int = 86400       # idle sessions expire after this long
+    session_persist: bool = True           # write through to PostgreSQL so any worker can continue a session
+    session_max_turns: int = 20            # stored messages per session (oldest dropped first)
+    session_history_max_tokens: int = 1000 # prompt budget for previous turns
+    session_warm_weight: float = 0.5       # fusion weight of the previous answer's sources
+    
+    # pgvector ANN index ("ivfflat" or "hnsw") and query-time recall knobs
+    pgvector_index_type: str = "ivfflat"
+    ivfflat_lists: int = 100
+    ivfflat_probes: int = 10
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    hnsw_ef_search: int = 40
     
     class Config:
         env_file = ".env"
         case_sensitive = False
     
+    @property
+    def use_pgvector(self) -> bool:
+        """Whether embeddings are stored and searched with pgvector."""
+        return self.vector_backend.lower() == "pgvector"
+    
     @property
     def database_url(self) -> str:
         """Build PostgreSQL connection URL."""
@@ -40,6 +151,11 @@ class Settings(BaseSettings):
             f"postgresql://{self.postgres_user}:{self.postgres_password}"
             f"@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
         )
+    
+    @property
+    def async_database_url(self) -> str:
+        """Build PostgreSQL connection URL for the asyncpg driver."""
+        return self.database_url.replace("postgresql://", "postgresql+asyncpg://", 1)
 
 
 @lru_cache()
@@ -1,11 +1,13 @@
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from typing import AsyncIterator
 from app.config import get_settings
 
 settings = get_settings()
 
-# Create SQLAlchemy engine
+# Create SQLAlchemy engine (scripts, schema setup and shared caches)
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
@@ -15,21 +17,66 @@ engine = create_engine(
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by the request path
+async_engine = create_async_engine(
+    settings.async_database_url,
+    pool_pre_ping=True,
+    echo=False
+)
+
+# Async session factory
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Base class for models
 Base = declarative_base()
 
 
-def get_db():
-    """Dependency to get database session."""
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """Dependency to get an async database session."""
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def vector_index_ddl() -> str:
+    """CREATE INDEX statement for the configured pgvector ANN index."""
+    if settings.pgvector_index_type.lower() == "hnsw":
+        return (
+            "CREATE INDEX IF NOT EXISTS document_chunks_embedding_hnsw_idx "
+            "ON document_chunks USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {int(settings.hnsw_m)}, ef_construction = {int(settings.hnsw_ef_construction)})"
+        )
+    return (
+        "CREATE INDEX IF NOT EXISTS document_chunks_embedding_idx "
+        "ON document_chunks USING ivfflat (embedding vector_cosine_ops) "
+        f"WITH (lists = {int(settings.ivfflat_lists)})"
+    )
+
+
+def fulltext_index_ddl() -> str:
+    """GIN expression index used by hybrid retrieval's full-text ranking (pgvector backend)."""
+    return (
+        "CREATE INDEX IF NOT EXISTS document_chunks_fts_idx "
+        "ON document_chunks USING gin "
+        f"(to_tsvector('{settings.fulltext_language}'::regconfig, chunk_text))"
+    )
 
 
 def init_db():
     """Initialize database tables."""
+    if settings.use_pgvector:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    
     Base.metadata.create_all(bind=engine)
     
-    # Note: Not using pgvector extension - embeddings stored as JSONB
+    if settings.use_pgvector:
+        with engine.begin() as conn:
+            conn.execute(text(vector_index_ddl()))
+            if settings.hybrid_search_enabled:
+                conn.execute(text(fulltext_index_ddl()))
+    # Otherwise embeddings are stored as JSON and searched in-process (see services/vector_index.py)
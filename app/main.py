@@ -1,11 +1,20 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from datetime import datetime
 from app.config import get_settings
-from app.database import init_db, get_db, engine
+from app.database import init_db, async_engine, AsyncSessionLocal
 from app.schemas import HealthResponse
 from app.routers import ingest, chat
+from app.services.document_processor import shutdown_pdf_pools
+from app.services.faq_index import get_faq_index
+from app.services.jobs import get_job_queue
+from app.services.lexical_index import get_lexical_index
+from app.services.metrics import get_metrics, server_timing_header, start_request_timings
+from app.services.vector_index import get_vector_index
 from sqlalchemy import text
+import asyncio
+import time
 
 settings = get_settings()
 
@@ -25,6 +34,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Record request latency and, if enabled, report stage timings in a Server-Timing header."""
+    if not (settings.metrics_enabled or settings.server_timing_enabled):
+        return await call_next(request)
+    
+    started = time.perf_counter()
+    timings = start_request_timings()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+    
+    if settings.metrics_enabled:
+        # Route templates (not raw paths) keep label cardinality bounded
+        route = request.scope.get("route")
+        get_metrics().request_seconds.observe(
+            elapsed,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=response.status_code
+        )
+    if settings.server_timing_enabled:
+        response.headers["Server-Timing"] = server_timing_header(timings, elapsed)
+    return response
+
+
 # Include routers
 app.include_router(ingest.router)
 app.include_router(chat.router)
@@ -32,10 +67,41 @@ app.include_router(chat.router)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup."""
+    """Initialize database, load the vector and FAQ indexes and start ingestion job workers."""
     print("Initializing database...")
-    init_db()
+    await asyncio.to_thread(init_db)
     print("Database initialized successfully!")
+    
+    if settings.use_pgvector:
+        print(f"Using pgvector {settings.pgvector_index_type} index for similarity search")
+    else:
+        print("Loading vector index...")
+        async with AsyncSessionLocal() as db:
+            count = await get_vector_index().load(db)
+        print(f"Vector index loaded with {count} chunks")
+        if settings.hybrid_search_enabled:
+            async with AsyncSessionLocal() as db:
+                count = await get_lexical_index().load(db)
+            print(f"Lexical index loaded with {count} chunks")
+    
+    faq_index = get_faq_index()
+    if faq_index is not None:
+        async with AsyncSessionLocal() as db:
+            count = await faq_index.load(db)
+        print(f"FAQ index loaded with {count} questions")
+    
+    if settings.ingest_job_workers > 0:
+        get_job_queue().start(settings.ingest_job_workers)
+        print(f"Started {settings.ingest_job_workers} ingestion job workers")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop ingestion job workers and PDF extraction worker processes, and save the IVF index."""
+    await get_job_queue().stop()
+    await asyncio.to_thread(shutdown_pdf_pools)
+    if not settings.use_pgvector:
+        await get_vector_index().save()
 
 
 @app.get("/", tags=["root"])
@@ -48,14 +114,24 @@ async def root():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse, tags=["health"])
+async def metrics():
+    """Prometheus metrics: stage latency histograms, OpenAI token counters, cache hit ratios."""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    # Cache sizes may come from the database (shared embedding cache)
+    body = await asyncio.to_thread(get_metrics().render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health", response_model=HealthResponse, tags=["health"])
 async def health_check():
     """Health check endpoint."""
     # Check database connection
     db_connected = False
     try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
         db_connected = True
     except Exception:
         pass
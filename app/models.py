@@ -1,6 +1,22 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Float, LargeBinary
+from datetime import datetime, timezone
+from typing import Optional
 from sqlalchemy.sql import func
 from app.database import Base
+from app.config import get_settings
+from app.vector_codec import EncodedVector
+
+settings = get_settings()
+
+
+def embedding_column_type():
+    """Column type for chunk embeddings, depending on the configured vector backend."""
+    if settings.use_pgvector:
+        from pgvector.sqlalchemy import Vector
+        return Vector(settings.embedding_dimensions)
+    if settings.embedding_codec.lower() != "json":
+        return EncodedVector(settings.embedding_codec)  # BYTEA, decoded with np.frombuffer
+    return JSON  # Stored as JSON array (no pgvector needed)
 
 
 class DocumentChunk(Base):
@@ -12,9 +28,88 @@ class DocumentChunk(Base):
     document_name = Column(String(255), nullable=False, index=True)
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
-    embedding = Column(JSON)  # Stored as JSONB array (no pgvector needed)
+    content_hash = Column(String(64), index=True)  # sha256 of the embedded text (chunk_text, or a Q&A entry's question)
+    document_hash = Column(String(64))  # sha256 of the uploaded file
+    embedding = Column(embedding_column_type())
     doc_metadata = Column("metadata", JSON)  # Renamed to avoid conflict with SQLAlchemy
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     def __repr__(self):
         return f"<DocumentChunk(id={self.id}, document={self.document_name}, chunk={self.chunk_index})>"
+
+
+class ChunkEmbedding(Base):
+    """Embedding store keyed by chunk content, so unchanged text is never re-embedded."""
+    
+    __tablename__ = "chunk_embeddings"
+    
+    content_hash = Column(String(64), primary_key=True)  # sha256 of chunk_text
+    model = Column(String(100), primary_key=True)
+    embedding = Column(embedding_column_type(), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class EmbeddingCacheEntry(Base):
+    """Shared query-embedding cache entry (used by the sqlite/postgres cache backends)."""
+    
+    __tablename__ = "embedding_cache"
+    
+    key = Column(String(64), primary_key=True)  # sha256 of model + normalized question
+    embedding = Column(LargeBinary, nullable=False)  # raw float32 bytes
+    created_at = Column(Float, nullable=False)
+    accessed_at = Column(Float, nullable=False, index=True)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """SQLite returns naive datetimes; every timestamp here is stored in UTC."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class IngestJob(Base):
+    """Queued document ingestion, worked by background workers (see services/jobs.py)."""
+    
+    __tablename__ = "ingest_jobs"
+    
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    document_name = Column(String(255), nullable=False, index=True)
+    file_path = Column(Text, nullable=False)  # spooled upload, removed when the job ends
+    document_hash = Column(String(64))
+    status = Column(String(16), nullable=False, index=True, default="queued")  # queued/running/done/failed
+    stage = Column(String(16), nullable=False, default="queued")  # + extracting/embedding/storing
+    chunks_total = Column(Integer, nullable=False, default=0)
+    chunks_to_embed = Column(Integer, nullable=False, default=0)
+    chunks_embedded = Column(Integer, nullable=False, default=0)
+    chunks_reused = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String(64))
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow, index=True)
+    started_at = Column(DateTime(timezone=True))
+    stage_started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    
+    def __repr__(self):
+        return f"<IngestJob(id={self.id}, document={self.document_name}, status={self.status})>"
+
+
+class ChatSession(Base):
+    """Conversation history for multi-turn chat (see services/sessions.py)."""
+    
+    __tablename__ = "chat_sessions"
+    
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    turns = Column(JSON, nullable=False)  # [{"role": "user"|"assistant", "content": ...}], oldest first
+    chunk_ids = Column(JSON, nullable=False)  # sources of the last answer, reused as warm candidates
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utcnow)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utcnow, index=True)
+    
+    def __repr__(self):
+        return f"<ChatSession(id={self.id}, turns={len(self.turns or [])})>"
@@ -1,63 +1,245 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from typing import List, Optional, Tuple, Union
+import asyncio
+import json
+import time
 from app.database import get_db
-from app.schemas import ChatRequest, ChatResponse, SourceChunk
+from app.schemas import (
+    BatchChatRequest,
+    BatchChatResponse,
+    BatchChatResult,
+    ChatMessage,
+    ChatRequest,
+    ChatResponse,
+    SessionResponse,
+    SourceChunk
+)
+from app.models import DocumentChunk
 from app.services.retrieval import RetrievalService
-from app.services.chat import ChatService
+from app.services.chat import ChatService, direct_answer
+from app.services.answer_cache import get_answer_cache
+from app.services.faq_index import get_faq_index
+from app.services.filters import chunk_filters
+from app.services.sessions import Conversation, get_session_store
 from app.config import get_settings
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 settings = get_settings()
 
 
+async def load_conversation(request: ChatRequest) -> Optional[Conversation]:
+    """The session named in the request (None for one-off questions); 404 if unknown or expired."""
+    if not request.session_id:
+        return None
+    conversation = await get_session_store().get(request.session_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired. Start a new one with POST /chat/sessions.")
+    return conversation
+
+
+def request_filters(request: Union[ChatRequest, BatchChatRequest]) -> Optional[dict]:
+    """The request's `filters` as a plain dict (None if absent)."""
+    return request.filters.model_dump(exclude_none=True) if request.filters else None
+
+
+async def faq_answers(
+    db: AsyncSession,
+    questions: List[str],
+    request: Union[ChatRequest, BatchChatRequest]
+) -> List[Optional[Tuple[str, List[Tuple[DocumentChunk, float]]]]]:
+    """
+    Pre-retrieval fast path: for each question, the stored answer of a known
+    Q&A question it matches exactly or near-exactly (within the request's
+    filters) and that entry's chunk as the source, or None to fall through
+    to full RAG. Needs no embedding call.
+    """
+    faq_index = get_faq_index()
+    if faq_index is None:
+        return [None] * len(questions)
+    filters = chunk_filters(request.document_name, request_filters(request))
+    await faq_index.ensure_fresh(db)
+    matches = [faq_index.lookup(question, filters) for question in questions]
+    
+    chunk_ids = {match.entry.chunk_id for match in matches if match is not None}
+    if not chunk_ids:
+        return [None] * len(questions)
+    result = await db.execute(
+        select(DocumentChunk).options(defer(DocumentChunk.embedding)).where(DocumentChunk.id.in_(chunk_ids))
+    )
+    chunks = {chunk.id: chunk for chunk in result.scalars()}
+    # A chunk can be gone if another worker deleted its document since the last refresh
+    return [
+        (match.entry.answer, [(chunks[match.entry.chunk_id], match.similarity)])
+        if match is not None and match.entry.chunk_id in chunks else None
+        for match in matches
+    ]
+
+
+async def retrieve_chunks(
+    request: ChatRequest,
+    db: AsyncSession,
+    conversation: Optional[Conversation] = None
+) -> Tuple[List[float], List[Tuple[DocumentChunk, float]]]:
+    """
+    Embed the question and retrieve its top chunks; 404 if nothing is indexed.
+    
+    In a conversation, the previous question is embedded along with this one
+    and the previous answer's sources are reused as warm candidates.
+    """
+    query = conversation.retrieval_query(request.question) if conversation else request.question
+    retrieval_service = RetrievalService()
+    query_embedding = await retrieval_service.embedding_service.create_embedding(query)
+    chunks_with_scores = await retrieval_service.similarity_search(
+        db=db,
+        query=query,
+        top_k=request.top_k or settings.top_k_results,
+        document_name=request.document_name,
+        query_embedding=query_embedding,
+        warm_chunk_ids=conversation.chunk_ids if conversation else (),
+        filters=request_filters(request)
+    )
+    
+    if not chunks_with_scores:
+        raise HTTPException(
+            status_code=404,
+            detail="No relevant documents found. Please upload petition documents first."
+        )
+    return query_embedding, chunks_with_scores
+
+
+def format_sources(chunks_with_scores: List[Tuple[DocumentChunk, float]]) -> List[SourceChunk]:
+    """Shorten retrieved chunks for the response payload."""
+    return [
+        SourceChunk(
+            chunk_text=chunk.chunk_text[:200] + "..." if len(chunk.chunk_text) > 200 else chunk.chunk_text,
+            document_name=chunk.document_name,
+            chunk_index=chunk.chunk_index,
+            similarity_score=round(score, 4)
+        )
+        for chunk, score in chunks_with_scores
+    ]
+
+
+def cache_answer(
+    query_embedding: List[float],
+    chunks_with_scores: List[Tuple[DocumentChunk, float]],
+    answer: str
+) -> None:
+    """Store a freshly generated answer in the answer cache."""
+    answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        answer_cache.set(
+            [chunk.id for chunk, _ in chunks_with_scores],
+            query_embedding,
+            answer,
+            {chunk.document_name for chunk, _ in chunks_with_scores}
+        )
+
+
+def cached_answer(
+    query_embedding: List[float],
+    chunks_with_scores: List[Tuple[DocumentChunk, float]]
+) -> Optional[str]:
+    """Return a cached answer for the same chunks and a near-identical question, if any."""
+    answer_cache = get_answer_cache()
+    if answer_cache is None:
+        return None
+    return answer_cache.get([chunk.id for chunk, _ in chunks_with_scores], query_embedding)
+
+
+def reusable_answer(
+    query_embedding: List[float],
+    chunks_with_scores: List[Tuple[DocumentChunk, float]]
+) -> Tuple[Optional[str], bool]:
+    """
+    An answer that needs no completion, as (answer, direct): the stored answer
+    of a closely matching Q&A entry (direct), else a cached answer, else None.
+    """
+    answer = direct_answer(chunks_with_scores)
+    if answer is not None:
+        return answer, True
+    return cached_answer(query_embedding, chunks_with_scores), False
+
+
+async def record_exchange(
+    conversation: Optional[Conversation],
+    question: str,
+    answer: str,
+    chunks_with_scores: List[Tuple[DocumentChunk, float]]
+) -> None:
+    """Append a question and its answer to the conversation, if there is one."""
+    if conversation is not None:
+        conversation.add_exchange(question, answer, [chunk.id for chunk, _ in chunks_with_scores])
+        await get_session_store().save(conversation)
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Encode one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @router.post("/", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Answer a question using RAG (Retrieval Augmented Generation).
     
     This endpoint:
-    1. Creates an embedding for the user's question
-    2. Searches for similar chunks in the database
-    3. Uses GPT-4o-mini to generate an answer based on retrieved chunks
+    1. Answers a known Q&A question (exact or near-duplicate text) from the FAQ index
+    2. Otherwise creates an embedding for the user's question
+    3. Searches for similar chunks in the database
+    4. Answers with a Q&A entry's stored answer if its question matches closely
+    5. Reuses a cached answer if a near-identical question hit the same chunks
+    6. Otherwise uses GPT-4o-mini to generate an answer based on retrieved chunks
+    
+    With `session_id`, recent turns of the conversation (within
+    SESSION_HISTORY_MAX_TOKENS) are sent along and the exchange is recorded.
     """
     try:
-        # Retrieve relevant chunks
-        retrieval_service = RetrievalService()
-        chunks_with_scores = retrieval_service.similarity_search(
-            db=db,
-            query=request.question,
-            top_k=request.top_k or settings.top_k_results,
-            document_name=request.document_name
-        )
+        conversation = await load_conversation(request)
+        history = conversation.history() if conversation else None
         
-        if not chunks_with_scores:
-            raise HTTPException(
-                status_code=404,
-                detail="No relevant documents found. Please upload petition documents first."
+        # Known questions skip embedding, retrieval and generation
+        faq_hit = None if history else (await faq_answers(db, [request.question], request))[0]
+        if faq_hit is not None:
+            answer, chunks_with_scores = faq_hit
+            await record_exchange(conversation, request.question, answer, chunks_with_scores)
+            return ChatResponse(
+                answer=answer,
+                sources=format_sources(chunks_with_scores),
+                model=settings.openai_model,
+                direct_answer=True,
+                session_id=conversation.session_id if conversation else None
             )
         
-        # Generate answer
-        chat_service = ChatService()
-        answer = chat_service.generate_answer(request.question, chunks_with_scores)
+        # Retrieve relevant chunks
+        query_embedding, chunks_with_scores = await retrieve_chunks(request, db, conversation)
         
-        # Format sources
-        sources = [
-            SourceChunk(
-                chunk_text=chunk.chunk_text[:200] + "..." if len(chunk.chunk_text) > 200 else chunk.chunk_text,
-                document_name=chunk.document_name,
-                chunk_index=chunk.chunk_index,
-                similarity_score=round(score, 4)
-            )
-            for chunk, score in chunks_with_scores
-        ]
+        # Generate answer (or reuse a stored or cached one); answers that depend on
+        # earlier turns are neither reused nor stored in the cache
+        answer, direct = (None, False) if history else reusable_answer(query_embedding, chunks_with_scores)
+        cached = answer is not None and not direct
+        if answer is None:
+            chat_service = ChatService()
+            answer = await chat_service.generate_answer(request.question, chunks_with_scores, history)
+            if not history:
+                cache_answer(query_embedding, chunks_with_scores, answer)
+        
+        await record_exchange(conversation, request.question, answer, chunks_with_scores)
         
         return ChatResponse(
             answer=answer,
-            sources=sources,
-            model=settings.openai_model
+            sources=format_sources(chunks_with_scores),
+            model=settings.openai_model,
+            cached=cached,
+            direct_answer=direct,
+            session_id=conversation.session_id if conversation else None
         )
     
     except HTTPException:
@@ -66,3 +248,215 @@ async def chat(
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate answer: {str(e)}")
+
+
+@router.post("/stream")
+async def chat_stream(
+    request: ChatRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Answer a question as a stream of Server-Sent Events.
+    
+    Events, in order:
+    - `sources`: retrieved chunks, sent as soon as retrieval finishes
+    - `delta`: completion text fragments as they are generated
+    - `done`: model, cache and direct-answer flags, stage timings (ms) and token usage
+    - `error`: sent instead of `done` if generation fails mid-stream
+    """
+    started = time.perf_counter()
+    try:
+        conversation = await load_conversation(request)
+        history = conversation.history() if conversation else None
+        faq_hit = None if history else (await faq_answers(db, [request.question], request))[0]
+        if faq_hit is not None:
+            query_embedding, chunks_with_scores = None, faq_hit[1]
+        else:
+            query_embedding, chunks_with_scores = await retrieve_chunks(request, db, conversation)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate answer: {str(e)}")
+    retrieval_ms = (time.perf_counter() - started) * 1000
+    
+    async def events():
+        yield sse_event("sources", {
+            "sources": [source.model_dump() for source in format_sources(chunks_with_scores)]
+        })
+        
+        first_token_ms = None
+        usage = None
+        if faq_hit is not None:
+            answer, direct = faq_hit[0], True
+        else:
+            answer, direct = (None, False) if history else reusable_answer(query_embedding, chunks_with_scores)
+        cached = answer is not None and not direct
+        try:
+            if answer is not None:
+                first_token_ms = (time.perf_counter() - started) * 1000
+                yield sse_event("delta", {"content": answer})
+            else:
+                parts = []
+                chat_service = ChatService()
+                async for kind, value in chat_service.stream_answer(request.question, chunks_with_scores, history):
+                    if kind == "delta":
+                        if first_token_ms is None:
+                            first_token_ms = (time.perf_counter() - started) * 1000
+                        parts.append(value)
+                        yield sse_event("delta", {"content": value})
+                    else:
+                        usage = value
+                answer = "".join(parts).strip()
+                if not history:
+                    cache_answer(query_embedding, chunks_with_scores, answer)
+            await record_exchange(conversation, request.question, answer, chunks_with_scores)
+        except Exception as e:
+            yield sse_event("error", {"detail": str(e)})
+            return
+        
+        yield sse_event("done", {
+            "model": settings.openai_model,
+            "cached": cached,
+            "direct_answer": direct,
+            "session_id": conversation.session_id if conversation else None,
+            "timings": {
+                "retrieval_ms": round(retrieval_ms, 1),
+                "first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+                "total_ms": round((time.perf_counter() - started) * 1000, 1)
+            },
+            "usage": usage
+        })
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/batch", response_model=BatchChatResponse)
+async def chat_batch(
+    request: BatchChatRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Answer many questions in one call (evaluation runs, bulk FAQ generation).
+    
+    Known Q&A questions are answered from the FAQ index; the rest are
+    embedded together, retrieved with one matrix-matrix product against the
+    in-memory index, and answered with at most CHAT_BATCH_CONCURRENCY
+    completions in flight. A question that fails gets an `error` instead of
+    failing the batch.
+    """
+    if len(request.questions) > settings.chat_batch_max_questions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.chat_batch_max_questions} questions per batch"
+        )
+    if any(not question.strip() for question in request.questions):
+        raise HTTPException(status_code=400, detail="Questions must not be empty")
+    
+    started = time.perf_counter()
+    try:
+        faq_hits = await faq_answers(db, request.questions, request)
+        misses = [question for question, faq_hit in zip(request.questions, faq_hits) if faq_hit is None]
+        retrieval_service = RetrievalService()
+        miss_embeddings = await retrieval_service.embedding_service.create_query_embeddings(misses) if misses else []
+        embedded = time.perf_counter()
+        miss_chunks = await retrieval_service.similarity_search_batch(
+            db=db,
+            queries=misses,
+            query_embeddings=miss_embeddings,
+            top_k=request.top_k or settings.top_k_results,
+            document_name=request.document_name,
+            filters=request_filters(request)
+        ) if misses else []
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve context: {str(e)}")
+    retrieved = time.perf_counter()
+    
+    chat_service = ChatService()
+    semaphore = asyncio.Semaphore(max(1, settings.chat_batch_concurrency))
+    
+    async def answer(question: str, query_embedding: List[float], chunks_with_scores) -> BatchChatResult:
+        if not chunks_with_scores:
+            return BatchChatResult(question=question, error="No relevant documents found.")
+        result = BatchChatResult(question=question, sources=format_sources(chunks_with_scores))
+        result.answer, result.direct_answer = reusable_answer(query_embedding, chunks_with_scores)
+        result.cached = result.answer is not None and not result.direct_answer
+        if result.answer is not None:
+            return result
+        async with semaphore:
+            generation_started = time.perf_counter()
+            try:
+                result.answer = await chat_service.generate_answer(question, chunks_with_scores)
+            except Exception as e:
+                result.error = str(e)
+                return result
+            result.generation_ms = round((time.perf_counter() - generation_started) * 1000, 1)
+        cache_answer(query_embedding, chunks_with_scores, result.answer)
+        return result
+    
+    def faq_result(question: str, faq_hit) -> BatchChatResult:
+        faq_answer, chunks_with_scores = faq_hit
+        return BatchChatResult(
+            question=question,
+            answer=faq_answer,
+            sources=format_sources(chunks_with_scores),
+            direct_answer=True
+        )
+    
+    miss_results = iter(await asyncio.gather(*[
+        answer(question, query_embedding, chunks_with_scores)
+        for question, query_embedding, chunks_with_scores in zip(misses, miss_embeddings, miss_chunks)
+    ]))
+    results = [
+        faq_result(question, faq_hit) if faq_hit is not None else next(miss_results)
+        for question, faq_hit in zip(request.questions, faq_hits)
+    ]
+    finished = time.perf_counter()
+    
+    return BatchChatResponse(
+        results=results,
+        model=settings.openai_model,
+        timings={
+            "embedding_ms": round((embedded - started) * 1000, 1),
+            "retrieval_ms": round((retrieved - embedded) * 1000, 1),
+            "generation_ms": round((finished - retrieved) * 1000, 1),
+            "total_ms": round((finished - started) * 1000, 1)
+        }
+    )
+
+
+@router.post("/sessions", response_model=SessionResponse, status_code=201)
+async def create_session():
+    """Start a conversation; pass the returned `session_id` with each question."""
+    try:
+        conversation = await get_session_store().create()
+        return SessionResponse(session_id=conversation.session_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create session: {str(e)}")
+
+
+@router.get("/sessions/{session_id}", response_model=SessionResponse)
+async def get_session(session_id: str):
+    """Return the stored history of a conversation."""
+    conversation = await get_session_store().get(session_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return SessionResponse(
+        session_id=conversation.session_id,
+        messages=[ChatMessage(**turn) for turn in conversation.turns]
+    )
+
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Forget a conversation."""
+    if not await get_session_store().delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"success": True, "session_id": session_id}
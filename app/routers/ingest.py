@@ -1,94 +1,158 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from typing import Optional
+import asyncio
+import os
 from app.database import get_db
-from app.schemas import IngestResponse
-from app.models import DocumentChunk
-from app.services.document_processor import DocumentProcessor
-from app.services.embeddings import EmbeddingService
+from app.schemas import IngestJobResponse, IngestResponse
+from app.models import DocumentChunk, IngestJob, as_utc
+from app.services.ingestion import IngestionService, spool_upload
+from app.services.jobs import eta_seconds, get_job_queue
+from app.services.metrics import span
 from app.config import get_settings
 
 router = APIRouter(prefix="/ingest", tags=["ingest"])
 settings = get_settings()
 
+SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.md', '.json']
+
+
+def validate_filename(filename: str) -> None:
+    if not any(filename.lower().endswith(ext) for ext in SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Only PDF, DOCX, MD, and JSON files are supported")
+
+
+def job_response(job: IngestJob) -> IngestJobResponse:
+    return IngestJobResponse(
+        job_id=job.id,
+        document_name=job.document_name,
+        status=job.status,
+        stage=job.stage,
+        chunks_total=job.chunks_total,
+        chunks_to_embed=job.chunks_to_embed,
+        chunks_embedded=job.chunks_embedded,
+        chunks_reused=job.chunks_reused,
+        skipped=bool(job.skipped),
+        attempts=job.attempts,
+        error=job.error,
+        eta_seconds=eta_seconds(job),
+        created_at=as_utc(job.created_at),
+        started_at=as_utc(job.started_at),
+        finished_at=as_utc(job.finished_at)
+    )
+
 
 @router.post("/", response_model=IngestResponse)
 async def ingest_document(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Upload and process a document (PDF or DOCX).
     
     This endpoint:
-    1. Extracts text from the document
-    2. Splits text into chunks
-    3. Creates embeddings for each chunk
-    4. Stores chunks and embeddings in the database
+    1. Skips the file if it is byte-identical to the last ingest
+    2. Extracts text from the document and splits it into chunks
+    3. Reuses stored embeddings for unchanged chunks (matched by content hash)
+    4. Embeds only new chunks, in concurrent, token-budgeted batches (with retry)
+    5. Replaces the document's chunks in the database
     """
     # Validate file type
-    supported_extensions = ['.pdf', '.docx', '.md', '.json']
-    if not any(file.filename.lower().endswith(ext) for ext in supported_extensions):
-        raise HTTPException(status_code=400, detail="Only PDF, DOCX, MD, and JSON files are supported")
+    validate_filename(file.filename)
     
+    path = None
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Process document
-        processor = DocumentProcessor(
-            chunk_size=settings.chunk_size,
-            chunk_overlap=settings.chunk_overlap
-        )
-        chunks, metadata = processor.process_document(file_content, file.filename)
-        
-        # Create embeddings
-        embedding_service = EmbeddingService()
-        embeddings = embedding_service.create_embeddings_batch(chunks)
+        # Spool the upload to disk (hashing it on the way) instead of reading it into memory
+        with span("ingest_spool"):
+            path, document_hash = await asyncio.to_thread(
+                spool_upload, file.file, os.path.splitext(file.filename)[1]
+            )
         
-        # Delete existing chunks for this document (if re-uploading)
-        db.query(DocumentChunk).filter(
-            DocumentChunk.document_name == file.filename
-        ).delete()
+        result = await IngestionService().ingest(db, file.filename, path, document_hash)
         
-        # Store chunks in database
-        for i, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk = DocumentChunk(
-                document_name=file.filename,
-                chunk_text=chunk_text,
-                chunk_index=i,
-                embedding=embedding,
-                doc_metadata=metadata
+        if result.skipped:
+            message = f"{file.filename} is unchanged; kept its {result.chunks_created} chunks"
+        else:
+            message = (
+                f"Successfully processed {file.filename} into {result.chunks_created} chunks "
+                f"({result.chunks_embedded} embedded, {result.chunks_reused} reused)"
             )
-            db.add(chunk)
-        
-        db.commit()
         
         return IngestResponse(
             success=True,
             document_name=file.filename,
-            chunks_created=len(chunks),
-            message=f"Successfully processed {file.filename} into {len(chunks)} chunks"
+            chunks_created=result.chunks_created,
+            message=message,
+            chunks_embedded=result.chunks_embedded,
+            chunks_reused=result.chunks_reused,
+            skipped=result.skipped
         )
     
     except ValueError as e:
+        await db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to process document: {str(e)}")
+    finally:
+        if path:
+            os.unlink(path)
+
+
+@router.post("/jobs", response_model=IngestJobResponse, status_code=202)
+async def submit_ingest_job(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Queue a document for background ingestion and return its job immediately.
+    
+    Poll `GET /ingest/jobs/{job_id}` for stage, progress and ETA. Jobs survive
+    client disconnects and API restarts.
+    """
+    validate_filename(file.filename)
+    
+    try:
+        with span("ingest_spool"):
+            job = await get_job_queue().submit(db, file.filename, file.file)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to queue document: {str(e)}")
+    
+    return job_response(job)
+
+
+@router.get("/jobs")
+async def list_ingest_jobs(
+    status: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
+    """List recent ingestion jobs, newest first."""
+    jobs = await get_job_queue().recent(db, status=status, limit=limit)
+    return {"jobs": [job_response(job) for job in jobs], "total": len(jobs)}
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobResponse)
+async def get_ingest_job(
+    job_id: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """Report an ingestion job's status, stage, chunk counts and ETA."""
+    job = await get_job_queue().get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return job_response(job)
 
 
 @router.delete("/{document_name}")
 async def delete_document(
     document_name: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete all chunks for a specific document."""
-    deleted = db.query(DocumentChunk).filter(
-        DocumentChunk.document_name == document_name
-    ).delete()
-    
-    db.commit()
+    deleted = await IngestionService().delete_document(db, document_name)
     
     if deleted == 0:
         raise HTTPException(status_code=404, detail=f"Document '{document_name}' not found")
@@ -102,19 +166,23 @@ async def delete_document(
 
 
 @router.get("/documents")
-async def list_documents(db: Session = Depends(get_db)):
+async def list_documents(db: AsyncSession = Depends(get_db)):
     """List all documents in the database."""
-    result = db.query(
-        DocumentChunk.document_name,
-        func.count(DocumentChunk.id).label('chunk_count'),
-        func.max(DocumentChunk.created_at).label('last_updated')
-    ).group_by(DocumentChunk.document_name).all()
+    result = (await db.execute(
+        select(
+            DocumentChunk.document_name,
+            func.count(DocumentChunk.id).label('chunk_count'),
+            func.max(DocumentChunk.created_at).label('last_updated'),
+            func.max(DocumentChunk.document_hash).label('content_hash')
+        ).group_by(DocumentChunk.document_name)
+    )).all()
     
     documents = [
         {
             "document_name": row.document_name,
             "chunk_count": row.chunk_count,
-            "last_updated": row.last_updated.isoformat() if row.last_updated else None
+            "last_updated": row.last_updated.isoformat() if row.last_updated else None,
+            "content_hash": row.content_hash
         }
         for row in result
     ]
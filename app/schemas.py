@@ -1,5 +1,5 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, List, Union
 from datetime import datetime
 
 
@@ -14,13 +14,47 @@ class IngestResponse(BaseModel):
     document_name: str
     chunks_created: int
     message: str
+    chunks_embedded: int = Field(0, description="Chunks sent to the embeddings API")
+    chunks_reused: int = Field(0, description="Chunks whose stored embedding was reused")
+    skipped: bool = Field(False, description="File was unchanged since the last ingest")
+
+
+class IngestJobResponse(BaseModel):
+    """Status of a background ingestion job."""
+    job_id: str
+    document_name: str
+    status: str = Field(..., description="queued, running, done or failed")
+    stage: str = Field(..., description="queued, extracting, embedding, storing, done or failed")
+    chunks_total: int
+    chunks_to_embed: int = Field(0, description="Distinct chunk texts that need new embeddings")
+    chunks_embedded: int
+    chunks_reused: int
+    skipped: bool = Field(False, description="File was unchanged since the last ingest")
+    attempts: int
+    error: Optional[str] = None
+    eta_seconds: Optional[float] = Field(None, description="Estimated time until the embedding stage finishes")
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class ChunkFilter(BaseModel):
+    """Retrieval scope: chunks must match every given field (one of its values, if a list)."""
+    model_config = ConfigDict(extra="forbid")
+    
+    document_name: Optional[Union[str, List[str]]] = Field(None, description="Document name(s)")
+    file_type: Optional[Union[str, List[str]]] = Field(None, description="PDF, DOCX, Markdown or JSON")
+    category: Optional[Union[str, List[str]]] = Field(None, description="Category of JSON Q&A entries")
+    intent: Optional[Union[str, List[str]]] = Field(None, description="Intent of JSON Q&A entries")
 
 
 class ChatRequest(BaseModel):
     """Request schema for chat."""
     question: str = Field(..., min_length=1, description="User's question")
     document_name: Optional[str] = Field(None, description="Filter by specific document")
+    filters: Optional[ChunkFilter] = Field(None, description="Restrict retrieval by document, file type, category or intent")
     top_k: Optional[int] = Field(5, ge=1, le=10, description="Number of chunks to retrieve")
+    session_id: Optional[str] = Field(None, max_length=64, description="Conversation to continue (from POST /chat/sessions)")
 
 
 class SourceChunk(BaseModel):
@@ -36,6 +70,47 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[SourceChunk]
     model: str
+    cached: bool = Field(False, description="Whether the answer was served from the answer cache")
+    direct_answer: bool = Field(False, description="Whether the answer is a matching Q&A entry's stored answer (no completion)")
+    session_id: Optional[str] = Field(None, description="Conversation this answer was added to")
+
+
+class BatchChatRequest(BaseModel):
+    """Request schema for answering many questions at once."""
+    questions: List[str] = Field(..., min_length=1, description="Questions to answer")
+    document_name: Optional[str] = Field(None, description="Filter by specific document")
+    filters: Optional[ChunkFilter] = Field(None, description="Restrict retrieval by document, file type, category or intent")
+    top_k: Optional[int] = Field(5, ge=1, le=10, description="Number of chunks to retrieve per question")
+
+
+class BatchChatResult(BaseModel):
+    """Answer to one question of a batch."""
+    question: str
+    answer: Optional[str] = None
+    sources: List[SourceChunk] = []
+    cached: bool = False
+    direct_answer: bool = False
+    error: Optional[str] = Field(None, description="Set instead of an answer if this question failed")
+    generation_ms: Optional[float] = None
+
+
+class BatchChatResponse(BaseModel):
+    """Response schema for batch chat."""
+    results: List[BatchChatResult]
+    model: str
+    timings: dict = Field(..., description="embedding_ms, retrieval_ms, generation_ms and total_ms for the batch")
+
+
+class ChatMessage(BaseModel):
+    """One turn of a conversation."""
+    role: str = Field(..., description="user or assistant")
+    content: str
+
+
+class SessionResponse(BaseModel):
+    """A conversation session and its stored history."""
+    session_id: str
+    messages: List[ChatMessage] = []
 
 
 class HealthResponse(BaseModel):
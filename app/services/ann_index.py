@@ -0,0 +1,146 @@
+from typing import NamedTuple, Optional, Sequence
+import math
+import os
+import numpy as np
+from app.config import get_settings
+
+settings = get_settings()
+
+# k-means training: sample this many rows per centroid (bounded), iterate this often
+TRAIN_ROWS_PER_LIST = 64
+TRAIN_ITERATIONS = 10
+# Rows scored against the centroids per block when assigning (bounds peak memory)
+ASSIGN_BATCH = 16384
+# Retrain (on the next full load) once the corpus has grown this much since training
+RETRAIN_GROWTH = 2.0
+
+
+class IVFState(NamedTuple):
+    """Inverted-file (IVF) partitioning of the index rows into k-means clusters."""
+    centroids: np.ndarray   # (L, d) float32, unit-length rows
+    lists: np.ndarray       # (N,) int32 cluster of each index row, parallel to the matrix
+    order: np.ndarray       # (N,) int64 row numbers grouped by cluster
+    offsets: np.ndarray     # (L + 1,) cluster c owns order[offsets[c]:offsets[c + 1]]
+    trained_on: int         # number of vectors the centroids were trained on
+
+
+class StoredIVF(NamedTuple):
+    """An IVF index as persisted on disk: centroids and the cluster of each chunk id."""
+    centroids: np.ndarray
+    ids: np.ndarray         # (M,) int64, ascending
+    lists: np.ndarray       # (M,) int32, parallel to ids
+    trained_on: int
+
+
+def list_count(vectors: int) -> int:
+    """Number of clusters for a corpus of `vectors` rows (VECTOR_ANN_LISTS, or sqrt(N))."""
+    lists = settings.vector_ann_lists or int(round(math.sqrt(vectors)))
+    return max(1, min(lists, vectors))
+
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def assign(matrix: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Nearest centroid (by cosine) of every row of `matrix`."""
+    lists = np.empty(len(matrix), dtype=np.int32)
+    for start in range(0, len(matrix), ASSIGN_BATCH):
+        block = matrix[start:start + ASSIGN_BATCH]
+        lists[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return lists
+
+
+def train(matrix: np.ndarray, lists: int, seed: int = 0) -> np.ndarray:
+    """
+    Spherical k-means centroids for the unit-length rows of `matrix`.
+
+    Trained on a random sample of TRAIN_ROWS_PER_LIST rows per centroid, so
+    training cost does not grow with the corpus beyond that.
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(matrix), lists * TRAIN_ROWS_PER_LIST)
+    sample = matrix[np.sort(rng.choice(len(matrix), sample_size, replace=False))]
+    centroids = sample[rng.choice(sample_size, lists, replace=False)].copy()
+    for _ in range(TRAIN_ITERATIONS):
+        labels = assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.bincount(labels, minlength=lists) == 0
+        # Re-seed empty clusters with random sample rows
+        sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)]
+        centroids = _unit(sums)
+    return centroids
+
+
+def build(centroids: np.ndarray, lists: np.ndarray, trained_on: int) -> IVFState:
+    """Group the rows of an index by cluster (`lists` is parallel to its rows)."""
+    order = np.argsort(lists, kind="stable")
+    offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(lists, minlength=len(centroids)), out=offsets[1:])
+    return IVFState(centroids, lists, order, offsets, trained_on)
+
+
+def probe(ivf: IVFState, query: np.ndarray, nprobe: int) -> np.ndarray:
+    """Ascending row numbers of the `nprobe` clusters nearest to the unit-length `query`."""
+    nprobe = min(max(1, nprobe), len(ivf.centroids))
+    scores = ivf.centroids @ query
+    nearest = np.argpartition(-scores, nprobe - 1)[:nprobe] if nprobe < len(scores) else np.arange(len(scores))
+    rows = np.concatenate([ivf.order[ivf.offsets[c]:ivf.offsets[c + 1]] for c in nearest])
+    rows.sort()
+    return rows
+
+
+def save(path: str, ivf: IVFState, ids: np.ndarray, model: str) -> None:
+    """Write the index next to the corpus (atomically, so other workers never read half a file)."""
+    order = np.argsort(ids, kind="stable")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        np.savez(
+            file,
+            centroids=ivf.centroids,
+            ids=ids[order],
+            lists=ivf.lists[order],
+            trained_on=np.int64(ivf.trained_on),
+            model=np.array(model)
+        )
+    os.replace(temporary, path)
+
+
+def load(path: str, model: str, dimensions: int) -> Optional[StoredIVF]:
+    """The persisted index, or None if missing, unreadable or built for another embedding model."""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["model"]) != model or data["centroids"].shape[1] != dimensions:
+                return None
+            return StoredIVF(
+                centroids=data["centroids"].astype(np.float32, copy=False),
+                ids=data["ids"].astype(np.int64, copy=False),
+                lists=data["lists"].astype(np.int32, copy=False),
+                trained_on=int(data["trained_on"])
+            )
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def restore(stored: Optional[StoredIVF], matrix: np.ndarray, ids: Sequence[int]) -> Optional[np.ndarray]:
+    """
+    Cluster of every row (`ids` parallel to `matrix`) from a persisted index;
+    rows it does not know are assigned to their nearest centroid. None if the
+    stored centroids are missing or stale (the corpus outgrew them).
+    """
+    if stored is None or len(matrix) > stored.trained_on * RETRAIN_GROWTH:
+        return None
+    ids = np.asarray(ids, dtype=np.int64)
+    lists = np.empty(len(ids), dtype=np.int32)
+    positions = np.minimum(np.searchsorted(stored.ids, ids), max(len(stored.ids) - 1, 0))
+    known = stored.ids[positions] == ids if len(stored.ids) else np.zeros(len(ids), dtype=bool)
+    lists[known] = stored.lists[positions[known]]
+    unknown = np.flatnonzero(~known)
+    if len(unknown):
+        lists[unknown] = assign(matrix[unknown], stored.centroids)
+    return lists
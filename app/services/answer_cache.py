@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Set
+import threading
+import time
+import numpy as np
+from app.config import get_settings
+
+settings = get_settings()
+
+ChunkKey = FrozenSet[int]
+
+
+class CachedAnswer(NamedTuple):
+    """One generated answer together with the question that produced it."""
+    question_vector: np.ndarray  # L2-normalized float32
+    answer: str
+    document_names: FrozenSet[str]
+    expires_at: float
+
+
+class AnswerCache:
+    """
+    Semantic cache in front of ChatService.generate_answer.
+
+    Entries are bucketed by the exact set of retrieved chunk ids, and a lookup
+    hits when a cached question in that bucket has cosine similarity at or above
+    `similarity_threshold` with the new question. Re-ingesting a document gives
+    its chunks new ids, so entries built on old chunks can no longer match even
+    in workers that did not see the ingest; `invalidate_document` frees them eagerly.
+    """
+
+    max_entries_per_key = 8
+
+    def __init__(self, max_entries: int, ttl_seconds: int, similarity_threshold: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.misses = 0
+        self._buckets: "OrderedDict[ChunkKey, List[CachedAnswer]]" = OrderedDict()
+        self._keys_by_document: Dict[str, Set[ChunkKey]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(chunk_ids: Iterable[int]) -> ChunkKey:
+        return frozenset(int(chunk_id) for chunk_id in chunk_ids)
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, chunk_ids: Iterable[int], question_embedding: Sequence[float]) -> Optional[str]:
+        """Return a cached answer for a semantically equivalent question, or None."""
+        key = self.make_key(chunk_ids)
+        query = self._normalize(question_embedding)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket:
+                live = [entry for entry in bucket if entry.expires_at >= now]
+                if len(live) != len(bucket):
+                    self._size -= len(bucket) - len(live)
+                    self._buckets[key] = bucket = live
+                for entry in bucket:
+                    if float(entry.question_vector @ query) >= self.similarity_threshold:
+                        self._buckets.move_to_end(key)
+                        self.hits += 1
+                        return entry.answer
+            self.misses += 1
+            return None
+
+    def set(
+        self,
+        chunk_ids: Iterable[int],
+        question_embedding: Sequence[float],
+        answer: str,
+        document_names: Iterable[str]
+    ) -> None:
+        """Remember an answer generated from the given chunks."""
+        key = self.make_key(chunk_ids)
+        entry = CachedAnswer(
+            question_vector=self._normalize(question_embedding),
+            answer=answer,
+            document_names=frozenset(document_names),
+            expires_at=time.monotonic() + self.ttl_seconds
+        )
+        with self._lock:
+            bucket = self._buckets.setdefault(key, [])
+            bucket.append(entry)
+            self._size += 1
+            if len(bucket) > self.max_entries_per_key:
+                bucket.pop(0)
+                self._size -= 1
+            self._buckets.move_to_end(key)
+            for name in entry.document_names:
+                self._keys_by_document.setdefault(name, set()).add(key)
+
+            while self._size > self.max_entries and self._buckets:
+                evicted_key, evicted = self._buckets.popitem(last=False)
+                self._size -= len(evicted)
+                self._forget_key(evicted_key, evicted)
+
+    def invalidate_document(self, document_name: str) -> int:
+        """Drop every cached answer that used a chunk of `document_name`."""
+        with self._lock:
+            dropped = 0
+            for key in self._keys_by_document.pop(document_name, set()):
+                bucket = self._buckets.pop(key, None)
+                if bucket is not None:
+                    dropped += len(bucket)
+                    self._size -= len(bucket)
+                    self._forget_key(key, bucket)
+            return dropped
+
+    def _forget_key(self, key: ChunkKey, bucket: List[CachedAnswer]) -> None:
+        for entry in bucket:
+            for name in entry.document_names:
+                keys = self._keys_by_document.get(name)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._keys_by_document[name]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring."""
+        total = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+@lru_cache()
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Get the process-wide answer cache (None when disabled)."""
+    if not settings.answer_cache_enabled:
+        return None
+    return AnswerCache(
+        max_entries=settings.answer_cache_max_entries,
+        ttl_seconds=settings.answer_cache_ttl_seconds,
+        similarity_threshold=settings.answer_cache_similarity_threshold
+    )
@@ -1,10 +1,47 @@
-from openai import OpenAI
-from typing import List, Tuple
+from openai import AsyncOpenAI
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import time
 from app.config import get_settings
 from app.models import DocumentChunk
+from app.services.context import build_context
+from app.services.metrics import record_request, record_stage, record_usage, span
 
 settings = get_settings()
-client = OpenAI(api_key=settings.openai_api_key)
+client = AsyncOpenAI(api_key=settings.openai_api_key)
+
+SYSTEM_MESSAGE = """You are FILIR Bot, a helpful AI assistant for the Massachusetts foreclosure petition filing system.
+
+Your role:
+- Help users understand the petition process, requirements, and system features
+- Answer questions clearly and concisely in a friendly, professional tone
+- Keep answers brief (2-4 sentences max) - users prefer short, direct answers
+- Use bullet points for steps or lists to save space
+- Never mention "context", "documents", "provided information", or reveal that you're using retrieved data
+- If you don't have enough information to answer, politely say "I don't have information about that specific topic. Could you ask about petition filing, statuses, or system features?"
+-You are a conversational assistant.
+-Prioritize natural dialogue, continuity, and helpfulness.
+-Respond succinctly, but not abruptly.
+-Acknowledge user intent before answering.
+-Ask clarifying questions only when necessary.
+Avoid robotic or enumerated responses unless asked.
+- For greetings like "hi" or "hello", respond warmly and offer to help with petition questions"""
+
+
+def direct_answer(context_chunks: List[Tuple[DocumentChunk, float]]) -> Optional[str]:
+    """
+    The stored answer of the Q&A entry whose question best matches, if its
+    similarity reaches `qa_direct_answer_threshold` (entries are embedded by
+    their question, so the score is question-to-question similarity).
+    """
+    if not settings.qa_direct_answer_enabled:
+        return None
+    best_score = settings.qa_direct_answer_threshold
+    answer = None
+    for chunk, score in context_chunks:
+        stored = (chunk.doc_metadata or {}).get("answer")
+        if stored and score >= best_score:
+            best_score, answer = score, stored
+    return answer
 
 
 class ChatService:
@@ -13,10 +50,11 @@ class ChatService:
     def __init__(self):
         self.model = settings.openai_model
     
-    def generate_answer(
+    async def generate_answer(
         self,
         question: str,
-        context_chunks: List[Tuple[DocumentChunk, float]]
+        context_chunks: List[Tuple[DocumentChunk, float]],
+        history: Optional[List[Dict[str, str]]] = None
     ) -> str:
         """
         Generate answer using retrieved context and OpenAI.
@@ -24,31 +62,87 @@ class ChatService:
         Args:
             question: User's question
             context_chunks: List of (DocumentChunk, similarity_score) tuples
+            history: Earlier turns of the conversation, oldest first
             
         Returns:
             Generated answer
         """
+        messages = self._build_messages(question, context_chunks, history)
+        
+        # Call OpenAI
+        try:
+            with span("completion"):
+                response = await client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=500
+                )
+            answer = response.choices[0].message.content.strip()
+        except Exception as e:
+            record_request("chat.completions", "error")
+            raise ValueError(f"Failed to generate answer: {str(e)}")
+        record_request("chat.completions", "ok")
+        record_usage(self.model, getattr(response, "usage", None))
+        return answer
+    
+    async def stream_answer(
+        self,
+        question: str,
+        context_chunks: List[Tuple[DocumentChunk, float]],
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Stream an answer token by token.
+        
+        Yields ("delta", text) for each completion delta, then a single
+        ("usage", dict) with token counts once the completion finishes.
+        """
+        messages = self._build_messages(question, context_chunks, history)
+        
+        started = time.perf_counter()
+        first_token = True
+        try:
+            stream = await client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=500,
+                stream=True,
+                extra_body={"stream_options": {"include_usage": True}}
+            )
+            usage = None
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        record_stage("completion_first_token", time.perf_counter() - started)
+                        first_token = False
+                    yield "delta", chunk.choices[0].delta.content
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+        except Exception as e:
+            record_request("chat.completions", "error")
+            raise ValueError(f"Failed to generate answer: {str(e)}")
+        record_stage("completion", time.perf_counter() - started)
+        record_request("chat.completions", "ok")
+        record_usage(self.model, usage)
+        
+        yield "usage", {
+            "prompt_tokens": usage.prompt_tokens if usage else None,
+            "completion_tokens": usage.completion_tokens if usage else None,
+            "total_tokens": usage.total_tokens if usage else None
+        }
+    
+    def _build_messages(
+        self,
+        question: str,
+        context_chunks: List[Tuple[DocumentChunk, float]],
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> List[dict]:
+        """Build the system message, prior turns and the user message for a question."""
         # Build context from chunks
         context = self._build_context(context_chunks)
         
-        # Create system and user messages
-        system_message = """You are FILIR Bot, a helpful AI assistant for the Massachusetts foreclosure petition filing system.
-
-Your role:
-- Help users understand the petition process, requirements, and system features
-- Answer questions clearly and concisely in a friendly, professional tone
-- Keep answers brief (2-4 sentences max) - users prefer short, direct answers
-- Use bullet points for steps or lists to save space
-- Never mention "context", "documents", "provided information", or reveal that you're using retrieved data
-- If you don't have enough information to answer, politely say "I don't have information about that specific topic. Could you ask about petition filing, statuses, or system features?"
--You are a conversational assistant.
--Prioritize natural dialogue, continuity, and helpfulness.
--Respond succinctly, but not abruptly.
--Acknowledge user intent before answering.
--Ask clarifying questions only when necessary.
-Avoid robotic or enumerated responses unless asked.
-- For greetings like "hi" or "hello", respond warmly and offer to help with petition questions"""
-
         user_message = f"""Use this information to answer:
 {context}
 
@@ -56,30 +150,12 @@ User question: {question}
 
 Your response (be natural, helpful, and BRIEF):"""
         
-        # Call OpenAI
-        try:
-            response = client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=0.7,
-                max_tokens=500
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            raise ValueError(f"Failed to generate answer: {str(e)}")
+        return [
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            *(history or []),
+            {"role": "user", "content": user_message}
+        ]
     
     def _build_context(self, chunks: List[Tuple[DocumentChunk, float]]) -> str:
-        """Build context string from chunks."""
-        if not chunks:
-            return "No relevant context found."
-        
-        context_parts = []
-        for i, (chunk, score) in enumerate(chunks, 1):
-            context_parts.append(
-                f"[Source {i} - {chunk.document_name} (Relevance: {score:.2f})]:\n{chunk.chunk_text}"
-            )
-        
-        return "\n\n".join(context_parts)
+        """Build context string from chunks (adjacent chunks merged, within max_context_tokens)."""
+        return build_context(chunks)
@@ -0,0 +1,114 @@
+from sqlalchemy import delete, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from functools import lru_cache
+from typing import List, Sequence
+import csv
+import io
+import json
+import numpy as np
+from app.models import DocumentChunk
+from app.vector_codec import EncodedVector
+
+# Columns written by COPY, in order (created_at keeps its server default)
+COPY_COLUMNS = [
+    "id", "document_name", "chunk_text", "chunk_index",
+    "content_hash", "document_hash", "embedding", "metadata"
+]
+
+
+@lru_cache()
+def _vector_format(dimensions: int) -> str:
+    # 9 significant digits round-trip float32 exactly, at about half the size of repr()
+    return "[" + ",".join(["%.9g"] * dimensions) + "]"
+
+
+def encode_embedding_text(embedding) -> str:
+    """
+    Compact text form accepted by both JSON and pgvector columns ("[0.1,0.2,...]").
+
+    Binary-encoded columns (EncodedVector) get the codec's bytes as a bytea hex literal.
+    """
+    column_type = DocumentChunk.__table__.c.embedding.type
+    if isinstance(column_type, EncodedVector):
+        embedding = column_type.process_bind_param(embedding, None)
+    if isinstance(embedding, (bytes, bytearray, memoryview)):
+        return "\\x" + bytes(embedding).hex()
+    values = np.asarray(embedding, dtype=np.float32)
+    return _vector_format(len(values)) % tuple(values.tolist())
+
+
+async def replace_document_chunks(
+    db: AsyncSession,
+    document_name: str,
+    rows: Sequence[dict]
+) -> List[int]:
+    """
+    Delete a document's chunks and insert `rows` in one transaction.
+
+    Rows are dicts keyed by DocumentChunk attribute names, in chunk order.
+    On PostgreSQL (asyncpg) the rows are streamed with COPY FROM STDIN;
+    other databases use a single multi-row INSERT ... RETURNING.
+
+    Returns:
+        The new chunk ids, parallel to `rows`
+    """
+    try:
+        await db.execute(
+            delete(DocumentChunk).where(DocumentChunk.document_name == document_name)
+        )
+        if not rows:
+            ids = []
+        elif db.get_bind().dialect.driver == "asyncpg":
+            ids = await _copy_rows(db, rows)
+        else:
+            result = await db.scalars(
+                insert(DocumentChunk).returning(DocumentChunk.id, sort_by_parameter_order=True),
+                list(rows)
+            )
+            ids = list(result)
+        await db.commit()
+        return ids
+    except Exception:
+        await db.rollback()
+        raise
+
+
+async def _copy_rows(db: AsyncSession, rows: Sequence[dict]) -> List[int]:
+    """COPY rows into document_chunks with pre-allocated ids (COPY cannot return them)."""
+    ids = list(await db.scalars(
+        text(
+            "SELECT nextval(pg_get_serial_sequence('document_chunks', 'id')) "
+            "FROM generate_series(1, :count)"
+        ),
+        {"count": len(rows)}
+    ))
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    metadata_cache = {}
+    for chunk_id, row in zip(ids, rows):
+        metadata = row.get("doc_metadata")
+        key = id(metadata)
+        if key not in metadata_cache:
+            metadata_cache[key] = json.dumps(metadata) if metadata is not None else None
+        embedding = row.get("embedding")
+        writer.writerow([
+            chunk_id,
+            row["document_name"],
+            row["chunk_text"],
+            row["chunk_index"],
+            row.get("content_hash"),
+            row.get("document_hash"),
+            encode_embedding_text(embedding) if embedding is not None else None,
+            metadata_cache[key]
+        ])
+
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_to_table(
+        DocumentChunk.__tablename__,
+        source=io.BytesIO(buffer.getvalue().encode("utf-8")),
+        columns=COPY_COLUMNS,
+        format="csv"
+    )
+    return [int(chunk_id) for chunk_id in ids]
@@ -0,0 +1,123 @@
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from app.config import get_settings
+from app.models import DocumentChunk
+from app.services.tokens import count_tokens, split_by_tokens
+
+settings = get_settings()
+
+# Shorter suffix/prefix matches between neighbouring chunks are treated as coincidence
+MIN_OVERLAP_CHARS = 20
+# A truncated passage shorter than this is not worth its header
+MIN_TRUNCATED_TOKENS = 32
+
+
+class Passage(NamedTuple):
+    """A run of adjacent chunks from one document, with their overlap removed."""
+    document_name: str
+    text: str
+    score: float   # best similarity among its chunks
+    rank: int      # best retrieval rank among its chunks (0 = most relevant)
+    best_text: str  # text of its most relevant chunk, used when the run is over budget
+
+
+def overlap_length(previous: str, following: str) -> int:
+    """Length of the longest suffix of `previous` that `following` starts with."""
+    if len(following) < MIN_OVERLAP_CHARS:
+        return 0
+    probe = following[:MIN_OVERLAP_CHARS]
+    start = previous.find(probe)
+    # The earliest occurrence gives the longest overlap
+    while start != -1:
+        if following.startswith(previous[start:]):
+            return len(previous) - start
+        start = previous.find(probe, start + 1)
+    return 0
+
+
+def merge_adjacent(chunks: Sequence[Tuple[DocumentChunk, float]]) -> List[Passage]:
+    """
+    Group retrieved chunks into passages of consecutive chunk_index per document.
+    
+    `chunks` is in relevance order; passages are returned in the order of
+    their most relevant chunk.
+    """
+    ranked = {}
+    for rank, (chunk, score) in enumerate(chunks):
+        key = (chunk.document_name, chunk.chunk_index)
+        if key not in ranked:
+            ranked[key] = (chunk, score, rank)
+    
+    passages = []
+    run = []
+    for key in sorted(ranked):
+        chunk = ranked[key][0]
+        if run and (run[-1].document_name != chunk.document_name or run[-1].chunk_index + 1 != chunk.chunk_index):
+            passages.append(_passage(run, ranked))
+            run = []
+        run.append(chunk)
+    if run:
+        passages.append(_passage(run, ranked))
+    
+    return sorted(passages, key=lambda passage: passage.rank)
+
+
+def _passage(run: List[DocumentChunk], ranked: dict) -> Passage:
+    parts = [run[0].chunk_text]
+    for previous, chunk in zip(run, run[1:]):
+        overlap = overlap_length(previous.chunk_text, chunk.chunk_text)
+        rest = chunk.chunk_text[overlap:]
+        if rest.strip():
+            parts.append(rest if overlap else "\n\n" + rest)
+    entries = [ranked[(chunk.document_name, chunk.chunk_index)] for chunk in run]
+    best_chunk, best_score, best_rank = min(entries, key=lambda entry: entry[2])
+    return Passage(
+        document_name=run[0].document_name,
+        text="".join(parts),
+        score=max(score for _, score, _ in entries),
+        rank=best_rank,
+        best_text=best_chunk.chunk_text
+    )
+
+
+def build_context(
+    chunks: Sequence[Tuple[DocumentChunk, float]],
+    max_tokens: Optional[int] = None
+) -> str:
+    """
+    Assemble the prompt context from retrieved chunks within a token budget.
+    
+    Adjacent chunks are merged and their repeated overlap dropped. Passages
+    are added most relevant first; a merged passage that does not fit falls
+    back to its most relevant chunk, and the top passage is truncated rather
+    than dropped. Less relevant passages that do not fit are left out.
+    """
+    if not chunks:
+        return "No relevant context found."
+    budget = settings.max_context_tokens if max_tokens is None else max_tokens
+    
+    context_parts = []
+    used = 0
+    for passage in merge_adjacent(chunks):
+        header = f"[Source {len(context_parts) + 1} - {passage.document_name} (Relevance: {passage.score:.2f})]:\n"
+        # +1 for the blank line joining sources
+        header_tokens = count_tokens(header) + 1
+        remaining = budget - used - header_tokens
+        if remaining <= 0:
+            break
+        
+        text = None
+        for candidate in (passage.text, passage.best_text):
+            tokens = count_tokens(candidate)
+            if tokens <= remaining:
+                text = candidate
+                break
+        if text is None and not context_parts and remaining >= MIN_TRUNCATED_TOKENS:
+            text = split_by_tokens(passage.best_text, remaining)[0]
+            tokens = count_tokens(text)
+        if text is None:
+            continue
+        
+        context_parts.append(header + text)
+        used += header_tokens + tokens
+    
+    return "\n\n".join(context_parts) if context_parts else "No relevant context found."
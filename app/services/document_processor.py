@@ -1,92 +1,293 @@
 from pypdf import PdfReader
 from docx import Document
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import collections
 import io
 import json
+import multiprocessing
+import os
+import re
+import threading
+from app.services.tokens import count_tokens_batch, split_by_tokens
+
+# Raw file bytes, or a path to the file on disk (needed for process-parallel PDF parsing)
+DocumentSource = Union[bytes, str, os.PathLike]
+
+_pdf_pools: Dict[int, ProcessPoolExecutor] = {}
+_pdf_pools_lock = threading.Lock()
+
+
+def get_pdf_pool(workers: int) -> ProcessPoolExecutor:
+    """Process pool shared by all PDF extractions (spawned, so it is safe alongside threads)."""
+    with _pdf_pools_lock:
+        pool = _pdf_pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pdf_pools[workers] = pool
+        return pool
+
+
+def shutdown_pdf_pools() -> None:
+    """Stop all PDF worker processes."""
+    with _pdf_pools_lock:
+        for pool in _pdf_pools.values():
+            pool.shutdown(cancel_futures=True)
+        _pdf_pools.clear()
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Worker: extract the text of pages [start, stop) of a PDF on disk."""
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _open_source(source: DocumentSource):
+    """Parsers accept either a path or a binary stream."""
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def _read_source(source: DocumentSource) -> bytes:
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def embedding_input(chunk: str, fields: Dict[str, str]) -> str:
+    """Text to embed for a chunk: a Q&A entry's question, otherwise the chunk itself."""
+    return fields.get("question") or chunk
 
 
 class SimpleTextSplitter:
-    """Simple text splitter without external dependencies."""
+    """
+    Streaming, token-sized text splitter without external dependencies.
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
+    Text is cut into units at paragraph, heading, list-item and sentence
+    boundaries; units are then packed into chunks of at most `chunk_size`
+    tokens, repeating up to `chunk_overlap` tokens of trailing units. Each
+    unit is tokenized and packed once, so total work is O(n), and every
+    chunk contains at least one new unit, so splitting always progresses.
+    """
+    
+    # Stored in chunk metadata; bump when chunk boundaries change
+    version = "tokens-1"
+    
+    BOUNDARY = re.compile(
+        r"\n[ \t]*\n\s*"                      # paragraph break
+        r"|\n(?=[ \t]*#{1,6}\s)"               # before a markdown heading
+        r"|\n(?=[ \t]*(?:[-*•]|\d+[.)])\s)"    # before a list item
+        r"|(?<=[.!?])[\"')\]]*\s+"             # sentence end
+    )
+    HEADING = re.compile(r"[ \t]*#{1,6}\s")
+    
+    def __init__(self, chunk_size: int = 256, chunk_overlap: int = 48):
+        self.chunk_size = max(1, chunk_size)
+        # Overlap beyond half a chunk would make every unit appear in 3+ chunks
+        self.chunk_overlap = max(0, min(chunk_overlap, self.chunk_size // 2))
+        # Text without any boundary is cut once this many characters are pending
+        self.max_pending_chars = self.chunk_size * 8
     
     def split_text(self, text: str) -> List[str]:
         """Split text into chunks with overlap."""
-        chunks = []
-        start = 0
-        text_length = len(text)
+        return list(self.split_stream([text]))
+    
+    def split_stream(self, segments: Iterable[str]) -> Iterator[str]:
+        """Lazily split a stream of text segments (e.g. pages) into chunks with overlap."""
+        return self._pack(self._units(segments))
+    
+    def _units(self, segments: Iterable[str]) -> Iterator[Tuple[str, int]]:
+        """Yield (unit_text, token_count); no unit exceeds chunk_size tokens."""
+        pending = ""
+        for segment in segments:
+            pending += segment
+            pieces = []
+            cut = 0
+            for match in self.BOUNDARY.finditer(pending):
+                if match.end() == len(pending):
+                    break  # the next segment may extend this boundary
+                pieces.append(pending[cut:match.end()])
+                cut = match.end()
+            pending = pending[cut:]
+            if len(pending) > self.max_pending_chars:
+                pieces.append(pending)
+                pending = ""
+            yield from self._measure(pieces)
+        yield from self._measure([pending])
+    
+    def _measure(self, pieces: List[str]) -> Iterator[Tuple[str, int]]:
+        pieces = [piece for piece in pieces if piece.strip()]
+        for piece, tokens in zip(pieces, count_tokens_batch(pieces)):
+            if tokens <= self.chunk_size:
+                yield piece, tokens
+            else:
+                # Half-size parts still pack two to a chunk, and leave room for a heading
+                parts = split_by_tokens(piece, max(1, self.chunk_size // 2))
+                yield from zip(parts, count_tokens_batch(parts))
+    
+    def _pack(self, units: Iterable[Tuple[str, int]]) -> Iterator[str]:
+        window = collections.deque()
+        window_tokens = 0
+        fresh = 0  # units added since the last emitted chunk
         
-        while start < text_length:
-            end = start + self.chunk_size
-            chunk = text[start:end]
+        for text, tokens in units:
+            # Start a new section at a heading unless the current chunk is still small
+            if fresh and self.HEADING.match(text) and window_tokens >= self.chunk_size // 4:
+                chunk = self._join(window)
+                if chunk:
+                    yield chunk
+                window.clear()
+                window_tokens = fresh = 0
             
-            # Try to break at sentence or word boundary
-            if end < text_length:
-                # Look for sentence end
-                last_period = chunk.rfind('. ')
-                if last_period > self.chunk_size // 2:
-                    end = start + last_period + 2
-                    chunk = text[start:end]
-                else:
-                    # Look for word boundary
-                    last_space = chunk.rfind(' ')
-                    if last_space > self.chunk_size // 2:
-                        end = start + last_space
-                        chunk = text[start:end]
+            if fresh and window_tokens + tokens > self.chunk_size:
+                chunk = self._join(window)
+                if chunk:
+                    yield chunk
+                fresh = 0
+                # Keep trailing units as overlap, leaving room for the new unit
+                while window and (
+                    window_tokens > self.chunk_overlap
+                    or window_tokens + tokens > self.chunk_size
+                ):
+                    window_tokens -= window.popleft()[1]
             
-            chunks.append(chunk.strip())
-            start = end - self.chunk_overlap
+            window.append((text, tokens))
+            window_tokens += tokens
+            fresh += 1
         
-        return [c for c in chunks if c]  # Remove empty chunks
+        if fresh:
+            chunk = self._join(window)
+            if chunk:
+                yield chunk
+    
+    @staticmethod
+    def _join(window) -> str:
+        return "".join(text for text, _ in window).strip()
 
 
 class DocumentProcessor:
     """Process PDF documents and split them into chunks."""
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    # Q&A entry fields kept as chunk metadata, so retrieval can be filtered by them
+    QA_FIELDS = ("category", "intent")
+    
+    # Appended to the splitter version for JSON: one chunk per Q&A entry (qa_structured),
+    # or runs of entries that never span two categories/intents
+    QA_ENTRY_LAYOUT_VERSION = "qa-entries-1"
+    QA_LAYOUT_VERSION = "qa-sections-1"
+    
+    def __init__(
+        self,
+        chunk_size: int = 256,
+        chunk_overlap: int = 48,
+        pdf_workers: int = 0,
+        pdf_parallel_min_pages: int = 32,
+        pdf_pages_per_task: int = 8,
+        qa_structured: bool = True
+    ):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.pdf_workers = pdf_workers or os.cpu_count() or 1
+        self.pdf_parallel_min_pages = pdf_parallel_min_pages
+        self.pdf_pages_per_task = pdf_pages_per_task
+        self.qa_structured = qa_structured
         self.text_splitter = SimpleTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap
         )
     
-    def extract_text_from_pdf(self, file_content: bytes) -> str:
-        """Extract text from PDF file."""
+    def iter_pdf_pages(self, source: DocumentSource) -> Iterator[str]:
+        """
+        Yield the text of each PDF page, in order.
+        
+        Large PDFs on disk are parsed by a process pool in page ranges; at most
+        two ranges per worker are in flight, so memory is bounded by that
+        window rather than by the document.
+        """
         try:
-            pdf_file = io.BytesIO(file_content)
-            reader = PdfReader(pdf_file)
+            reader = PdfReader(_open_source(source))
+            page_count = len(reader.pages)
             
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
+            if (
+                isinstance(source, (bytes, bytearray))
+                or self.pdf_workers <= 1
+                or page_count < self.pdf_parallel_min_pages
+            ):
+                for page in reader.pages:
+                    yield page.extract_text() or ""
+                return
             
-            return text.strip()
+            del reader
+            pool = get_pdf_pool(self.pdf_workers)
+            path = os.fspath(source)
+            ranges = iter(range(0, page_count, self.pdf_pages_per_task))
+            window = collections.deque()
+            
+            def submit_next() -> None:
+                start = next(ranges, None)
+                if start is not None:
+                    stop = min(start + self.pdf_pages_per_task, page_count)
+                    window.append(pool.submit(_extract_page_range, path, start, stop))
+            
+            for _ in range(self.pdf_workers * 2):
+                submit_next()
+            try:
+                while window:
+                    pages = window.popleft().result()
+                    submit_next()
+                    yield from pages
+            finally:
+                for future in window:
+                    future.cancel()
+        except ValueError:
+            raise
         except Exception as e:
             raise ValueError(f"Failed to extract text from PDF: {str(e)}")
     
-    def extract_text_from_docx(self, file_content: bytes) -> str:
-        """Extract text from Word (DOCX) file."""
+    def iter_docx_text(self, source: DocumentSource) -> Iterator[str]:
+        """Yield paragraph and table-row text from a Word (DOCX) file."""
         try:
-            docx_file = io.BytesIO(file_content)
-            doc = Document(docx_file)
-            
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            
-            # Also extract text from tables
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        text += cell.text + " "
-                    text += "\n"
-            
-            return text.strip()
+            doc = Document(_open_source(source))
         except Exception as e:
             raise ValueError(f"Failed to extract text from DOCX: {str(e)}")
+        
+        for paragraph in doc.paragraphs:
+            yield paragraph.text + "\n\n"
+        
+        # Also extract text from tables
+        for table in doc.tables:
+            for row in table.rows:
+                yield "".join(cell.text + " " for cell in row.cells) + "\n"
+    
+    def iter_text(self, source: DocumentSource, filename: str) -> Tuple[Iterator[str], str]:
+        """
+        Text segments of a document, in reading order.
+        
+        Returns:
+            Tuple of (segments, file_type)
+        """
+        name = filename.lower()
+        if name.endswith('.pdf'):
+            return (page + "\n" for page in self.iter_pdf_pages(source)), "PDF"
+        elif name.endswith('.docx'):
+            return self.iter_docx_text(source), "DOCX"
+        elif name.endswith('.md'):
+            return iter([self.extract_text_from_markdown(_read_source(source))]), "Markdown"
+        elif name.endswith('.json'):
+            return iter([self.extract_text_from_json(_read_source(source))]), "JSON"
+        else:
+            raise ValueError(f"Unsupported file type. Only PDF, DOCX, MD, and JSON are supported.")
+    
+    def extract_text_from_pdf(self, file_content: DocumentSource) -> str:
+        """Extract text from PDF file."""
+        return "\n".join(self.iter_pdf_pages(file_content)).strip()
+    
+    def extract_text_from_docx(self, file_content: DocumentSource) -> str:
+        """Extract text from Word (DOCX) file."""
+        return "".join(self.iter_docx_text(file_content)).strip()
     
     def extract_text_from_markdown(self, file_content: bytes) -> str:
         """Extract text from Markdown (.md) file."""
@@ -98,34 +299,79 @@ class DocumentProcessor:
     
     def extract_text_from_json(self, file_content: bytes) -> str:
         """Extract text from JSON file (Q&A dataset)."""
+        sections = self.extract_qa_sections(file_content)
+        if sections is not None:
+            return "\n".join(text for _, text in sections)
+        try:
+            # Fallback: convert entire JSON to string
+            return json.dumps(json.loads(file_content.decode('utf-8')), indent=2)
+        except Exception as e:
+            raise ValueError(f"Failed to extract text from JSON: {str(e)}")
+    
+    def extract_qa_entries(self, file_content: bytes) -> Optional[List[Tuple[Dict[str, str], str]]]:
+        """
+        Parse a JSON Q&A dataset into its entries (those with a question and an answer).
+        
+        Returns:
+            List of (fields, text): fields holds category, intent, question,
+            answer and entry_id (the entry's "id", if any); text is the entry
+            formatted for reading. None if the JSON is not a list of entries.
+        """
         try:
             data = json.loads(file_content.decode('utf-8'))
-            
-            # If it's a list of Q&A entries
-            if isinstance(data, list):
-                text_parts = []
-                for entry in data:
-                    if isinstance(entry, dict):
-                        # Extract question and answer
-                        question = entry.get('question', '')
-                        answer = entry.get('answer', '')
-                        category = entry.get('category', '')
-                        intent = entry.get('intent', '')
-                        
-                        # Format as readable text
-                        if question and answer:
-                            text_parts.append(f"Category: {category}")
-                            text_parts.append(f"Intent: {intent}")
-                            text_parts.append(f"Q: {question}")
-                            text_parts.append(f"A: {answer}")
-                            text_parts.append("---")
-                
-                return "\n".join(text_parts)
-            else:
-                # Fallback: convert entire JSON to string
-                return json.dumps(data, indent=2)
         except Exception as e:
             raise ValueError(f"Failed to extract text from JSON: {str(e)}")
+        if not isinstance(data, list):
+            return None
+        
+        entries = []
+        for entry in data:
+            if not isinstance(entry, dict):
+                continue
+            question = str(entry.get('question') or '').strip()
+            answer = str(entry.get('answer') or '').strip()
+            if not (question and answer):
+                continue
+            fields = {field: str(entry.get(field) or '') for field in self.QA_FIELDS}
+            # Format as readable text
+            text = "\n".join([
+                f"Category: {fields['category']}",
+                f"Intent: {fields['intent']}",
+                f"Q: {question}",
+                f"A: {answer}"
+            ])
+            fields.update(question=question, answer=answer, entry_id=str(entry.get('id') or ''))
+            entries.append((fields, text))
+        return entries
+    
+    def extract_qa_sections(self, file_content: bytes) -> Optional[List[Tuple[Dict[str, str], str]]]:
+        """
+        Group a JSON Q&A dataset into runs of consecutive entries that share a
+        category and intent.
+        
+        Returns:
+            List of (fields, text) with fields = {"category": ..., "intent": ...},
+            or None if the JSON is not a list of entries
+        """
+        entries = self.extract_qa_entries(file_content)
+        if entries is None:
+            return None
+        
+        sections = []
+        for fields, text in entries:
+            fields = {field: fields[field] for field in self.QA_FIELDS}
+            if sections and sections[-1][0] == fields:
+                sections[-1][1].append(text)
+            else:
+                sections.append((fields, [text]))
+        return [(fields, "\n---\n".join(texts)) for fields, texts in sections]
+    
+    def splitter_version(self, filename: str) -> str:
+        """Chunk layout recorded in metadata; a change means stored chunks are stale."""
+        if filename.lower().endswith('.json'):
+            layout = self.QA_ENTRY_LAYOUT_VERSION if self.qa_structured else self.QA_LAYOUT_VERSION
+            return f"{self.text_splitter.version}+{layout}"
+        return self.text_splitter.version
     
     def chunk_text(self, text: str) -> List[str]:
         """Split text into chunks."""
@@ -135,31 +381,60 @@ class DocumentProcessor:
         chunks = self.text_splitter.split_text(text)
         return chunks
     
-    def process_document(self, file_content: bytes, filename: str) -> Tuple[List[str], dict]:
+    def process_document(
+        self,
+        source: DocumentSource,
+        filename: str
+    ) -> Tuple[List[str], dict, List[Dict[str, str]]]:
         """
-        Process document file (PDF or DOCX): extract text and chunk it.
+        Process document file (PDF, DOCX, MD or JSON): extract text and chunk it.
+        
+        `source` is the file content or a path to it. Text is streamed from the
+        extractor into the splitter segment by segment (page by page for PDFs),
+        so the full document text is never held in memory.
+        
+        JSON Q&A datasets become one chunk per entry (`qa_structured`), whose
+        fields include the question it is embedded by (see embedding_input) and
+        the answer; otherwise they are chunked per run of entries with the same
+        category and intent. Either way category and intent are returned for
+        each chunk.
         
         Returns:
-            Tuple of (chunks, metadata)
+            Tuple of (chunks, metadata, per-chunk fields); fields are empty dicts
+            for documents without per-chunk metadata
         """
-        # Determine file type and extract text
-        if filename.lower().endswith('.pdf'):
-            text = self.extract_text_from_pdf(file_content)
-            file_type = "PDF"
-        elif filename.lower().endswith('.docx'):
-            text = self.extract_text_from_docx(file_content)
-            file_type = "DOCX"
-        elif filename.lower().endswith('.md'):
-            text = self.extract_text_from_markdown(file_content)
-            file_type = "Markdown"
-        elif filename.lower().endswith('.json'):
-            text = self.extract_text_from_json(file_content)
-            file_type = "JSON"
-        else:
-            raise ValueError(f"Unsupported file type. Only PDF, DOCX, MD, and JSON are supported.")
+        total_characters = 0
+        
+        def counted(stream: Iterable[str]) -> Iterator[str]:
+            nonlocal total_characters
+            for segment in stream:
+                total_characters += len(segment)
+                yield segment
+        
+        entries = None
+        if filename.lower().endswith('.json'):
+            content = _read_source(source)
+            entries = self.extract_qa_entries(content)
         
         # Create chunks
-        chunks = self.chunk_text(text)
+        if entries is not None and self.qa_structured:
+            # Each entry is one retrieval unit, however long its answer
+            file_type = "JSON"
+            chunks = list(counted(text for _, text in entries))
+            chunk_fields = [fields for fields, _ in entries]
+        elif entries is not None:
+            file_type = "JSON"
+            chunks, chunk_fields = [], []
+            for fields, text in self.extract_qa_sections(content):
+                section_chunks = list(self.text_splitter.split_stream(counted([text])))
+                chunks.extend(section_chunks)
+                chunk_fields.extend([fields] * len(section_chunks))
+        else:
+            segments, file_type = self.iter_text(source, filename)
+            chunks = list(self.text_splitter.split_stream(counted(segments)))
+            chunk_fields = [{}] * len(chunks)
+        if not chunks:
+            raise ValueError("Text is empty")
         
         # Create metadata
         metadata = {
@@ -168,7 +443,8 @@ class DocumentProcessor:
             "total_chunks": len(chunks),
             "chunk_size": self.chunk_size,
             "chunk_overlap": self.chunk_overlap,
-            "total_characters": len(text)
+            "splitter": self.splitter_version(filename),
+            "total_characters": total_characters
         }
         
-        return chunks, metadata
+        return chunks, metadata, chunk_fields
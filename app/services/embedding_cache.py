@@ -0,0 +1,206 @@
+from sqlalchemy import create_engine, select, update, delete, func
+from sqlalchemy.engine import Engine
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional
+import hashlib
+import itertools
+import re
+import threading
+import time
+import unicodedata
+import numpy as np
+from app.config import get_settings
+from app.models import EmbeddingCacheEntry
+
+settings = get_settings()
+
+# The SQL cache checks its size every this many inserts per process, not on each one
+SQL_TRIM_INTERVAL = 100
+
+
+def normalize_query(text: str) -> str:
+    """Normalize question text so trivially different phrasings share a cache key."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = " ".join(text.split())
+    return re.sub(r"[\s?!.]+$", "", text)
+
+
+class EmbeddingCache(ABC):
+    """
+    Bounded LRU/TTL cache of query embeddings keyed on (normalized text, model).
+
+    Subclasses implement `_get`, `_set` and `__len__`; hit/miss counting lives here.
+    Backends that do I/O set `blocking` so async callers run them in a thread.
+    """
+
+    blocking = False
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text: str, model: str) -> str:
+        """Cache key for a question embedded with `model`."""
+        return hashlib.sha256(f"{model}\x00{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Return the cached embedding or None, updating hit/miss counters."""
+        embedding = self._get(key)
+        if embedding is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return embedding
+
+    def set(self, key: str, embedding: List[float]) -> None:
+        """Store an embedding, evicting the least recently used entries if full."""
+        self._set(key, embedding)
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring."""
+        total = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[List[float]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def _set(self, key: str, embedding: List[float]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class InMemoryEmbeddingCache(EmbeddingCache):
+    """Per-process cache backed by an OrderedDict."""
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        super().__init__(max_entries, ttl_seconds)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, embedding = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return embedding
+
+    def _set(self, key: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLEmbeddingCache(EmbeddingCache):
+    """
+    Cache shared by every worker through a SQL table (SQLite file or PostgreSQL).
+
+    Embeddings are stored as raw float32 bytes. The table is trimmed back to
+    `max_entries` every SQL_TRIM_INTERVAL inserts, so it can briefly exceed
+    the bound by that many entries per worker.
+    """
+
+    blocking = True
+
+    def __init__(self, engine: Engine, max_entries: int, ttl_seconds: int):
+        super().__init__(max_entries, ttl_seconds)
+        self.engine = engine
+        self.table = EmbeddingCacheEntry.__table__
+        self.table.create(bind=engine, checkfirst=True)
+        # Tables created before accessed_at was indexed get the index here
+        for index in self.table.indexes:
+            index.create(bind=engine, checkfirst=True)
+        self._inserts = itertools.count(1)
+        if engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        self._insert = insert
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        now = time.time()
+        with self.engine.begin() as conn:
+            blob = conn.execute(
+                select(self.table.c.embedding).where(
+                    self.table.c.key == key,
+                    self.table.c.created_at >= now - self.ttl_seconds
+                )
+            ).scalar()
+            if blob is None:
+                return None
+            conn.execute(
+                update(self.table).where(self.table.c.key == key).values(accessed_at=now)
+            )
+        return np.frombuffer(blob, dtype=np.float32).tolist()
+
+    def _set(self, key: str, embedding: List[float]) -> None:
+        now = time.time()
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        statement = self._insert(self.table).values(
+            key=key, embedding=blob, created_at=now, accessed_at=now
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[self.table.c.key],
+            set_={"embedding": blob, "created_at": now, "accessed_at": now}
+        )
+        with self.engine.begin() as conn:
+            conn.execute(statement)
+        if next(self._inserts) % SQL_TRIM_INTERVAL == 0:
+            self._trim()
+
+    def _trim(self) -> None:
+        """Delete the least recently used entries beyond the bound, if there are any."""
+        with self.engine.begin() as conn:
+            if conn.execute(select(func.count()).select_from(self.table)).scalar() <= self.max_entries:
+                return
+            stale = select(self.table.c.key).order_by(
+                self.table.c.accessed_at.desc()
+            ).offset(self.max_entries).scalar_subquery()
+            conn.execute(delete(self.table).where(self.table.c.key.in_(stale)))
+
+    def __len__(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self.table)).scalar() or 0
+
+
+@lru_cache()
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Build the configured query-embedding cache (None when disabled)."""
+    backend = settings.embedding_cache_backend.lower()
+    max_entries = settings.embedding_cache_max_entries
+    ttl_seconds = settings.embedding_cache_ttl_seconds
+
+    if backend == "memory":
+        return InMemoryEmbeddingCache(max_entries, ttl_seconds)
+    if backend == "sqlite":
+        engine = create_engine(f"sqlite:///{settings.embedding_cache_sqlite_path}")
+        return SQLEmbeddingCache(engine, max_entries, ttl_seconds)
+    if backend == "postgres":
+        from app.database import engine
+        return SQLEmbeddingCache(engine, max_entries, ttl_seconds)
+    return None
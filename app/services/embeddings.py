@@ -1,9 +1,23 @@
-from openai import OpenAI
-from typing import List
+from openai import (
+    AsyncOpenAI,
+    APIConnectionError,
+    APITimeoutError,
+    InternalServerError,
+    RateLimitError
+)
+from typing import AsyncIterator, List, Tuple
+import asyncio
+import random
 from app.config import get_settings
+from app.services.embedding_cache import get_embedding_cache
+from app.services.metrics import record_request, record_usage, span
+from app.services.tokens import count_tokens_batch
 
 settings = get_settings()
-client = OpenAI(api_key=settings.openai_api_key)
+client = AsyncOpenAI(api_key=settings.openai_api_key)
+
+# Errors worth retrying: rate limits, timeouts, dropped connections, 5xx
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
 
 
 class EmbeddingService:
@@ -12,24 +26,149 @@ class EmbeddingService:
     def __init__(self):
         self.model = settings.openai_embedding_model
     
-    def create_embedding(self, text: str) -> List[float]:
-        """Create embedding for a single text."""
+    async def create_embedding(self, text: str) -> List[float]:
+        """Create embedding for a single text (served from the query cache when possible)."""
+        cache = get_embedding_cache()
+        if cache is not None:
+            key = cache.make_key(text, self.model)
+            if cache.blocking:
+                cached = await asyncio.to_thread(cache.get, key)
+            else:
+                cached = cache.get(key)
+            if cached is not None:
+                return cached
+        
         try:
-            response = client.embeddings.create(
-                model=self.model,
-                input=text
-            )
-            return response.data[0].embedding
+            with span("embedding"):
+                response = await client.embeddings.create(
+                    model=self.model,
+                    input=text
+                )
+            embedding = response.data[0].embedding
         except Exception as e:
+            record_request("embeddings", "error")
             raise ValueError(f"Failed to create embedding: {str(e)}")
+        record_request("embeddings", "ok")
+        record_usage(self.model, getattr(response, "usage", None))
+        
+        if cache is not None:
+            if cache.blocking:
+                await asyncio.to_thread(cache.set, key, embedding)
+            else:
+                cache.set(key, embedding)
+        return embedding
+    
+    async def create_query_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeddings for many questions: cached ones are reused, the rest are
+        embedded together (one embeddings.create call per token-budgeted batch).
+        """
+        cache = get_embedding_cache()
+        keys = [cache.make_key(text, self.model) for text in texts] if cache is not None else []
+        embeddings: List[List[float]] = [None] * len(texts)
+        if cache is not None:
+            if cache.blocking:
+                embeddings = await asyncio.to_thread(lambda: [cache.get(key) for key in keys])
+            else:
+                embeddings = [cache.get(key) for key in keys]
+        
+        # Embed each distinct missing text once
+        missing = {}
+        for i, embedding in enumerate(embeddings):
+            if embedding is None:
+                missing.setdefault(texts[i], []).append(i)
+        if missing:
+            fresh = await self.create_embeddings_batch(list(missing))
+            for (text, positions), embedding in zip(missing.items(), fresh):
+                for i in positions:
+                    embeddings[i] = embedding
+                if cache is not None:
+                    key = keys[positions[0]]
+                    if cache.blocking:
+                        await asyncio.to_thread(cache.set, key, embedding)
+                    else:
+                        cache.set(key, embedding)
+        return embeddings
+    
+    async def create_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Create embeddings for multiple texts, in input order."""
+        embeddings: List[List[float]] = [None] * len(texts)
+        async for start, batch in self.embed_batches(texts):
+            embeddings[start:start + len(batch)] = batch
+        return embeddings
+    
+    def pack_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """
+        Split `texts` into contiguous [start, end) ranges that each fit the
+        per-request token budget and input-count limit.
+        """
+        batches = []
+        start = 0
+        batch_tokens = 0
+        for i, tokens in enumerate(count_tokens_batch(texts)):
+            over_budget = batch_tokens + tokens > settings.embedding_batch_max_tokens
+            too_many = i - start >= settings.embedding_batch_max_inputs
+            if i > start and (over_budget or too_many):
+                batches.append((start, i))
+                start = i
+                batch_tokens = 0
+            batch_tokens += tokens
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        return batches
     
-    def create_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
-        """Create embeddings for multiple texts."""
+    async def embed_batches(self, texts: List[str]) -> AsyncIterator[Tuple[int, List[List[float]]]]:
+        """
+        Embed `texts` as token-budgeted batches, with at most
+        `embedding_concurrency` requests in flight.
+        
+        Yields (start_index, embeddings) for each batch as soon as it completes,
+        so callers can persist results while later batches are still running.
+        """
+        semaphore = asyncio.Semaphore(settings.embedding_concurrency)
+        
+        async def run(start: int, end: int) -> Tuple[int, List[List[float]]]:
+            async with semaphore:
+                return start, await self._embed_with_retry(texts[start:end])
+        
+        tasks = [asyncio.create_task(run(start, end)) for start, end in self.pack_batches(texts)]
         try:
-            response = client.embeddings.create(
-                model=self.model,
-                input=texts
-            )
-            return [item.embedding for item in response.data]
-        except Exception as e:
-            raise ValueError(f"Failed to create embeddings: {str(e)}")
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        """One embeddings.create call, retried with exponential backoff and jitter."""
+        for attempt in range(settings.embedding_max_retries + 1):
+            try:
+                with span("embedding_batch"):
+                    response = await client.embeddings.create(
+                        model=self.model,
+                        input=texts
+                    )
+                record_request("embeddings", "ok")
+                record_usage(self.model, getattr(response, "usage", None))
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except RETRYABLE_ERRORS as e:
+                record_request("embeddings", "retryable_error")
+                if attempt == settings.embedding_max_retries:
+                    raise ValueError(f"Failed to create embeddings after {attempt + 1} attempts: {str(e)}")
+                await asyncio.sleep(self._retry_delay(e, attempt))
+            except Exception as e:
+                record_request("embeddings", "error")
+                raise ValueError(f"Failed to create embeddings: {str(e)}")
+    
+    @staticmethod
+    def _retry_delay(error: Exception, attempt: int) -> float:
+        """Honour Retry-After when the API sends it, else capped exponential backoff with full jitter."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), settings.embedding_retry_max_delay)
+            except ValueError:
+                pass
+        ceiling = min(settings.embedding_retry_max_delay, settings.embedding_retry_base_delay * 2 ** attempt)
+        return random.uniform(0, ceiling)
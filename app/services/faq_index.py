@@ -0,0 +1,350 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Set, Tuple
+import asyncio
+import re
+import time
+import zlib
+import numpy as np
+from app.config import get_settings
+from app.models import DocumentChunk
+from app.services.embedding_cache import normalize_query
+from app.services.filters import METADATA_FIELDS, ChunkFilters
+
+settings = get_settings()
+
+PUNCTUATION = re.compile(r"[^\w\s]+")
+DIGIT = re.compile(r"\d")
+
+# MinHash permutations h(x) = (a * x + b) mod p over 32-bit trigram hashes; with
+# a, b < 2**32 the products wrap p many times yet stay inside uint64
+MINHASH_PRIME = 4294967311
+MINHASH_SEED = 20240601
+
+
+def has_question():
+    """WHERE clause for the chunks this index is built from (Q&A entries)."""
+    return DocumentChunk.doc_metadata["question"].as_string().isnot(None)
+
+
+def normalize_question(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a question."""
+    return " ".join(PUNCTUATION.sub(" ", normalize_query(text)).split())
+
+
+def trigrams(normalized: str) -> FrozenSet[str]:
+    """Character trigrams of a normalized question, padded so short words count."""
+    padded = f"  {normalized} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def identifiers(normalized: str) -> FrozenSet[str]:
+    """Tokens containing a digit (form numbers, versions, amounts) that a near match must repeat exactly."""
+    return frozenset(token for token in normalized.split() if DIGIT.search(token))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+class FAQEntry(NamedTuple):
+    """A known question (a structured Q&A chunk) and its stored answer."""
+    chunk_id: int
+    document_name: str
+    question: str
+    answer: str
+    fields: Dict[str, Optional[str]]  # filterable metadata (file_type, category, intent)
+
+
+class FAQMatch(NamedTuple):
+    entry: FAQEntry
+    similarity: float  # 1.0 for exact matches, trigram Jaccard otherwise
+    exact: bool
+
+
+class FAQState(NamedTuple):
+    """Immutable snapshot of the index; swapped atomically on every change."""
+    entries: Dict[int, FAQEntry]                            # chunk_id -> entry
+    exact: Dict[str, Tuple[int, ...]]                       # normalized question -> chunk ids
+    grams: Dict[int, FrozenSet[str]]                        # chunk_id -> trigrams
+    identifiers: Dict[int, FrozenSet[str]]                  # chunk_id -> identifiers()
+    buckets: Dict[Tuple[int, bytes], FrozenSet[int]]        # (band, signature slice) -> chunk ids
+    keys: Dict[int, Tuple[str, List[Tuple[int, bytes]]]]    # chunk_id -> (normalized question, band keys)
+    document_chunks: Dict[str, Tuple[int, ...]]             # document -> chunk ids of its entries
+    question_rows: Dict[str, Tuple[int, ...]]               # document -> ids of has_question() chunks
+    signature: Tuple[int, int]                              # corpus_signature of question_rows
+
+
+def _empty_state() -> FAQState:
+    return FAQState(
+        entries={}, exact={}, grams={}, identifiers={}, buckets={}, keys={},
+        document_chunks={}, question_rows={}, signature=(0, 0)
+    )
+
+
+class FAQIndex:
+    """
+    Pre-retrieval lookup of known questions (see the `question`/`answer`
+    metadata of structured Q&A chunks).
+
+    A question is first looked up by its normalized text; on a miss, MinHash
+    LSH over character trigrams proposes near-duplicates, which are accepted
+    if their exact trigram Jaccard similarity reaches `threshold` and they
+    contain the same identifiers ("form I-130" is not "form I-131"). Neither
+    step needs an embedding. Entries are updated per document at ingest time
+    and reloaded when another worker changes the corpus.
+    """
+
+    def __init__(self, threshold: float, permutations: int = 64, bands: int = 16):
+        self.threshold = threshold
+        self.bands = max(1, min(bands, permutations))
+        self.rows = max(1, permutations // self.bands)
+        rng = np.random.default_rng(MINHASH_SEED)
+        count = self.bands * self.rows
+        self._a = rng.integers(1, 1 << 32, size=count, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=count, dtype=np.uint64)
+        # lookup() runs on the event loop while new states are built in worker threads
+        self._state = _empty_state()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._state.entries)
+
+    @staticmethod
+    async def corpus_signature(db: AsyncSession) -> Tuple[int, int]:
+        """(row count, max id) of the Q&A chunks in the database."""
+        result = await db.execute(
+            select(func.count(DocumentChunk.id), func.max(DocumentChunk.id)).where(has_question())
+        )
+        count, max_id = result.one()
+        return int(count or 0), int(max_id or 0)
+
+    def signature(self) -> Tuple[int, int]:
+        """corpus_signature of the chunks this index holds, so other workers' commits show up as a difference."""
+        return self._state.signature
+
+    def _minhash(self, grams: FrozenSet[str]) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams)
+        )
+        values = (np.outer(self._a, hashes) + self._b[:, None]) % np.uint64(MINHASH_PRIME)
+        return values.min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def _entry(chunk_id: int, document_name: str, metadata: Optional[Mapping]) -> Optional[FAQEntry]:
+        metadata = metadata or {}
+        question, answer = metadata.get("question"), metadata.get("answer")
+        if not (question and answer):
+            return None
+        return FAQEntry(
+            chunk_id=int(chunk_id),
+            document_name=document_name,
+            question=question,
+            answer=answer,
+            fields={field: metadata.get(field) or None for field in METADATA_FIELDS}
+        )
+
+    def _build(
+        self,
+        state: FAQState,
+        rows: Iterable[Tuple[int, str, Optional[Mapping]]],
+        document_name: Optional[str] = None
+    ) -> FAQState:
+        """
+        A new state: `state` with the chunks of `document_name` (if given) replaced
+        by `rows` of (id, document_name, metadata) of has_question() chunks.
+        `state` itself is not modified, so lookups can keep reading it meanwhile.
+        """
+        entries, grams, keys = dict(state.entries), dict(state.grams), dict(state.keys)
+        chunk_identifiers = dict(state.identifiers)
+        document_chunks, question_rows = dict(state.document_chunks), dict(state.question_rows)
+        # Copies of the exact-match lists and LSH buckets this change touches
+        exact: Dict[str, List[int]] = {}
+        buckets: Dict[Tuple[int, bytes], Set[int]] = {}
+
+        def exact_ids(normalized: str) -> List[int]:
+            if normalized not in exact:
+                exact[normalized] = list(state.exact.get(normalized, ()))
+            return exact[normalized]
+
+        def bucket(key: Tuple[int, bytes]) -> Set[int]:
+            if key not in buckets:
+                buckets[key] = set(state.buckets.get(key, ()))
+            return buckets[key]
+
+        if document_name is not None:
+            question_rows.pop(document_name, None)
+            for chunk_id in document_chunks.pop(document_name, ()):
+                del entries[chunk_id], grams[chunk_id], chunk_identifiers[chunk_id]
+                normalized, band_keys = keys.pop(chunk_id)
+                exact_ids(normalized).remove(chunk_id)
+                for key in band_keys:
+                    bucket(key).discard(chunk_id)
+
+        added_rows: Dict[str, List[int]] = {}
+        added_chunks: Dict[str, List[int]] = {}
+        for chunk_id, name, metadata in rows:
+            chunk_id = int(chunk_id)
+            added_rows.setdefault(name, []).append(chunk_id)
+            entry = self._entry(chunk_id, name, metadata)
+            normalized = normalize_question(entry.question) if entry is not None else ""
+            if not normalized:
+                continue
+            chunk_grams = trigrams(normalized)
+            band_keys = self._band_keys(self._minhash(chunk_grams))
+            entries[chunk_id] = entry
+            grams[chunk_id] = chunk_grams
+            chunk_identifiers[chunk_id] = identifiers(normalized)
+            keys[chunk_id] = (normalized, band_keys)
+            exact_ids(normalized).append(chunk_id)
+            for key in band_keys:
+                bucket(key).add(chunk_id)
+            added_chunks.setdefault(name, []).append(chunk_id)
+        question_rows.update((name, tuple(ids)) for name, ids in added_rows.items())
+        document_chunks.update((name, tuple(ids)) for name, ids in added_chunks.items())
+
+        new_exact = dict(state.exact)
+        for normalized, chunk_ids in exact.items():
+            if chunk_ids:
+                new_exact[normalized] = tuple(chunk_ids)
+            else:
+                new_exact.pop(normalized, None)
+        new_buckets = dict(state.buckets)
+        for key, chunk_ids in buckets.items():
+            if chunk_ids:
+                new_buckets[key] = frozenset(chunk_ids)
+            else:
+                new_buckets.pop(key, None)
+
+        ids = [chunk_id for chunk_ids in question_rows.values() for chunk_id in chunk_ids]
+        return FAQState(
+            entries=entries,
+            exact=new_exact,
+            grams=grams,
+            identifiers=chunk_identifiers,
+            buckets=new_buckets,
+            keys=keys,
+            document_chunks=document_chunks,
+            question_rows=question_rows,
+            signature=(len(ids), max(ids, default=0))
+        )
+
+    async def load(self, db: AsyncSession) -> int:
+        """(Re)build the index from every Q&A chunk in the database. Returns number of entries."""
+        async with self._lock:
+            result = await db.execute(
+                select(DocumentChunk.id, DocumentChunk.document_name, DocumentChunk.doc_metadata)
+                .where(has_question())
+                .order_by(DocumentChunk.id)
+            )
+            rows = result.all()
+            self._state = await asyncio.to_thread(self._build, _empty_state(), rows)
+            self._checked_at = time.monotonic()
+            return len(self._state.entries)
+
+    async def ensure_fresh(self, db: AsyncSession) -> None:
+        """Reload if another worker changed the corpus (same policy as VectorIndex)."""
+        now = time.monotonic()
+        if now - self._checked_at < settings.vector_index_refresh_seconds:
+            return
+        self._checked_at = now
+        if await self.corpus_signature(db) != self.signature():
+            await self.load(db)
+
+    async def replace_document(
+        self,
+        db: AsyncSession,
+        document_name: str,
+        ids: Sequence[int],
+        metadata: Sequence[Optional[dict]]
+    ) -> None:
+        """Swap in the (already committed) chunks of one document."""
+        rows = [
+            (chunk_id, document_name, chunk_metadata)
+            for chunk_id, chunk_metadata in zip(ids, metadata)
+            if (chunk_metadata or {}).get("question") is not None
+        ]
+        async with self._lock:
+            self._state = await asyncio.to_thread(self._build, self._state, rows, document_name)
+
+    @staticmethod
+    def _allowed(entry: FAQEntry, filters: Optional[ChunkFilters]) -> bool:
+        for field, values in (filters or {}).items():
+            value = entry.document_name if field == "document_name" else entry.fields.get(field)
+            if value not in values:
+                return False
+        return True
+
+    def lookup(self, question: str, filters: Optional[ChunkFilters] = None) -> Optional[FAQMatch]:
+        """Return the known question matching `question` exactly or near-exactly, if any."""
+        normalized = normalize_question(question)
+        state = self._state
+        match = None
+        if normalized:
+            for chunk_id in state.exact.get(normalized, ()):
+                if self._allowed(state.entries[chunk_id], filters):
+                    match = FAQMatch(state.entries[chunk_id], 1.0, exact=True)
+                    break
+            if match is None and state.entries:
+                match = self._near(state, normalized, filters)
+
+        if match is None:
+            self.misses += 1
+        elif match.exact:
+            self.exact_hits += 1
+        else:
+            self.near_hits += 1
+        return match
+
+    def _near(self, state: FAQState, normalized: str, filters: Optional[ChunkFilters]) -> Optional[FAQMatch]:
+        grams, required = trigrams(normalized), identifiers(normalized)
+        candidates = set()
+        for key in self._band_keys(self._minhash(grams)):
+            candidates.update(state.buckets.get(key, ()))
+
+        best = None
+        for chunk_id in candidates:
+            if state.identifiers[chunk_id] != required:
+                continue
+            similarity = jaccard(grams, state.grams[chunk_id])
+            if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                entry = state.entries[chunk_id]
+                if self._allowed(entry, filters):
+                    best = FAQMatch(entry, similarity, exact=False)
+        return best
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring."""
+        hits = self.exact_hits + self.near_hits
+        total = hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": hits,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0
+        }
+
+
+@lru_cache()
+def get_faq_index() -> Optional[FAQIndex]:
+    """Get the process-wide FAQ index, or None if the fast path is disabled."""
+    if not settings.faq_fast_path_enabled:
+        return None
+    return FAQIndex(
+        threshold=settings.faq_near_duplicate_threshold,
+        permutations=settings.faq_minhash_permutations,
+        bands=settings.faq_minhash_bands
+    )
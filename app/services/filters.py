@@ -0,0 +1,63 @@
+from sqlalchemy import String, literal_column
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+from app.models import DocumentChunk
+
+# Chunk metadata keys that retrieval can be scoped by (besides document_name)
+METADATA_FIELDS = ("file_type", "category", "intent")
+FILTER_FIELDS = ("document_name",) + METADATA_FIELDS
+
+# field -> accepted values; a chunk matches if every field has one of its values
+ChunkFilters = Dict[str, Tuple[str, ...]]
+
+
+def chunk_filters(
+    document_name: Optional[str] = None,
+    filters: Optional[Mapping[str, Union[str, Sequence[str], None]]] = None
+) -> Optional[ChunkFilters]:
+    """
+    Normalize a request's filters: single values become one-element tuples,
+    empty fields are dropped, and `document_name` is merged in.
+
+    Raises:
+        ValueError: for fields that are not in FILTER_FIELDS
+    """
+    normalized: ChunkFilters = {}
+    for field, values in (filters or {}).items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Cannot filter by '{field}'. Filterable fields: {', '.join(FILTER_FIELDS)}")
+        if values is None:
+            continue
+        values = (values,) if isinstance(values, str) else tuple(dict.fromkeys(values))
+        if values:
+            normalized[field] = values
+    if document_name:
+        if "document_name" in normalized and document_name not in normalized["document_name"]:
+            raise ValueError("document_name conflicts with filters.document_name")
+        normalized["document_name"] = (document_name,)
+    return normalized or None
+
+
+def metadata_fields(metadata: Optional[dict]) -> Dict[str, Optional[str]]:
+    """The filterable fields of a chunk's metadata (None where absent)."""
+    metadata = metadata or {}
+    return {
+        field: str(metadata[field]) if metadata.get(field) not in (None, "") else None
+        for field in METADATA_FIELDS
+    }
+
+
+def filter_clauses(filters: Optional[ChunkFilters]) -> List:
+    """
+    WHERE clauses for `filters` on document_chunks (PostgreSQL).
+
+    Metadata fields are compared as `metadata ->> 'field'`, which the
+    expression indexes in init_db.sql cover.
+    """
+    clauses = []
+    for field, values in (filters or {}).items():
+        if field == "document_name":
+            clauses.append(DocumentChunk.document_name.in_(values))
+        else:
+            # `field` is one of METADATA_FIELDS, never user input
+            clauses.append(literal_column(f"(metadata ->> '{field}')", String).in_(values))
+    return clauses
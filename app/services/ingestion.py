@@ -0,0 +1,306 @@
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Awaitable, BinaryIO, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from app.config import get_settings
+from app.models import ChunkEmbedding, DocumentChunk
+from app.services.answer_cache import get_answer_cache
+from app.services.chunk_store import replace_document_chunks
+from app.services.document_processor import DocumentProcessor, DocumentSource, embedding_input
+from app.services.embeddings import EmbeddingService
+from app.services.faq_index import get_faq_index
+from app.services.lexical_index import get_lexical_index
+from app.services.metrics import record_stage, span
+from app.services.vector_index import get_vector_index
+
+settings = get_settings()
+
+# Keeps IN (...) lists well below driver parameter limits
+LOOKUP_BATCH_SIZE = 1000
+
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+# progress(stage, **counts): called as ingestion moves through its stages
+ProgressCallback = Callable[..., Awaitable[None]]
+
+
+class IngestResult(NamedTuple):
+    """Outcome of ingesting one document."""
+    document_name: str
+    chunks_created: int
+    chunks_embedded: int
+    chunks_reused: int
+    skipped: bool
+
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(SPOOL_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def spool_upload(upload: BinaryIO, suffix: str = "", directory: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Copy an uploaded file to a temporary file on disk, hashing it on the way.
+
+    Returns:
+        Tuple of (path, sha256 hex digest); the caller deletes the file
+    """
+    digest = hashlib.sha256()
+    spool_dir = directory or settings.upload_spool_dir or None
+    with tempfile.NamedTemporaryFile(suffix=suffix, dir=spool_dir, delete=False) as spooled:
+        try:
+            while block := upload.read(SPOOL_BLOCK_SIZE):
+                digest.update(block)
+                spooled.write(block)
+        except Exception:
+            os.unlink(spooled.name)
+            raise
+    return spooled.name, digest.hexdigest()
+
+
+def chunk_hash(chunk_text: str) -> str:
+    """Content hash of the text a chunk is embedded by, independent of its document."""
+    return sha256_hex(chunk_text.encode("utf-8"))
+
+
+def insert_ignore(db: AsyncSession, model):
+    """INSERT ... ON CONFLICT DO NOTHING for the session's dialect."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model).on_conflict_do_nothing()
+
+
+async def sync_search_state(
+    db: AsyncSession,
+    document_name: str,
+    ids: Sequence[int] = (),
+    embeddings: Sequence[Sequence[float]] = (),
+    texts: Sequence[str] = (),
+    metadata: Sequence[dict] = ()
+) -> None:
+    """Bring the in-memory indexes (vector, lexical, FAQ) and the answer cache in line with a changed document."""
+    if not settings.use_pgvector:
+        await get_vector_index().replace_document(db, document_name, ids, embeddings, metadata)
+        if settings.hybrid_search_enabled:
+            await get_lexical_index().replace_document(db, document_name, ids, texts)
+    faq_index = get_faq_index()
+    if faq_index is not None:
+        await faq_index.replace_document(db, document_name, ids, metadata)
+    answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        answer_cache.invalidate_document(document_name)
+
+
+async def _ignore_progress(stage: str, **counts) -> None:
+    pass
+
+
+class IngestionService:
+    """
+    Incremental document ingestion.
+
+    Every chunk is stored with a content hash, and embeddings live in a
+    (content_hash, model) store. Re-uploading a document only embeds chunks
+    whose text is new, and a byte-identical upload is skipped outright.
+    """
+
+    def __init__(self):
+        self.embedding_service = EmbeddingService()
+        self.model = settings.openai_embedding_model
+        self.processor = DocumentProcessor(
+            chunk_size=settings.chunk_size,
+            chunk_overlap=settings.chunk_overlap,
+            pdf_workers=settings.pdf_workers,
+            pdf_parallel_min_pages=settings.pdf_parallel_min_pages,
+            pdf_pages_per_task=settings.pdf_pages_per_task,
+            qa_structured=settings.qa_structured_ingest
+        )
+
+    async def ingest(
+        self,
+        db: AsyncSession,
+        filename: str,
+        source: DocumentSource,
+        document_hash: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None
+    ) -> IngestResult:
+        """
+        Extract, chunk, embed (only what changed) and store one document.
+
+        `source` is the file content or a path to it (see spool_upload); paths
+        let large PDFs be parsed page-parallel without loading them into memory.
+        `progress` is awaited with the stage ("extracting", "embedding",
+        "storing") and chunk counts as they become known.
+        """
+        report = progress or _ignore_progress
+        if document_hash is None:
+            if isinstance(source, (bytes, bytearray)):
+                document_hash = sha256_hex(source)
+            else:
+                document_hash = await asyncio.to_thread(file_sha256, source)
+        unchanged_chunks = await self._unchanged_chunk_count(db, filename, document_hash)
+        if unchanged_chunks:
+            return IngestResult(filename, unchanged_chunks, 0, unchanged_chunks, skipped=True)
+
+        await report("extracting")
+        with span("ingest_extract"):
+            chunks, metadata, chunk_fields = await asyncio.to_thread(
+                self.processor.process_document, source, filename
+            )
+        metadata["embedding_model"] = self.model
+        chunk_metadata = self._chunk_metadata(metadata, chunk_fields)
+        # Q&A entries are embedded by their question, so questions match questions
+        inputs = [embedding_input(chunk, fields) for chunk, fields in zip(chunks, chunk_fields)]
+        hashes = [chunk_hash(text) for text in inputs]
+
+        # Reuse stored vectors; embed each distinct missing text once
+        vectors = await self._stored_embeddings(db, set(hashes))
+        missing = {}
+        for content_hash, text in zip(hashes, inputs):
+            if content_hash not in vectors:
+                missing.setdefault(content_hash, text)
+        missing_hashes = list(missing)
+        missing_texts = list(missing.values())
+        await report(
+            "embedding",
+            chunks_total=len(chunks),
+            chunks_to_embed=len(missing_texts),
+            chunks_embedded=0
+        )
+        embedded = 0
+
+        # Each batch is committed to the embedding store as it completes, so an
+        # interrupted ingest keeps every vector it already paid for
+        embedding_started = time.perf_counter()
+        async for start, batch_embeddings in self.embedding_service.embed_batches(missing_texts):
+            batch_hashes = missing_hashes[start:start + len(batch_embeddings)]
+            await db.execute(
+                insert_ignore(db, ChunkEmbedding),
+                [
+                    {"content_hash": content_hash, "model": self.model, "embedding": embedding}
+                    for content_hash, embedding in zip(batch_hashes, batch_embeddings)
+                ]
+            )
+            await db.commit()
+            vectors.update(zip(batch_hashes, batch_embeddings))
+            embedded += len(batch_embeddings)
+            await report("embedding", chunks_embedded=embedded)
+
+        record_stage("ingest_embed", time.perf_counter() - embedding_started)
+
+        await report("storing")
+        embeddings = [vectors[content_hash] for content_hash in hashes]
+        with span("ingest_store"):
+            ids = await self._replace_chunks(
+                db, filename, document_hash, chunks, hashes, embeddings, chunk_metadata
+            )
+        with span("ingest_index"):
+            await sync_search_state(db, filename, ids, embeddings, chunks, chunk_metadata)
+
+        chunks_embedded = sum(1 for content_hash in hashes if content_hash in missing)
+        return IngestResult(
+            filename,
+            len(chunks),
+            chunks_embedded,
+            len(chunks) - chunks_embedded,
+            skipped=False
+        )
+
+    async def delete_document(self, db: AsyncSession, document_name: str) -> int:
+        """Delete all chunks of a document. Returns the number of chunks deleted."""
+        result = await db.execute(
+            delete(DocumentChunk).where(DocumentChunk.document_name == document_name)
+        )
+        await db.commit()
+        if result.rowcount:
+            await sync_search_state(db, document_name)
+        return result.rowcount
+
+    async def _unchanged_chunk_count(self, db: AsyncSession, filename: str, document_hash: str) -> int:
+        """Chunk count if this exact file was already ingested with the current settings, else 0."""
+        stored = (await db.execute(
+            select(DocumentChunk.document_hash, DocumentChunk.doc_metadata)
+            .where(DocumentChunk.document_name == filename)
+            .limit(1)
+        )).first()
+        if stored is None or stored.document_hash != document_hash:
+            return 0
+
+        metadata = stored.doc_metadata or {}
+        if (
+            metadata.get("embedding_model") != self.model
+            or metadata.get("chunk_size") != settings.chunk_size
+            or metadata.get("chunk_overlap") != settings.chunk_overlap
+            or metadata.get("splitter") != self.processor.splitter_version(filename)
+        ):
+            return 0
+
+        return (await db.execute(
+            select(func.count(DocumentChunk.id)).where(DocumentChunk.document_name == filename)
+        )).scalar() or 0
+
+    async def _stored_embeddings(self, db: AsyncSession, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        """Look up stored vectors for the given content hashes and the current model."""
+        hashes = list(hashes)
+        vectors = {}
+        for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+            result = await db.execute(
+                select(ChunkEmbedding.content_hash, ChunkEmbedding.embedding).where(
+                    ChunkEmbedding.model == self.model,
+                    ChunkEmbedding.content_hash.in_(hashes[start:start + LOOKUP_BATCH_SIZE])
+                )
+            )
+            vectors.update((row.content_hash, row.embedding) for row in result)
+        return vectors
+
+    @staticmethod
+    def _chunk_metadata(metadata: dict, chunk_fields: List[Dict[str, str]]) -> List[dict]:
+        """Document metadata plus each chunk's own fields; chunks with equal fields share one dict."""
+        shared = {}
+        result = []
+        for fields in chunk_fields:
+            key = tuple(sorted(fields.items()))
+            if key not in shared:
+                shared[key] = {**metadata, **fields} if fields else metadata
+            result.append(shared[key])
+        return result
+
+    async def _replace_chunks(
+        self,
+        db: AsyncSession,
+        filename: str,
+        document_hash: str,
+        chunks: List[str],
+        hashes: List[str],
+        embeddings: List[List[float]],
+        chunk_metadata: List[dict]
+    ) -> List[int]:
+        """Swap the document's chunks in one transaction. Returns the new chunk ids."""
+        rows = [
+            {
+                "document_name": filename,
+                "chunk_text": chunk_text,
+                "chunk_index": i,
+                "content_hash": content_hash,
+                "document_hash": document_hash,
+                "embedding": embedding,
+                "doc_metadata": metadata
+            }
+            for i, (chunk_text, content_hash, embedding, metadata) in enumerate(
+                zip(chunks, hashes, embeddings, chunk_metadata)
+            )
+        ]
+        return await replace_document_chunks(db, filename, rows)
@@ -0,0 +1,269 @@
+from sqlalchemy import and_, exists, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import aliased
+from datetime import timedelta
+from functools import lru_cache
+from typing import BinaryIO, List, Optional
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models import IngestJob, as_utc, utcnow
+from app.services.ingestion import IngestionService, IngestResult, spool_upload
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Embedding progress is written at most this often (stage changes always are)
+PROGRESS_INTERVAL_SECONDS = 1.0
+# pg_advisory_xact_lock key serializing claims across processes
+CLAIM_LOCK_KEY = 0x46494C4952  # "FILIR"
+
+
+def eta_seconds(job: IngestJob) -> Optional[float]:
+    """Remaining embedding time, extrapolated from the rate so far."""
+    if job.status != "running" or job.stage != "embedding" or not job.chunks_embedded:
+        return None
+    elapsed = (utcnow() - as_utc(job.stage_started_at)).total_seconds()
+    remaining = max(0, job.chunks_to_embed - job.chunks_embedded)
+    return round(remaining * elapsed / job.chunks_embedded, 1)
+
+
+class JobProgress:
+    """Progress callback for IngestionService that records stage and counts on the job row."""
+
+    def __init__(self, queue: "IngestJobQueue", job_id: str):
+        self.queue = queue
+        self.job_id = job_id
+        self.stage = None
+        self.last_write = 0.0
+
+    async def __call__(self, stage: str, **counts) -> None:
+        now = time.monotonic()
+        if stage == self.stage and now - self.last_write < PROGRESS_INTERVAL_SECONDS:
+            return
+        values = dict(counts, heartbeat_at=utcnow())
+        if stage != self.stage:
+            values.update(stage=stage, stage_started_at=values["heartbeat_at"])
+            self.stage = stage
+        self.last_write = now
+        await self.queue.update(self.job_id, **values)
+
+
+class IngestJobQueue:
+    """
+    Ingestion queue backed by the ingest_jobs table; no external broker.
+
+    Each API process runs a few async workers that claim queued jobs with
+    SELECT ... FOR UPDATE SKIP LOCKED, so several processes can share the
+    queue. Only one job per document runs at a time, across processes on
+    PostgreSQL (claims are serialized by an advisory lock) and within a
+    process on SQLite. Running jobs send heartbeats; a job whose heartbeat
+    stops (e.g. the process crashed) is claimed again, and a job interrupted
+    by a clean shutdown is re-queued at once. Either way it resumes cheaply,
+    because every embedding batch was already committed to the embedding
+    store.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker = AsyncSessionLocal):
+        self.session_factory = session_factory
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+
+    async def submit(self, db: AsyncSession, filename: str, upload: BinaryIO) -> IngestJob:
+        """Spool an upload to the job directory and enqueue it."""
+        os.makedirs(settings.ingest_job_dir, exist_ok=True)
+        path, document_hash = await asyncio.to_thread(
+            spool_upload, upload, os.path.splitext(filename)[1], settings.ingest_job_dir
+        )
+        job = IngestJob(
+            id=uuid.uuid4().hex,
+            document_name=filename,
+            file_path=os.path.abspath(path),
+            document_hash=document_hash,
+            status="queued",
+            stage="queued",
+            chunks_total=0,
+            chunks_to_embed=0,
+            chunks_embedded=0,
+            chunks_reused=0,
+            skipped=0,
+            attempts=0,
+            created_at=utcnow()
+        )
+        db.add(job)
+        try:
+            await db.commit()
+        except Exception:
+            os.unlink(path)
+            raise
+        self._wakeup.set()
+        return job
+
+    async def get(self, db: AsyncSession, job_id: str) -> Optional[IngestJob]:
+        return await db.get(IngestJob, job_id)
+
+    async def recent(self, db: AsyncSession, status: Optional[str] = None, limit: int = 100) -> List[IngestJob]:
+        query = select(IngestJob).order_by(IngestJob.created_at.desc()).limit(limit)
+        if status:
+            query = query.where(IngestJob.status == status)
+        return list((await db.scalars(query)).all())
+
+    async def update(self, job_id: str, **values) -> None:
+        async with self.session_factory() as db:
+            await db.execute(update(IngestJob).where(IngestJob.id == job_id).values(**values))
+            await db.commit()
+
+    async def claim(self) -> Optional[IngestJob]:
+        """Take the oldest runnable job: queued, or running with a stale heartbeat."""
+        stale = utcnow() - timedelta(seconds=settings.ingest_job_stale_seconds)
+        other = aliased(IngestJob)
+        # One job per document at a time, so concurrent uploads of a file replace each other in order.
+        # NOT EXISTS only sees committed claims, so claims are serialized: by _claim_lock within
+        # this process and, on PostgreSQL, by a transaction-level advisory lock across processes
+        document_busy = exists().where(
+            other.document_name == IngestJob.document_name,
+            other.id != IngestJob.id,
+            other.status == "running",
+            other.heartbeat_at >= stale
+        )
+        async with self._claim_lock, self.session_factory() as db:
+            if db.get_bind().dialect.name == "postgresql":
+                await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CLAIM_LOCK_KEY})
+            job = (await db.scalars(
+                select(IngestJob)
+                .where(
+                    or_(
+                        IngestJob.status == "queued",
+                        and_(IngestJob.status == "running", IngestJob.heartbeat_at < stale)
+                    ),
+                    ~document_busy
+                )
+                .order_by(IngestJob.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )).first()
+            if job is None:
+                return None
+
+            now = utcnow()
+            job.status = "running"
+            job.stage = "queued"
+            job.attempts += 1
+            job.worker_id = self.worker_id
+            job.started_at = job.started_at or now
+            job.stage_started_at = now
+            job.heartbeat_at = now
+            job.error = None
+            await db.commit()
+            return job
+
+    async def run(self, job: IngestJob) -> None:
+        """Process one claimed job and record its outcome."""
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            async with self.session_factory() as db:
+                result = await IngestionService().ingest(
+                    db,
+                    job.document_name,
+                    job.file_path,
+                    job.document_hash,
+                    progress=JobProgress(self, job.id)
+                )
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so the next worker resumes it right away
+            await asyncio.shield(self.update(job.id, status="queued", stage="queued"))
+            raise
+        except Exception as e:
+            # Unreadable or unsupported files (ValueError) won't succeed on retry
+            final = (
+                isinstance(e, (ValueError, FileNotFoundError))
+                or job.attempts >= settings.ingest_job_max_attempts
+            )
+            await self.update(
+                job.id,
+                status="failed" if final else "queued",
+                stage="failed" if final else "queued",
+                error=str(e),
+                finished_at=utcnow() if final else None
+            )
+            if final:
+                self._remove_file(job.file_path)
+            return
+        finally:
+            heartbeat.cancel()
+
+        await self._finish(job, result)
+
+    async def _finish(self, job: IngestJob, result: IngestResult) -> None:
+        await self.update(
+            job.id,
+            status="done",
+            stage="done",
+            chunks_total=result.chunks_created,
+            chunks_embedded=result.chunks_embedded,
+            chunks_reused=result.chunks_reused,
+            skipped=int(result.skipped),
+            finished_at=utcnow()
+        )
+        self._remove_file(job.file_path)
+
+    async def _heartbeat(self, job_id: str) -> None:
+        """Keep the claim alive through long stages that report no progress (e.g. PDF parsing)."""
+        while True:
+            await asyncio.sleep(settings.ingest_job_heartbeat_seconds)
+            try:
+                await self.update(job_id, heartbeat_at=utcnow())
+            except Exception as e:
+                logger.warning("Heartbeat failed for ingest job %s: %s", job_id, e)
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                job = await self.claim()
+            except Exception:
+                logger.exception("Failed to claim an ingest job")
+                job = None
+            if job is not None:
+                try:
+                    await self.run(job)
+                except Exception:
+                    # e.g. the database went away while recording the outcome; the job's
+                    # heartbeat goes stale and it is claimed again once the database is back
+                    logger.exception("Ingest job %s could not be completed", job.id)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.ingest_job_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, workers: int) -> None:
+        """Start `workers` job workers on the running event loop."""
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers; jobs they were running are re-queued so any worker resumes them right away."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+@lru_cache()
+def get_job_queue() -> IngestJobQueue:
+    """Process-wide ingestion job queue."""
+    return IngestJobQueue()
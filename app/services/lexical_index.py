@@ -0,0 +1,197 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+from functools import lru_cache
+import asyncio
+import math
+import re
+import threading
+import time
+import numpy as np
+from app.config import get_settings
+from app.models import DocumentChunk
+from app.services.vector_index import VectorIndex
+
+settings = get_settings()
+
+# Keeps identifiers such as "I-130", "239.8A" or "address_validation_error" whole
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+PART_PATTERN = re.compile(r"[-./]")
+
+STOPWORDS = frozenset("""
+a about an and are as at be but by can do does for from has have how i if in into is it
+its me my no not of on or our so than that the their them then there these they this to
+was we what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms for BM25. Compound identifiers are indexed whole and by
+    their parts, so "I-130" matches both "i-130" and "130".
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token not in STOPWORDS:
+            terms.append(token)
+        if PART_PATTERN.search(token):
+            terms.extend(part for part in PART_PATTERN.split(token) if part and part not in STOPWORDS)
+    return terms
+
+
+class LexicalIndex:
+    """
+    Process-resident BM25 inverted index over chunk_text (memory backend).
+
+    Postings are updated per document as chunks are replaced, and reloaded
+    from the database when another worker changes the corpus.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}   # term -> {chunk_id: term frequency}
+        self._lengths: Dict[int, int] = {}                # chunk_id -> terms in chunk
+        self._chunk_terms: Dict[int, List[str]] = {}      # chunk_id -> distinct terms
+        self._document_chunks: Dict[str, List[int]] = {}
+        self._total_length = 0
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+        # search() runs in worker threads while updates run on the event loop
+        self._mutex = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def signature(self) -> Tuple[int, int]:
+        """corpus_signature of the chunks this index holds (see VectorIndex.held_signature)."""
+        with self._mutex:
+            return len(self._lengths), max(self._lengths, default=0)
+
+    def _add(self, document_name: str, ids: Sequence[int], texts: Sequence[str]) -> None:
+        chunk_ids = self._document_chunks.setdefault(document_name, [])
+        for chunk_id, chunk_text in zip(ids, texts):
+            counts = Counter(tokenize(chunk_text))
+            for term, tf in counts.items():
+                self._postings.setdefault(term, {})[chunk_id] = tf
+            length = sum(counts.values())
+            self._lengths[chunk_id] = length
+            self._chunk_terms[chunk_id] = list(counts)
+            self._total_length += length
+            chunk_ids.append(chunk_id)
+
+    def _remove(self, document_name: str) -> None:
+        for chunk_id in self._document_chunks.pop(document_name, []):
+            for term in self._chunk_terms.pop(chunk_id, []):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(chunk_id, None)
+                    if not postings:
+                        del self._postings[term]
+            self._total_length -= self._lengths.pop(chunk_id, 0)
+
+    def _rebuild(self, rows) -> None:
+        with self._mutex:
+            self._postings, self._lengths, self._chunk_terms = {}, {}, {}
+            self._document_chunks, self._total_length = {}, 0
+            for row in rows:
+                self._add(row.document_name, [row.id], [row.chunk_text])
+
+    async def load(self, db: AsyncSession) -> int:
+        """(Re)build the whole index from the database. Returns number of chunks."""
+        async with self._lock:
+            result = await db.execute(
+                select(DocumentChunk.id, DocumentChunk.document_name, DocumentChunk.chunk_text)
+                .order_by(DocumentChunk.id)
+            )
+            rows = result.all()
+            # Tokenizing the corpus is CPU-bound; keep it off the event loop
+            await asyncio.to_thread(self._rebuild, rows)
+            self._checked_at = time.monotonic()
+            return len(self._lengths)
+
+    async def ensure_fresh(self, db: AsyncSession) -> None:
+        """Reload if another worker changed the corpus (same policy as VectorIndex)."""
+        now = time.monotonic()
+        if now - self._checked_at < settings.vector_index_refresh_seconds:
+            return
+        self._checked_at = now
+        if await VectorIndex.corpus_signature(db) != self.signature():
+            await self.load(db)
+
+    async def replace_document(
+        self,
+        db: AsyncSession,
+        document_name: str,
+        ids: Sequence[int],
+        texts: Sequence[str]
+    ) -> None:
+        """Swap in the (already committed) chunks of one document."""
+        async with self._lock:
+            def replace():
+                with self._mutex:
+                    self._remove(document_name)
+                    if len(ids):
+                        self._add(document_name, ids, texts)
+
+            await asyncio.to_thread(replace)
+
+    async def remove_document(self, db: AsyncSession, document_name: str) -> None:
+        """Drop every chunk belonging to `document_name`."""
+        await self.replace_document(db, document_name, [], [])
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        allowed_ids: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Return the `top_k` best BM25 matches as (chunk_id, score), best first.
+
+        Args:
+            query: Raw question text
+            top_k: Number of results to return
+            allowed_ids: Optional filter: only these chunks may match (see VectorIndex.matching_ids)
+        """
+        terms = set(tokenize(query))
+        k1, b = settings.bm25_k1, settings.bm25_b
+        with self._mutex:
+            count = len(self._lengths)
+            if not count or not terms:
+                return []
+            average_length = self._total_length / count
+
+            ids_parts, score_parts = [], []
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1.0 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                ids = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+                tf = np.fromiter(postings.values(), dtype=np.float64, count=len(postings))
+                lengths = np.fromiter(
+                    (self._lengths[chunk_id] for chunk_id in postings), dtype=np.float64, count=len(postings)
+                )
+                ids_parts.append(ids)
+                score_parts.append(idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths / average_length)))
+
+        if not ids_parts:
+            return []
+        chunk_ids, inverse = np.unique(np.concatenate(ids_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        if allowed_ids is not None:
+            keep = np.isin(chunk_ids, allowed_ids)
+            chunk_ids, scores = chunk_ids[keep], scores[keep]
+            if not len(chunk_ids):
+                return []
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(chunk_ids[i]), float(scores[i])) for i in top]
+
+
+@lru_cache()
+def get_lexical_index() -> LexicalIndex:
+    """Get the process-wide lexical index instance."""
+    return LexicalIndex()
@@ -0,0 +1,282 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import bisect
+import logging
+import threading
+import time
+from app.config import get_settings
+from app.services.answer_cache import get_answer_cache
+from app.services.embedding_cache import get_embedding_cache
+from app.services.faq_index import get_faq_index
+from app.services.sessions import get_session_store
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Seconds; covers cache hits (sub-millisecond) through long completions and PDF parsing
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+# Stage timings of the request being handled, for the Server-Timing header
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Counter:
+    """Monotonic counter with labels (Prometheus text format)."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels (Prometheus text format)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, List[float]] = {}  # bucket counts..., +Inf count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.label_names, key, le)} {_number(cumulative)}"
+            yield f"{self.name}_count{_labels(self.label_names, key)} {_number(cumulative)}"
+            yield f"{self.name}_sum{_labels(self.label_names, key)} {_number(values[-1])}"
+
+
+class Gauge:
+    """
+    Values read at scrape time from a callback returning {label values: value}.
+    `kind="counter"` exposes counters that are kept elsewhere (e.g. cache hits).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        collect: Callable[[], Dict[LabelValues, float]],
+        kind: str = "gauge"
+    ):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.collect = collect
+
+    def samples(self) -> Iterator[str]:
+        try:
+            values = self.collect()
+        except Exception:
+            logger.exception("Metric %s could not be collected", self.name)
+            return
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered for Prometheus on GET /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+        self.stage_seconds = self.add(Histogram(
+            "filir_stage_duration_seconds",
+            "Time spent in one stage of a request (embedding, similarity scoring, DB fetch, completion, ...)",
+            ["stage"]
+        ))
+        self.request_seconds = self.add(Histogram(
+            "filir_http_request_duration_seconds",
+            "HTTP request latency until the response headers are sent",
+            ["method", "route", "status"]
+        ))
+        self.openai_tokens = self.add(Counter(
+            "filir_openai_tokens_total",
+            "Tokens billed by the OpenAI API",
+            ["model", "kind"]
+        ))
+        self.openai_requests = self.add(Counter(
+            "filir_openai_requests_total",
+            "OpenAI API calls by endpoint and outcome",
+            ["endpoint", "outcome"]
+        ))
+        self.add(Gauge(
+            "filir_cache_hit_ratio",
+            "Hit ratio of each in-process cache since start",
+            ["cache"],
+            lambda: {(name,): stats["hit_ratio"] for name, stats in cache_stats().items()}
+        ))
+        self.add(Gauge(
+            "filir_cache_entries",
+            "Entries held by each cache",
+            ["cache"],
+            lambda: {(name,): stats["entries"] for name, stats in cache_stats().items()}
+        ))
+        self.add(Gauge(
+            "filir_cache_lookups_total",
+            "Cache lookups since start, by result",
+            ["cache", "result"],
+            lambda: {
+                key: value
+                for name, stats in cache_stats().items()
+                for key, value in (((name, "hit"), stats["hits"]), ((name, "miss"), stats["misses"]))
+            },
+            kind="counter"
+        ))
+        self.add(Gauge(
+            "filir_faq_lookups_total",
+            "FAQ fast-path lookups since start, by result (exact, near-duplicate or miss)",
+            ["result"],
+            faq_lookups,
+            kind="counter"
+        ))
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+def cache_stats() -> Dict[str, dict]:
+    """stats() of every cache that is enabled in this process."""
+    caches = {
+        "embedding": get_embedding_cache(),
+        "answer": get_answer_cache(),
+        "session": get_session_store(),
+        "faq": get_faq_index()
+    }
+    return {name: cache.stats() for name, cache in caches.items() if cache is not None}
+
+
+def faq_lookups() -> Dict[LabelValues, float]:
+    faq_index = get_faq_index()
+    if faq_index is None:
+        return {}
+    return {("exact",): faq_index.exact_hits, ("near",): faq_index.near_hits, ("miss",): faq_index.misses}
+
+
+@lru_cache()
+def get_metrics() -> MetricsRegistry:
+    """Get the process-wide metrics registry."""
+    return MetricsRegistry()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time a block as one request stage: observed in the stage histogram and,
+    inside an HTTP request, listed in its Server-Timing header.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Record a stage duration measured elsewhere (e.g. time to first streamed token)."""
+    get_metrics().stage_seconds.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+def record_usage(model: str, usage) -> None:
+    """Count the tokens reported in an OpenAI response's `usage`."""
+    if usage is None:
+        return
+    tokens = get_metrics().openai_tokens
+    for kind in ("prompt_tokens", "completion_tokens"):
+        count = getattr(usage, kind, None)
+        if count:
+            tokens.inc(count, model=model, kind=kind.split("_")[0])
+
+
+def record_request(endpoint: str, outcome: str) -> None:
+    """Count one OpenAI API call ("ok" or "error")."""
+    get_metrics().openai_requests.inc(endpoint=endpoint, outcome=outcome)
+
+
+def start_request_timings() -> List[Tuple[str, float]]:
+    """Collect stage timings for the current request; returns the list spans append to."""
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total: float) -> str:
+    """Format stage timings as a Server-Timing header (durations in ms; repeated stages summed)."""
+    merged: Dict[str, float] = {}
+    for stage, seconds in timings:
+        merged[stage] = merged.get(stage, 0.0) + seconds
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in merged.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
@@ -1,12 +1,22 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from sqlalchemy import String, cast, func, literal_column, select, text
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
 import numpy as np
+from app.config import get_settings
 from app.models import DocumentChunk
 from app.services.embeddings import EmbeddingService
+from app.services.filters import ChunkFilters, chunk_filters, filter_clauses
+from app.services.lexical_index import get_lexical_index
+from app.services.metrics import span
+from app.services.vector_index import get_vector_index
+
+settings = get_settings()
 
 
 class RetrievalService:
-    """Service for retrieving relevant chunks using cosine similarity (no pgvector)."""
+    """Service for retrieving relevant chunks: cosine similarity (in-memory index or pgvector), optionally fused with lexical ranking."""
     
     def __init__(self):
         self.embedding_service = EmbeddingService()
@@ -17,48 +27,287 @@ class RetrievalService:
         b = np.array(vec2)
         return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
     
-    def similarity_search(
+    async def similarity_search(
         self,
-        db: Session,
+        db: AsyncSession,
         query: str,
         top_k: int = 5,
-        document_name: Optional[str] = None
+        document_name: Optional[str] = None,
+        query_embedding: Optional[List[float]] = None,
+        warm_chunk_ids: Sequence[int] = (),
+        filters: Optional[Dict[str, Sequence[str]]] = None
     ) -> List[Tuple[DocumentChunk, float]]:
         """
-        Search for similar chunks using cosine similarity.
+        Search for relevant chunks.
+        
+        With `hybrid_search_enabled`, vector and lexical rankings are merged by
+        reciprocal rank fusion, so exact terms (form names, status codes,
+        statute numbers) rank well even when embeddings miss them. Chunks in
+        `warm_chunk_ids` (e.g. a conversation's previous sources) join the
+        fusion as a third ranking, ordered by similarity to this query.
+        Results are ordered by fused rank; the score reported is cosine similarity.
+        
+        Filters restrict every ranking to matching chunks; with the in-memory
+        index only the matching partition of the matrix is scored.
         
         Args:
             db: Database session
             query: User's question
             top_k: Number of results to return
             document_name: Optional filter by document name
+            query_embedding: Precomputed embedding of `query` (created if omitted)
+            warm_chunk_ids: Extra candidate chunks to rank alongside the search results
+            filters: Optional {field: value or values} on document_name, file_type, category or intent
             
         Returns:
             List of (DocumentChunk, similarity_score) tuples
         """
+        filters = chunk_filters(document_name, filters)
+        
         # Create embedding for the query
-        query_embedding = self.embedding_service.create_embedding(query)
+        if query_embedding is None:
+            query_embedding = await self.embedding_service.create_embedding(query)
+        
+        hybrid = settings.hybrid_search_enabled
+        candidates = max(top_k, settings.hybrid_candidates) if hybrid else top_k
+        
+        if settings.use_pgvector:
+            with span("pgvector_search"):
+                vector_hits = await self._pgvector_search(db, query_embedding, candidates, filters)
+            rankings = [vector_hits]
+            weights = [settings.hybrid_vector_weight]
+            if hybrid:
+                with span("fulltext_search"):
+                    rankings.append(await self._fulltext_search(db, query, query_embedding, candidates, filters))
+                weights.append(settings.hybrid_lexical_weight)
+            if warm_chunk_ids:
+                with span("warm_scoring"):
+                    rankings.append(await self._pgvector_scores(db, query_embedding, warm_chunk_ids, filters))
+                weights.append(settings.session_warm_weight)
+            if len(rankings) == 1:
+                return vector_hits
+            rows = {chunk.id: (chunk, score) for ranking in rankings for chunk, score in ranking}
+            fused = reciprocal_rank_fusion(
+                [[chunk.id for chunk, _ in ranking] for ranking in rankings],
+                weights
+            )
+            return [rows[chunk_id] for chunk_id, _ in fused[:top_k]]
+        
+        # Score against the in-memory index (one matrix-vector product, off the event loop)
+        index = get_vector_index()
+        with span("index_refresh"):
+            await index.ensure_fresh(db)
+            if hybrid:
+                await get_lexical_index().ensure_fresh(db)
+        with span("similarity_scoring"):
+            hits = await asyncio.to_thread(index.search, query_embedding, candidates, filters)
+        with span("rank_fusion"):
+            hits = await asyncio.to_thread(
+                self._fuse_in_memory, query, query_embedding, hits, top_k, filters, warm_chunk_ids
+            )
+        return (await self._fetch_chunks(db, [hits]))[0]
+    
+    async def similarity_search_batch(
+        self,
+        db: AsyncSession,
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        top_k: int = 5,
+        document_name: Optional[str] = None,
+        filters: Optional[Dict[str, Sequence[str]]] = None
+    ) -> List[List[Tuple[DocumentChunk, float]]]:
+        """
+        `similarity_search` for many questions at once.
+        
+        With the in-memory index every question is scored in one matrix-matrix
+        product and all winning rows are fetched in one query; with pgvector
+        the questions are searched one after another.
+        """
+        filters = chunk_filters(document_name, filters)
+        if settings.use_pgvector:
+            return [
+                await self.similarity_search(db, query, top_k, query_embedding=query_embedding, filters=filters)
+                for query, query_embedding in zip(queries, query_embeddings)
+            ]
+        
+        hybrid = settings.hybrid_search_enabled
+        candidates = max(top_k, settings.hybrid_candidates) if hybrid else top_k
+        index = get_vector_index()
+        with span("index_refresh"):
+            await index.ensure_fresh(db)
+            if hybrid:
+                await get_lexical_index().ensure_fresh(db)
+        
+        def rank_all() -> List[List[Tuple[int, float]]]:
+            batch_hits = index.search_batch(query_embeddings, candidates, filters)
+            return [
+                self._fuse_in_memory(query, query_embedding, hits, top_k, filters)
+                for query, query_embedding, hits in zip(queries, query_embeddings, batch_hits)
+            ]
+        
+        with span("similarity_scoring"):
+            batch_hits = await asyncio.to_thread(rank_all)
+        return await self._fetch_chunks(db, batch_hits)
+    
+    def _fuse_in_memory(
+        self,
+        query: str,
+        query_embedding: List[float],
+        hits: List[Tuple[int, float]],
+        top_k: int,
+        filters: Optional[ChunkFilters],
+        warm_chunk_ids: Sequence[int] = ()
+    ) -> List[Tuple[int, float]]:
+        """Merge vector hits with lexical and warm rankings; returns (chunk_id, cosine) best first."""
+        index = get_vector_index()
+        rankings = [[chunk_id for chunk_id, _ in hits]]
+        weights = [settings.hybrid_vector_weight]
+        similarities = dict(hits)
+        
+        if settings.hybrid_search_enabled:
+            candidates = max(top_k, settings.hybrid_candidates)
+            lexical_hits = get_lexical_index().search(query, candidates, index.matching_ids(filters))
+            rankings.append([chunk_id for chunk_id, _ in lexical_hits])
+            weights.append(settings.hybrid_lexical_weight)
+        
+        if warm_chunk_ids:
+            warm = index.similarities(query_embedding, warm_chunk_ids, filters)
+            similarities.update(warm)
+            rankings.append(sorted(warm, key=warm.get, reverse=True))
+            weights.append(settings.session_warm_weight)
+        
+        if len(rankings) == 1:
+            return hits[:top_k]
+        
+        fused = reciprocal_rank_fusion(rankings, weights)[:top_k]
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in similarities]
+        if missing:
+            similarities.update(index.similarities(query_embedding, missing))
+        return [(chunk_id, similarities.get(chunk_id, 0.0)) for chunk_id, _ in fused]
+    
+    async def _fetch_chunks(
+        self,
+        db: AsyncSession,
+        batch_hits: List[List[Tuple[int, float]]]
+    ) -> List[List[Tuple[DocumentChunk, float]]]:
+        """Load the rows for ranked (chunk_id, score) lists, in one query, without embeddings."""
+        chunk_ids = {chunk_id for hits in batch_hits for chunk_id, _ in hits}
+        if not chunk_ids:
+            return [[] for _ in batch_hits]
+        
+        # Fetch full rows only for the winners
+        with span("db_fetch"):
+            result = await db.execute(
+                select(DocumentChunk).options(
+                    defer(DocumentChunk.embedding)
+                ).where(
+                    DocumentChunk.id.in_(list(chunk_ids))
+                )
+            )
+            chunks = result.scalars().all()
+        chunks_by_id = {chunk.id: chunk for chunk in chunks}
         
-        # Get all chunks (with optional filter)
-        if document_name:
-            chunks = db.query(DocumentChunk).filter(
-                DocumentChunk.document_name == document_name
-            ).all()
+        return [
+            [
+                (chunks_by_id[chunk_id], score)
+                for chunk_id, score in hits
+                if chunk_id in chunks_by_id
+            ]
+            for hits in batch_hits
+        ]
+    
+    async def _pgvector_search(
+        self,
+        db: AsyncSession,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[ChunkFilters]
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """Nearest-neighbour search pushed down to PostgreSQL (ORDER BY embedding <=> :q LIMIT k)."""
+        # Query-time recall/latency knob, scoped to the current transaction
+        if settings.pgvector_index_type.lower() == "hnsw":
+            await db.execute(
+                text("SELECT set_config('hnsw.ef_search', :value, true)"),
+                {"value": str(settings.hnsw_ef_search)}
+            )
         else:
-            chunks = db.query(DocumentChunk).all()
-        
-        if not chunks:
-            return []
-        
-        # Calculate similarity for each chunk
-        similarities = []
-        for chunk in chunks:
-            if chunk.embedding:
-                # embedding is stored as JSON array
-                chunk_embedding = chunk.embedding if isinstance(chunk.embedding, list) else chunk.embedding
-                similarity = self.cosine_similarity(query_embedding, chunk_embedding)
-                similarities.append((chunk, similarity))
-        
-        # Sort by similarity (highest first) and return top_k
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        return similarities[:top_k]
+            await db.execute(
+                text("SELECT set_config('ivfflat.probes', :value, true)"),
+                {"value": str(settings.ivfflat_probes)}
+            )
+        
+        distance = DocumentChunk.embedding.cosine_distance(query_embedding)
+        query = select(DocumentChunk, distance.label("distance")).options(
+            defer(DocumentChunk.embedding)
+        ).where(*filter_clauses(filters))
+        
+        result = await db.execute(query.order_by(distance).limit(top_k))
+        rows = result.all()
+        return [(chunk, 1.0 - float(chunk_distance)) for chunk, chunk_distance in rows]
+    
+    async def _pgvector_scores(
+        self,
+        db: AsyncSession,
+        query_embedding: List[float],
+        ids: Sequence[int],
+        filters: Optional[ChunkFilters]
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """Cosine similarity of the query to specific chunks, best first."""
+        distance = DocumentChunk.embedding.cosine_distance(query_embedding)
+        query = select(DocumentChunk, distance.label("distance")).options(
+            defer(DocumentChunk.embedding)
+        ).where(DocumentChunk.id.in_(list(ids)), *filter_clauses(filters))
+        
+        result = await db.execute(query.order_by(distance))
+        return [(chunk, 1.0 - float(chunk_distance)) for chunk, chunk_distance in result.all()]
+    
+    async def _fulltext_search(
+        self,
+        db: AsyncSession,
+        query: str,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[ChunkFilters]
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """
+        Full-text ranking in PostgreSQL (GIN index on to_tsvector(chunk_text)).
+        
+        Query terms are OR-ed, so chunks matching any exact term are candidates;
+        ts_rank_cd orders them. Scores are cosine similarities, like vector hits.
+        """
+        language = literal_column(f"'{settings.fulltext_language}'::regconfig")
+        document = func.to_tsvector(language, DocumentChunk.chunk_text)
+        # plainto_tsquery ANDs the terms; turn that into an OR query
+        terms = func.to_tsquery(
+            language,
+            func.replace(cast(func.plainto_tsquery(language, query), String), "&", "|")
+        )
+        distance = DocumentChunk.embedding.cosine_distance(query_embedding)
+        statement = select(DocumentChunk, distance.label("distance")).options(
+            defer(DocumentChunk.embedding)
+        ).where(document.op("@@")(terms), *filter_clauses(filters))
+        
+        result = await db.execute(
+            statement.order_by(func.ts_rank_cd(document, terms).desc()).limit(top_k)
+        )
+        return [(chunk, 1.0 - float(chunk_distance)) for chunk, chunk_distance in result.all()]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[int]],
+    weights: Sequence[float],
+    k: Optional[int] = None
+) -> List[Tuple[int, float]]:
+    """
+    Merge ranked id lists: score(id) = sum(weight / (k + rank)), rank starting at 1.
+    
+    Returns (id, fused_score) pairs, best first.
+    """
+    k = settings.rrf_k if k is None else k
+    fused: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        if not weight:
+            continue
+        for rank, item in enumerate(ranking, 1):
+            fused[item] = fused.get(item, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda pair: pair[1], reverse=True)
@@ -0,0 +1,198 @@
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+import threading
+import time
+import uuid
+from app.config import get_settings
+from app.database import AsyncSessionLocal
+from app.models import ChatSession, as_utc, utcnow
+from app.services.tokens import count_tokens
+
+settings = get_settings()
+
+# Per-message framing tokens in the chat completion format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class Conversation:
+    """History of one chat session: messages oldest first, plus the last answer's sources."""
+
+    def __init__(
+        self,
+        session_id: str,
+        turns: Optional[List[Dict[str, str]]] = None,
+        chunk_ids: Sequence[int] = ()
+    ):
+        self.session_id = session_id
+        self.turns = list(turns or [])
+        self.chunk_ids = list(chunk_ids)
+
+    def last_question(self) -> Optional[str]:
+        for turn in reversed(self.turns):
+            if turn["role"] == "user":
+                return turn["content"]
+        return None
+
+    def retrieval_query(self, question: str) -> str:
+        """
+        Text to embed for retrieval. Follow-ups ("and how long does that take?")
+        rarely name their subject, so the previous question is prepended.
+        """
+        previous = self.last_question()
+        return f"{previous}\n{question}" if previous else question
+
+    def history(self, max_tokens: Optional[int] = None) -> List[Dict[str, str]]:
+        """The most recent turns that fit in `max_tokens`, oldest first, starting with a question."""
+        budget = settings.session_history_max_tokens if max_tokens is None else max_tokens
+        selected = []
+        used = 0
+        for turn in reversed(self.turns):
+            tokens = count_tokens(turn["content"]) + MESSAGE_OVERHEAD_TOKENS
+            if used + tokens > budget:
+                break
+            selected.append(turn)
+            used += tokens
+        selected.reverse()
+        while selected and selected[0]["role"] != "user":
+            selected.pop(0)
+        return [dict(turn) for turn in selected]
+
+    def add_exchange(self, question: str, answer: str, chunk_ids: Sequence[int]) -> None:
+        """Record a question and its answer; older turns beyond `session_max_turns` are dropped."""
+        self.turns.append({"role": "user", "content": question})
+        self.turns.append({"role": "assistant", "content": answer})
+        if len(self.turns) > settings.session_max_turns:
+            # Drop whole exchanges so history still starts with a question
+            excess = len(self.turns) - settings.session_max_turns
+            self.turns = self.turns[excess + excess % 2:]
+        self.chunk_ids = [int(chunk_id) for chunk_id in chunk_ids]
+
+
+class SessionStore:
+    """
+    Bounded LRU/TTL store of conversations.
+
+    Every process keeps recently used sessions in memory. With `persist`,
+    sessions are also written through to the chat_sessions table, so a
+    session evicted here, or started on another worker, is loaded from
+    PostgreSQL on a local miss. A worker that still holds a session in
+    memory does not see turns added elsewhere, so route a session's
+    requests to one worker (sticky sessions) when running several.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: int,
+        persist: bool = True,
+        session_factory: async_sessionmaker = AsyncSessionLocal
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist = persist
+        self.session_factory = session_factory
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # id -> (expires_at, Conversation)
+        self._lock = threading.Lock()
+
+    def _remember(self, conversation: Conversation) -> None:
+        with self._lock:
+            self._entries[conversation.session_id] = (time.monotonic() + self.ttl_seconds, conversation)
+            self._entries.move_to_end(conversation.session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _recall(self, session_id: str) -> Optional[Conversation]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            expires_at, conversation = entry
+            if expires_at < time.monotonic():
+                del self._entries[session_id]
+                return None
+            self._entries.move_to_end(session_id)
+            return conversation
+
+    async def create(self) -> Conversation:
+        """Start an empty conversation."""
+        conversation = Conversation(uuid.uuid4().hex)
+        if self.persist:
+            async with self.session_factory() as db:
+                # Opportunistic cleanup; expired sessions are never loaded again
+                expired = utcnow() - timedelta(seconds=self.ttl_seconds)
+                await db.execute(delete(ChatSession).where(ChatSession.updated_at < expired))
+                db.add(ChatSession(id=conversation.session_id, turns=[], chunk_ids=[]))
+                await db.commit()
+        self._remember(conversation)
+        return conversation
+
+    async def get(self, session_id: str) -> Optional[Conversation]:
+        """Return the conversation, or None if it never existed or has expired."""
+        conversation = self._recall(session_id)
+        if conversation is not None:
+            self.hits += 1
+            return conversation
+        self.misses += 1
+        if not self.persist:
+            return None
+
+        async with self.session_factory() as db:
+            row = await db.get(ChatSession, session_id)
+        if row is None or as_utc(row.updated_at) < utcnow() - timedelta(seconds=self.ttl_seconds):
+            return None
+        conversation = Conversation(row.id, row.turns, row.chunk_ids)
+        self._remember(conversation)
+        return conversation
+
+    async def save(self, conversation: Conversation) -> None:
+        """Store the conversation after a new exchange."""
+        self._remember(conversation)
+        if self.persist:
+            async with self.session_factory() as db:
+                await db.merge(ChatSession(
+                    id=conversation.session_id,
+                    turns=conversation.turns,
+                    chunk_ids=conversation.chunk_ids,
+                    updated_at=utcnow()
+                ))
+                await db.commit()
+
+    async def delete(self, session_id: str) -> bool:
+        """Forget a conversation. Returns whether it existed."""
+        with self._lock:
+            existed = self._entries.pop(session_id, None) is not None
+        if self.persist:
+            async with self.session_factory() as db:
+                result = await db.execute(delete(ChatSession).where(ChatSession.id == session_id))
+                await db.commit()
+                existed = existed or result.rowcount > 0
+        return existed
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Hit/miss counters for monitoring."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+@lru_cache()
+def get_session_store() -> SessionStore:
+    """Get the process-wide conversation store."""
+    return SessionStore(
+        max_entries=settings.session_max_entries,
+        ttl_seconds=settings.session_ttl_seconds,
+        persist=settings.session_persist
+    )
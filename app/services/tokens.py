@@ -0,0 +1,46 @@
+from functools import lru_cache
+from typing import List
+from app.config import get_settings
+
+settings = get_settings()
+
+
+@lru_cache()
+def get_encoding():
+    """
+    Load the tiktoken encoding used for budgeting.
+    
+    Returns None when tiktoken or its BPE file is unavailable (e.g. offline),
+    in which case token counts fall back to a ~4 characters/token estimate.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(settings.tokenizer_encoding)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count (or estimate) the tokens OpenAI will bill for `text`."""
+    encoding = get_encoding()
+    if encoding is None:
+        return max(1, (len(text) + 3) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Token counts for many texts (uses tiktoken's threaded batch encoder)."""
+    encoding = get_encoding()
+    if encoding is None:
+        return [max(1, (len(text) + 3) // 4) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=())]
+
+
+def split_by_tokens(text: str, max_tokens: int) -> List[str]:
+    """Cut `text` into consecutive pieces of at most `max_tokens` tokens each."""
+    encoding = get_encoding()
+    if encoding is None:
+        step = max(1, max_tokens * 4)
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
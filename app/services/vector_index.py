@@ -0,0 +1,596 @@
+from sqlalchemy import LargeBinary, func, select, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+from functools import lru_cache
+import asyncio
+import bisect
+import logging
+import time
+import numpy as np
+from app.config import get_settings
+from app.models import DocumentChunk
+from app.services import ann_index, vector_snapshot
+from app.services.ann_index import IVFState
+from app.services.filters import METADATA_FIELDS, ChunkFilters, metadata_fields
+from app.vector_codec import EncodedVector
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+class IndexState(NamedTuple):
+    """Immutable snapshot of the index; swapped atomically on every change."""
+    matrix: np.ndarray           # (N, d) float32, rows L2-normalized, grouped by document
+    ids: np.ndarray              # (N,) int64 chunk ids, parallel to matrix rows
+    document_names: np.ndarray   # (N,) object, sorted: each document is one contiguous block
+    fields: Dict[str, np.ndarray]                   # metadata field -> (N,) object values (None if unset)
+    document_slices: Dict[str, slice]               # document -> its block of rows, in name order
+    partitions: Dict[str, Dict[str, np.ndarray]]    # metadata field -> value -> row numbers
+    signature: Optional[Tuple[int, int]]
+    ivf: Optional[IVFState] = None                  # clusters for approximate search (large corpora only)
+
+
+# Row selection for a filter: a slice (a view of one document's block), row numbers, or None for all rows
+Rows = Union[slice, np.ndarray, None]
+
+NO_ROWS = np.zeros(0, dtype=np.int64)
+
+
+def _empty_state(signature: Optional[Tuple[int, int]] = None) -> IndexState:
+    return IndexState(
+        matrix=np.zeros((0, 0), dtype=np.float32),
+        ids=np.zeros(0, dtype=np.int64),
+        document_names=np.zeros(0, dtype=object),
+        fields={field: np.zeros(0, dtype=object) for field in METADATA_FIELDS},
+        document_slices={},
+        partitions={field: {} for field in METADATA_FIELDS},
+        signature=signature
+    )
+
+
+def _group_rows(values: np.ndarray) -> Dict[str, np.ndarray]:
+    """value -> ascending row numbers, skipping rows whose value is None."""
+    present = np.flatnonzero(np.fromiter((value is not None for value in values), dtype=bool, count=len(values)))
+    if not len(present):
+        return {}
+    unique, inverse = np.unique(values[present].astype(str), return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    groups = np.split(present[order], np.cumsum(np.bincount(inverse))[:-1])
+    return dict(zip(unique.tolist(), groups))
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """Return a contiguous float32 copy of `vectors` with unit-length rows."""
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """
+    Process-resident embedding index used by RetrievalService.
+
+    Holds every chunk embedding as one pre-normalized float32 matrix so that
+    cosine similarity for a query is a single matrix-vector product.
+
+    The matrix is partitioned for filtered search: rows are grouped by
+    document, so a document filter scores a contiguous slice (a view, no
+    copy), and each metadata field (file type, category, intent) maps its
+    values to row numbers, so filtered queries only score matching rows.
+
+    From VECTOR_ANN_MIN_VECTORS rows on, the rows are also clustered by
+    k-means (an IVF index, see services/ann_index.py) and a query only scores
+    the rows of its VECTOR_ANN_NPROBE nearest clusters. The clusters are
+    persisted to VECTOR_ANN_PATH, so restarts do not retrain them.
+
+    With VECTOR_SNAPSHOT_ENABLED, every change is also written to a snapshot
+    in VECTOR_SNAPSHOT_DIR (see services/vector_snapshot.py) that workers
+    memory-map instead of reading every row from the database: the vectors
+    live once in the OS page cache, shared by all workers, and startup only
+    decodes the small id/document/metadata columns.
+    """
+
+    def __init__(self):
+        self._state = _empty_state()
+        self._lock = asyncio.Lock()
+        self._checked_at = 0.0
+        self._snapshot_version = 0
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self._snapshot_pending = False
+
+    def __len__(self) -> int:
+        return len(self._state.ids)
+
+    @staticmethod
+    def _build(
+        ids: Sequence[int],
+        document_names: Sequence[str],
+        fields: Dict[str, Sequence[Optional[str]]],
+        matrix: np.ndarray,
+        signature: Optional[Tuple[int, int]]
+    ) -> IndexState:
+        if not len(ids):
+            return _empty_state(signature)
+        ids = np.asarray(ids, dtype=np.int64)
+        names = np.asarray(document_names, dtype=object)
+        fields = {field: np.asarray(fields[field], dtype=object) for field in METADATA_FIELDS}
+        keys = names.astype(str)
+        if len(keys) > 1 and (keys[1:] < keys[:-1]).any():
+            # Group documents into contiguous blocks (callers usually pass rows in this order already)
+            order = np.argsort(keys, kind="stable")
+            ids, names, keys, matrix = ids[order], names[order], keys[order], matrix[order]
+            fields = {field: values[order] for field, values in fields.items()}
+        unique, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+        return IndexState(
+            matrix=matrix,
+            ids=ids,
+            document_names=names,
+            fields=fields,
+            document_slices={
+                name: slice(int(start), int(start + count))
+                for name, start, count in zip(unique.tolist(), starts, counts)
+            },
+            partitions={field: _group_rows(values) for field, values in fields.items()},
+            signature=signature
+        )
+
+    @staticmethod
+    async def corpus_signature(db: AsyncSession) -> Tuple[int, int]:
+        """Cheap fingerprint of the chunk table: (row count, max id)."""
+        result = await db.execute(
+            select(func.count(DocumentChunk.id), func.max(DocumentChunk.id))
+        )
+        count, max_id = result.one()
+        return int(count or 0), int(max_id or 0)
+
+    @staticmethod
+    def held_signature(ids: Sequence[int]) -> Tuple[int, int]:
+        """
+        corpus_signature of exactly these chunks. States are stamped with what
+        they hold, never with a signature read from the database, so rows
+        another worker commits meanwhile still show up as a difference.
+        """
+        return len(ids), int(np.max(ids)) if len(ids) else 0
+
+    @classmethod
+    def _build_from_rows(cls, rows) -> IndexState:
+        rows = [row for row in rows if row.embedding is not None and len(row.embedding)]
+        # Decode in document order so _build does not have to reorder the matrix
+        rows.sort(key=lambda row: row.document_name)
+        column_type = DocumentChunk.__table__.c.embedding.type
+        if not rows:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        elif isinstance(column_type, EncodedVector):
+            # Raw bytes for all rows -> one np.frombuffer over the concatenation
+            matrix = normalize_rows(column_type.codec.decode_many([row.embedding for row in rows]))
+        else:
+            matrix = normalize_rows([row.embedding for row in rows])
+        ids = [row.id for row in rows]
+        state = cls._build(
+            ids,
+            [row.document_name for row in rows],
+            {field: [getattr(row, field) or None for row in rows] for field in METADATA_FIELDS},
+            matrix,
+            cls.held_signature(ids)
+        )
+        return cls._with_ivf(state)
+
+    @classmethod
+    def _with_ivf(cls, state: IndexState) -> IndexState:
+        """Attach the IVF index to a freshly loaded state: restored from disk if possible, else trained."""
+        if not cls._ann_enabled(len(state.ids)):
+            return state
+        stored = ann_index.load(settings.vector_ann_path, settings.openai_embedding_model, state.matrix.shape[1])
+        lists = ann_index.restore(stored, state.matrix, state.ids)
+        if lists is None:
+            return cls._train_ivf(state)
+        return state._replace(ivf=ann_index.build(stored.centroids, lists, stored.trained_on))
+
+    @staticmethod
+    def _ann_enabled(count: int) -> bool:
+        return settings.vector_ann_enabled and count >= max(1, settings.vector_ann_min_vectors)
+
+    @classmethod
+    def _train_ivf(cls, state: IndexState) -> IndexState:
+        """Cluster the whole index from scratch (k-means on a sample, then assign every row)."""
+        centroids = ann_index.train(state.matrix, ann_index.list_count(len(state.ids)))
+        state = state._replace(ivf=ann_index.build(centroids, ann_index.assign(state.matrix, centroids), len(state.ids)))
+        cls._save_ivf(state)
+        return state
+
+    @staticmethod
+    def _save_ivf(state: IndexState) -> None:
+        """
+        Persist the clusters so the next start restores them instead of retraining.
+        Called after training, with each snapshot and at shutdown; not on every
+        ingest, since the file covers the whole corpus.
+        """
+        if state.ivf is None:
+            return
+        try:
+            ann_index.save(settings.vector_ann_path, state.ivf, state.ids, settings.openai_embedding_model)
+        except OSError as e:
+            logger.warning("IVF index could not be saved to %s: %s", settings.vector_ann_path, e)
+
+    async def save(self) -> None:
+        """Persist the IVF clusters of the current state (at shutdown)."""
+        await asyncio.to_thread(self._save_ivf, self._state)
+
+    async def load(self, db: AsyncSession) -> int:
+        """
+        (Re)build the whole index: from the snapshot if it matches the
+        database, else from the database. Returns number of vectors.
+        """
+        async with self._lock:
+            signature = await self.corpus_signature(db)
+            if await self._adopt_snapshot(signature):
+                self._checked_at = time.monotonic()
+                return len(self._state.ids)
+            embedding = DocumentChunk.embedding
+            if isinstance(embedding.type, EncodedVector):
+                # Skip per-row decoding; _build_from_rows decodes the whole batch at once
+                embedding = type_coerce(embedding, LargeBinary).label("embedding")
+            result = await db.execute(
+                select(
+                    DocumentChunk.id,
+                    DocumentChunk.document_name,
+                    embedding,
+                    *[DocumentChunk.doc_metadata[field].as_string().label(field) for field in METADATA_FIELDS]
+                ).order_by(DocumentChunk.id)
+            )
+            rows = result.all()
+
+            # Parsing and normalizing N vectors is CPU-bound; keep it off the event loop
+            self._state = await asyncio.to_thread(self._build_from_rows, rows)
+            self._checked_at = time.monotonic()
+            self._schedule_snapshot()
+            return len(self._state.ids)
+
+    async def ensure_fresh(self, db: AsyncSession) -> None:
+        """
+        Reload if another worker changed the corpus.
+
+        Checked at most once every `vector_index_refresh_seconds`; changes made
+        through this process are applied directly and never trigger a reload
+        on their own (the state's signature covers exactly the rows it holds).
+        """
+        now = time.monotonic()
+        if now - self._checked_at < settings.vector_index_refresh_seconds:
+            return
+        self._checked_at = now
+        signature = await self.corpus_signature(db)
+        if signature != self._state.signature:
+            await self.load(db)
+        elif settings.vector_snapshot_enabled:
+            # Same corpus, but another worker may have published a newer snapshot: map it
+            # instead of keeping a private copy of the vectors
+            async with self._lock:
+                await self._adopt_snapshot(signature)
+
+    @classmethod
+    def _replace(
+        cls,
+        state: IndexState,
+        document_name: str,
+        ids: Sequence[int],
+        embeddings: Sequence[Sequence[float]],
+        metadata: Sequence[Optional[dict]]
+    ) -> IndexState:
+        # Documents are contiguous blocks in name order: splice the new block in
+        # where the old one was (or where the name sorts), keeping that order
+        total = len(state.ids)
+        block = state.document_slices.get(document_name)
+        if block is None:
+            names = list(state.document_slices)
+            position = bisect.bisect_left(names, document_name)
+            at = state.document_slices[names[position]].start if position < len(names) else total
+            block = slice(at, at)
+        before, after = slice(0, block.start), slice(block.stop, total)
+
+        new_fields = [metadata_fields(item) for item in metadata] if len(metadata) else [{}] * len(ids)
+        parts_ids = [state.ids[before], np.asarray(ids, dtype=np.int64), state.ids[after]]
+        parts_names = [
+            state.document_names[before],
+            np.asarray([document_name] * len(ids), dtype=object),
+            state.document_names[after]
+        ]
+        parts_fields = {
+            field: [
+                values[before],
+                np.asarray([item.get(field) for item in new_fields], dtype=object),
+                values[after]
+            ]
+            for field, values in state.fields.items()
+        }
+        new_matrix = normalize_rows(embeddings) if len(ids) else None
+        parts_matrix = [state.matrix[before], new_matrix, state.matrix[after]]
+        parts_matrix = [part for part in parts_matrix if part is not None and len(part)]
+
+        matrix = (
+            np.ascontiguousarray(np.concatenate(parts_matrix))
+            if parts_matrix else np.zeros((0, 0), dtype=np.float32)
+        )
+        new_ids = np.concatenate(parts_ids)
+        new_state = cls._build(
+            new_ids,
+            np.concatenate(parts_names),
+            {field: np.concatenate(parts) for field, parts in parts_fields.items()},
+            matrix,
+            cls.held_signature(new_ids)
+        )
+
+        if not cls._ann_enabled(len(new_state.ids)):
+            return new_state
+        if state.ivf is None or state.ivf.centroids.shape[1] != matrix.shape[1]:
+            return cls._train_ivf(new_state)
+        # Keep the trained centroids: the new rows join their nearest clusters
+        ivf = state.ivf
+        parts_lists = [ivf.lists[before], ann_index.assign(new_matrix, ivf.centroids) if len(ids) else None, ivf.lists[after]]
+        lists = np.concatenate([part for part in parts_lists if part is not None])
+        return new_state._replace(ivf=ann_index.build(ivf.centroids, lists, ivf.trained_on))
+
+    async def replace_document(
+        self,
+        db: AsyncSession,
+        document_name: str,
+        ids: Sequence[int],
+        embeddings: Sequence[Sequence[float]],
+        metadata: Sequence[Optional[dict]] = ()
+    ) -> None:
+        """Swap in the (already committed) chunks of one document; `metadata` is per chunk."""
+        async with self._lock:
+            self._state = await asyncio.to_thread(
+                self._replace, self._state, document_name, ids, embeddings, metadata
+            )
+            self._schedule_snapshot()
+
+    @classmethod
+    def _open_snapshot(cls, manifest: vector_snapshot.SnapshotManifest) -> IndexState:
+        rows = vector_snapshot.open_rows(settings.vector_snapshot_dir, manifest, METADATA_FIELDS)
+        state = cls._build(rows.ids, rows.document_names, rows.fields, rows.matrix, manifest.signature)
+        return cls._with_ivf(state)
+
+    async def _adopt_snapshot(self, signature: Tuple[int, int]) -> bool:
+        """
+        Switch to the published snapshot if it is newer than the one in use
+        and matches `signature` (the database's current corpus). Caller holds
+        the lock.
+        """
+        if not settings.vector_snapshot_enabled:
+            return False
+        manifest = vector_snapshot.read_manifest(settings.vector_snapshot_dir)
+        if (
+            manifest is None
+            or manifest.version <= self._snapshot_version
+            or manifest.signature != signature
+            or manifest.model != settings.openai_embedding_model
+        ):
+            return False
+        try:
+            self._state = await asyncio.to_thread(self._open_snapshot, manifest)
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("Vector snapshot %s could not be opened: %s", manifest.version, e)
+            return False
+        self._snapshot_version = manifest.version
+        return True
+
+    def _schedule_snapshot(self) -> None:
+        """Write a snapshot of the current state in the background, coalescing bursts of changes."""
+        if not settings.vector_snapshot_enabled:
+            return
+        if self._snapshot_task is not None and not self._snapshot_task.done():
+            self._snapshot_pending = True
+            return
+        self._snapshot_task = asyncio.create_task(self._write_snapshots())
+
+    async def _write_snapshots(self) -> None:
+        self._snapshot_pending = True
+        while self._snapshot_pending:
+            self._snapshot_pending = False
+            state = self._state
+            # Workers only adopt a snapshot whose signature equals the database's, so
+            # publishing a state that misses other workers' rows is harmless
+            if not len(state.ids):
+                continue
+            try:
+                published = vector_snapshot.read_manifest(settings.vector_snapshot_dir)
+                if published is not None and published.signature == state.signature:
+                    # Another worker already published this corpus
+                    async with self._lock:
+                        if self._state is state:
+                            await self._adopt_snapshot(state.signature)
+                    continue
+                manifest = await asyncio.to_thread(
+                    vector_snapshot.write,
+                    settings.vector_snapshot_dir,
+                    state.matrix,
+                    state.ids,
+                    state.document_slices,
+                    state.fields,
+                    state.signature,
+                    settings.openai_embedding_model
+                )
+                await asyncio.to_thread(self._save_ivf, state)
+                # Drop this worker's private copy of the vectors in favour of the shared mapping
+                async with self._lock:
+                    if self._state is state:
+                        rows = await asyncio.to_thread(
+                            vector_snapshot.open_rows, settings.vector_snapshot_dir, manifest, METADATA_FIELDS
+                        )
+                        self._state = state._replace(matrix=rows.matrix, ids=rows.ids)
+                    self._snapshot_version = max(self._snapshot_version, manifest.version)
+            except Exception:
+                logger.exception("Vector snapshot could not be written")
+
+    async def remove_document(self, db: AsyncSession, document_name: str) -> None:
+        """Drop every vector belonging to `document_name`."""
+        await self.replace_document(db, document_name, [], [])
+
+    @staticmethod
+    def _select(state: IndexState, filters: Optional[ChunkFilters]) -> Rows:
+        """Rows matching every field of `filters`; None when unfiltered."""
+        if not filters:
+            return None
+        selected = None
+        for field, values in filters.items():
+            if field == "document_name":
+                blocks = [state.document_slices[value] for value in values if value in state.document_slices]
+                if len(blocks) == 1 and len(filters) == 1:
+                    return blocks[0]
+                matched = [np.arange(block.start, block.stop) for block in blocks]
+            else:
+                partition = state.partitions.get(field, {})
+                matched = [partition[value] for value in values if value in partition]
+            # A chunk has one value per field, so the groups are disjoint
+            rows = np.sort(np.concatenate(matched)) if matched else NO_ROWS
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+            if not len(selected):
+                break
+        return selected
+
+    @staticmethod
+    def _rows(state: IndexState, rows: Rows) -> Tuple[np.ndarray, np.ndarray]:
+        if rows is None:
+            return state.matrix, state.ids
+        if isinstance(rows, np.ndarray) and not len(rows):
+            return state.matrix[:0], NO_ROWS
+        return state.matrix[rows], state.ids[rows]
+
+    @classmethod
+    def _partition(cls, state: IndexState, filters: Optional[ChunkFilters]) -> Tuple[np.ndarray, np.ndarray]:
+        """(matrix, ids) of the rows a filtered search has to score."""
+        return cls._rows(state, cls._select(state, filters))
+
+    @classmethod
+    def _candidates(
+        cls,
+        state: IndexState,
+        query: np.ndarray,
+        top_k: int,
+        filters: Optional[ChunkFilters],
+        nprobe: Optional[int]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (matrix, ids) of the rows a search for the unit-length `query` scores:
+        with an IVF index, the matching rows of the probed clusters; otherwise
+        (or if those are fewer than `top_k`) every matching row.
+        """
+        rows = cls._select(state, filters)
+        if state.ivf is None:
+            return cls._rows(state, rows)
+        if rows is not None:
+            matching = rows.stop - rows.start if isinstance(rows, slice) else len(rows)
+            if matching < settings.vector_ann_min_vectors:
+                return cls._rows(state, rows)  # small enough to score exactly
+
+        probed = ann_index.probe(state.ivf, query, nprobe or settings.vector_ann_nprobe)
+        if isinstance(rows, slice):
+            probed = probed[(probed >= rows.start) & (probed < rows.stop)]
+        elif rows is not None:
+            probed = np.intersect1d(probed, rows, assume_unique=True)
+        if len(probed) < top_k:
+            return cls._rows(state, rows)
+        return state.matrix[probed], state.ids[probed]
+
+    def matching_ids(self, filters: Optional[ChunkFilters]) -> Optional[np.ndarray]:
+        """Ids of the chunks matching `filters` (None when unfiltered), e.g. to filter lexical hits."""
+        state = self._state
+        rows = self._select(state, filters)
+        return None if rows is None else state.ids[rows]
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        top_k: int = 5,
+        filters: Optional[ChunkFilters] = None,
+        nprobe: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Return the `top_k` most similar chunks as (chunk_id, cosine_similarity).
+
+        Args:
+            query_embedding: Raw (unnormalized) query vector
+            top_k: Number of results to return
+            filters: Optional metadata filters (see services/filters.py); only matching rows are scored
+            nprobe: Clusters to scan when the IVF index is active (default VECTOR_ANN_NPROBE);
+                more means higher recall and slower queries
+        """
+        return self._search(self._state, normalize_rows(query_embedding)[0], top_k, filters, nprobe)
+
+    @classmethod
+    def _search(
+        cls,
+        state: IndexState,
+        query: np.ndarray,
+        top_k: int,
+        filters: Optional[ChunkFilters],
+        nprobe: Optional[int]
+    ) -> List[Tuple[int, float]]:
+        matrix, ids = cls._candidates(state, query, top_k, filters, nprobe)
+        if not len(ids):
+            return []
+
+        scores = matrix @ query
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def search_batch(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        top_k: int = 5,
+        filters: Optional[ChunkFilters] = None,
+        nprobe: Optional[int] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        `search` for many queries with one matrix-matrix product; one result list per query.
+
+        With the IVF index active, each query probes its own clusters instead.
+        """
+        state = self._state
+        if state.ivf is not None and len(query_embeddings):
+            return [
+                self._search(state, query, top_k, filters, nprobe)
+                for query in normalize_rows(query_embeddings)
+            ]
+        matrix, ids = self._partition(state, filters)
+        if not len(ids) or not len(query_embeddings):
+            return [[] for _ in query_embeddings]
+
+        scores = normalize_rows(query_embeddings) @ matrix.T  # (queries, chunks)
+
+        k = min(top_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        return [
+            list(zip(ids[row].tolist(), row_scores.tolist()))
+            for row, row_scores in zip(top, top_scores)
+        ]
+
+    def similarities(
+        self,
+        query_embedding: Sequence[float],
+        ids: Sequence[int],
+        filters: Optional[ChunkFilters] = None
+    ) -> Dict[int, float]:
+        """Cosine similarity of the query to specific chunks (e.g. lexical-only hits)."""
+        matrix, candidate_ids = self._partition(self._state, filters)
+        if not len(candidate_ids) or not len(ids):
+            return {}
+        rows = np.flatnonzero(np.isin(candidate_ids, np.asarray(ids, dtype=np.int64)))
+        scores = matrix[rows] @ normalize_rows(query_embedding)[0]
+        return dict(zip(candidate_ids[rows].tolist(), scores.tolist()))
+
+
+@lru_cache()
+def get_vector_index() -> VectorIndex:
+    """Get the process-wide vector index instance."""
+    return VectorIndex()
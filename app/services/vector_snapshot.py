@@ -0,0 +1,122 @@
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+import glob
+import json
+import os
+import time
+import numpy as np
+
+MANIFEST = "manifest.json"
+
+
+class SnapshotManifest(NamedTuple):
+    """What a snapshot holds; workers compare `version` and `signature` to decide whether to swap."""
+    version: int                  # time.time_ns() when written; newer snapshots have larger versions
+    signature: Tuple[int, int]    # corpus signature (row count, max id) the snapshot matches
+    model: str
+    dimensions: int
+    rows: int
+
+
+class SnapshotRows(NamedTuple):
+    """Index rows read from a snapshot; matrix and ids are read-only memory maps."""
+    matrix: np.ndarray            # (N, d) float32 np.memmap, unit-length rows
+    ids: np.ndarray               # (N,) int64 np.memmap
+    document_names: np.ndarray    # (N,) object
+    fields: Dict[str, np.ndarray]  # metadata field -> (N,) object values (None if unset)
+
+
+def _paths(directory: str, version: int) -> Tuple[str, str, str]:
+    prefix = os.path.join(directory, str(version))
+    return f"{prefix}.vectors.npy", f"{prefix}.ids.npy", f"{prefix}.rows.npz"
+
+
+def read_manifest(directory: str) -> Optional[SnapshotManifest]:
+    """The current snapshot's manifest, or None if there is no (readable) snapshot."""
+    try:
+        with open(os.path.join(directory, MANIFEST)) as file:
+            data = json.load(file)
+        return SnapshotManifest(
+            version=int(data["version"]),
+            signature=tuple(data["signature"]),
+            model=data["model"],
+            dimensions=int(data["dimensions"]),
+            rows=int(data["rows"])
+        )
+    except (OSError, KeyError, TypeError, ValueError):
+        return None
+
+
+def write(
+    directory: str,
+    matrix: np.ndarray,
+    ids: np.ndarray,
+    document_slices: Dict[str, slice],
+    fields: Dict[str, np.ndarray],
+    signature: Tuple[int, int],
+    model: str
+) -> SnapshotManifest:
+    """
+    Write a snapshot of index rows grouped by document (`document_slices`
+    in row order) and publish it by replacing the manifest.
+
+    The vectors are a plain float32 .npy file so readers can memory-map it;
+    document names are stored as per-document row offsets and metadata
+    fields as codes into their distinct values. Snapshots older than the
+    previous one are removed (workers still mapping them keep their pages).
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = max(time.time_ns(), (read_manifest(directory) or SnapshotManifest(0, (0, 0), "", 0, 0)).version + 1)
+    vectors_path, ids_path, rows_path = _paths(directory, version)
+
+    np.save(vectors_path, np.ascontiguousarray(matrix, dtype=np.float32))
+    np.save(ids_path, np.asarray(ids, dtype=np.int64))
+    documents = list(document_slices)
+    offsets = [0] + [document_slices[name].stop for name in documents]
+    columns = {"documents": np.array(documents, dtype=str), "offsets": np.array(offsets, dtype=np.int64)}
+    for field, values in fields.items():
+        present = [value for value in values if value is not None]
+        unique = sorted(set(present))
+        codes = {value: code for code, value in enumerate(unique)}
+        columns[f"values_{field}"] = np.array(unique, dtype=str)
+        columns[f"codes_{field}"] = np.fromiter(
+            (codes[value] if value is not None else -1 for value in values), dtype=np.int32, count=len(values)
+        )
+    with open(rows_path, "wb") as file:
+        np.savez(file, **columns)
+
+    manifest = SnapshotManifest(version, tuple(signature), model, int(matrix.shape[1]) if matrix.ndim == 2 else 0, len(ids))
+    temporary = os.path.join(directory, f"{MANIFEST}.{os.getpid()}.tmp")
+    with open(temporary, "w") as file:
+        json.dump(manifest._asdict(), file)
+    os.replace(temporary, os.path.join(directory, MANIFEST))
+    _prune(directory, keep=2)
+    return manifest
+
+
+def _prune(directory: str, keep: int) -> None:
+    versions = sorted(
+        {int(os.path.basename(path).split(".")[0]) for path in glob.glob(os.path.join(directory, "*.vectors.npy"))},
+        reverse=True
+    )
+    for version in versions[keep:]:
+        for path in _paths(directory, version):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def open_rows(directory: str, manifest: SnapshotManifest, field_names: Sequence[str]) -> SnapshotRows:
+    """Memory-map a snapshot's vectors and ids and decode its document and field columns."""
+    vectors_path, ids_path, rows_path = _paths(directory, manifest.version)
+    matrix = np.load(vectors_path, mmap_mode="r")
+    ids = np.load(ids_path, mmap_mode="r")
+    with np.load(rows_path, allow_pickle=False) as columns:
+        documents = np.array(columns["documents"].tolist(), dtype=object)
+        document_names = np.repeat(documents, np.diff(columns["offsets"]))
+        fields = {}
+        for field in field_names:
+            # Code -1 (unset) indexes the trailing None
+            values: List[Optional[str]] = columns[f"values_{field}"].tolist() + [None]
+            fields[field] = np.array(values, dtype=object)[columns[f"codes_{field}"]]
+    return SnapshotRows(matrix, ids, document_names, fields)
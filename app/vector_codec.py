@@ -0,0 +1,109 @@
+from abc import ABC, abstractmethod
+from sqlalchemy.types import LargeBinary, TypeDecorator
+from typing import Dict, Sequence
+import numpy as np
+
+
+class VectorCodec(ABC):
+    """Encodes embeddings to compact bytes and decodes them with np.frombuffer."""
+
+    name = ""
+
+    @abstractmethod
+    def encode(self, vector: Sequence[float]) -> bytes:
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode(self, blob: bytes) -> np.ndarray:
+        """Decode one vector to float32."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode_many(self, blobs: Sequence[bytes]) -> np.ndarray:
+        """Decode equally sized vectors straight into an (N, d) float32 matrix."""
+        raise NotImplementedError
+
+
+class FloatCodec(VectorCodec):
+    """Raw little-endian IEEE floats (float32: lossless, float16: half the size)."""
+
+    def __init__(self, name: str, dtype: str):
+        self.name = name
+        self.dtype = np.dtype(dtype)
+
+    def encode(self, vector: Sequence[float]) -> bytes:
+        return np.asarray(vector, dtype=self.dtype).tobytes()
+
+    def decode(self, blob: bytes) -> np.ndarray:
+        return np.frombuffer(blob, dtype=self.dtype).astype(np.float32, copy=False)
+
+    def decode_many(self, blobs: Sequence[bytes]) -> np.ndarray:
+        if not blobs:
+            return np.zeros((0, 0), dtype=np.float32)
+        matrix = np.frombuffer(b"".join(blobs), dtype=self.dtype).reshape(len(blobs), -1)
+        return matrix.astype(np.float32)
+
+
+class Int8Codec(VectorCodec):
+    """
+    Symmetric scalar quantization: a float32 scale followed by one int8 per dimension.
+
+    About 4x smaller than float32; cosine rankings are preserved to within
+    quantization noise (see benchmarks/bench_vector_codec.py).
+    """
+
+    name = "int8"
+
+    def encode(self, vector: Sequence[float]) -> bytes:
+        values = np.asarray(vector, dtype=np.float32)
+        peak = float(np.max(np.abs(values))) if values.size else 0.0
+        scale = peak / 127.0 if peak else 1.0
+        quantized = np.clip(np.rint(values / scale), -127, 127).astype(np.int8)
+        return np.float32(scale).tobytes() + quantized.tobytes()
+
+    def decode(self, blob: bytes) -> np.ndarray:
+        scale = np.frombuffer(blob, dtype="<f4", count=1)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=4).astype(np.float32) * scale
+
+    def decode_many(self, blobs: Sequence[bytes]) -> np.ndarray:
+        if not blobs:
+            return np.zeros((0, 0), dtype=np.float32)
+        dimensions = len(blobs[0]) - 4
+        record = np.dtype([("scale", "<f4"), ("values", np.int8, (dimensions,))])
+        records = np.frombuffer(b"".join(blobs), dtype=record)
+        return records["values"].astype(np.float32) * records["scale"][:, None]
+
+
+CODECS: Dict[str, VectorCodec] = {
+    "float32": FloatCodec("float32", "<f4"),
+    "float16": FloatCodec("float16", "<f2"),
+    "int8": Int8Codec(),
+}
+
+
+def get_codec(name: str) -> VectorCodec:
+    try:
+        return CODECS[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown embedding codec '{name}'. Use one of: json, {', '.join(CODECS)}")
+
+
+class EncodedVector(TypeDecorator):
+    """BYTEA column holding an embedding encoded with a VectorCodec; reads back as float32 ndarray."""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, codec: str = "float32"):
+        super().__init__()
+        self.codec = get_codec(codec)
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, (bytes, bytearray, memoryview)):
+            return value
+        return self.codec.encode(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self.codec.decode(bytes(value))
@@ -0,0 +1,154 @@
+"""
+Recall/latency benchmark for the IVF approximate index (services/ann_index.py).
+
+Builds the in-memory VectorIndex over synthetic embeddings, once exact and
+once with the IVF index, and reports for each nprobe the query latency
+(p50/p95/p99) and recall@k against exact search. No database or network.
+
+Real embeddings are clustered by topic, which is what IVF exploits, so the
+synthetic vectors are drawn around --topics random centers (--topics 0 for
+uniform random vectors, the worst case).
+
+Usage:
+    python benchmarks/bench_ann_recall.py --rows 200000 --dimensions 256
+    python benchmarks/bench_ann_recall.py --rows 1000000 --dimensions 1536 --nprobe 4,8,16,32,64
+    python benchmarks/bench_ann_recall.py --min-recall 0.95  # exit 1 if recall at VECTOR_ANN_NPROBE is lower
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("POSTGRES_PASSWORD", "bench")
+os.environ["VECTOR_ANN_PATH"] = os.path.join(tempfile.mkdtemp(prefix="filir-ann-"), "vector_index.ivf.npz")
+
+from app.config import get_settings  # noqa: E402
+from app.services.vector_index import VectorIndex, normalize_rows  # noqa: E402
+
+DOCUMENT_CHUNKS = 100
+
+
+def synthetic_embeddings(rows: int, dimensions: int, topics: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if not topics:
+        return normalize_rows(rng.normal(size=(rows, dimensions)).astype(np.float32))
+    centers = rng.normal(size=(topics, dimensions)).astype(np.float32)
+    matrix = centers[rng.integers(0, topics, rows)]
+    matrix += rng.normal(scale=1.0, size=(rows, dimensions)).astype(np.float32)
+    return normalize_rows(matrix)
+
+
+def build_index(matrix: np.ndarray) -> VectorIndex:
+    """A VectorIndex over `matrix` (rows in documents of DOCUMENT_CHUNKS chunks), IVF per settings."""
+    count = len(matrix)
+    index = VectorIndex()
+    state = VectorIndex._build(
+        np.arange(1, count + 1),
+        np.array([f"doc-{row // DOCUMENT_CHUNKS:07d}" for row in range(count)], dtype=object),
+        {field: np.full(count, None, dtype=object) for field in ("file_type", "category", "intent")},
+        matrix,
+        (count, count)
+    )
+    index._state = VectorIndex._train_ivf(state) if VectorIndex._ann_enabled(count) else state
+    return index
+
+
+def percentiles(samples_s: list) -> dict:
+    values = np.asarray(samples_s) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3)
+    }
+
+
+def timed_search(index: VectorIndex, queries: np.ndarray, k: int, nprobe=None):
+    results, samples = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append([chunk_id for chunk_id, _ in index.search(query, k, nprobe=nprobe)])
+        samples.append(time.perf_counter() - started)
+    return results, samples
+
+
+def recall(found: list, truth: list) -> float:
+    return sum(len(set(a) & set(b)) for a, b in zip(found, truth)) / sum(len(b) for b in truth)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--topics", type=int, default=2000, help="Synthetic topic centers (0 = uniform random vectors)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32,64", help="Probe counts to measure")
+    parser.add_argument("--lists", type=int, default=0, help="IVF clusters (0 = VECTOR_ANN_LISTS, or sqrt(rows))")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--min-recall", type=float, help="Exit 1 if recall@k at VECTOR_ANN_NPROBE is below this")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.vector_ann_lists = args.lists or settings.vector_ann_lists
+    matrix = synthetic_embeddings(args.rows + args.queries, args.dimensions, args.topics, args.seed)
+    corpus, queries = matrix[:args.rows], matrix[args.rows:]
+    print(f"{args.rows} vectors x {args.dimensions} dims, {args.topics or 'no'} topics, {args.queries} queries, k={args.k}\n")
+
+    settings.vector_ann_enabled = False
+    exact = build_index(corpus)
+    truth, exact_samples = timed_search(exact, queries, args.k)
+
+    settings.vector_ann_enabled = True
+    settings.vector_ann_min_vectors = 1
+    started = time.perf_counter()
+    approximate = build_index(corpus)
+    build_s = time.perf_counter() - started
+    lists = len(approximate._state.ivf.centroids)
+
+    results = {
+        "rows": args.rows,
+        "dimensions": args.dimensions,
+        "topics": args.topics,
+        "k": args.k,
+        "lists": lists,
+        "ivf_build_s": round(build_s, 2),
+        "exact": percentiles(exact_samples),
+        "ivf": {}
+    }
+    print(f"IVF: {lists} lists, trained and assigned in {build_s:.2f}s\n")
+    print(f"{'search':<14}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'scanned':>10}{'recall@' + str(args.k):>11}")
+    print(f"{'exact':<14}{results['exact']['p50_ms']:>9.3f}{results['exact']['p95_ms']:>9.3f}"
+          f"{results['exact']['p99_ms']:>9.3f}{'100.0%':>10}{1.0:>11.3f}")
+
+    nprobes = sorted({int(value) for value in args.nprobe.split(",")} | {settings.vector_ann_nprobe})
+    for nprobe in nprobes:
+        found, samples = timed_search(approximate, queries, args.k, nprobe)
+        scanned = min(nprobe, lists) / lists
+        row = dict(percentiles(samples), recall=round(recall(found, truth), 4), scanned=round(scanned, 4))
+        results["ivf"][str(nprobe)] = row
+        print(f"{'nprobe=' + str(nprobe):<14}{row['p50_ms']:>9.3f}{row['p95_ms']:>9.3f}{row['p99_ms']:>9.3f}"
+              f"{scanned:>10.1%}{row['recall']:>11.3f}")
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.min_recall is not None:
+        achieved = results["ivf"][str(settings.vector_ann_nprobe)]["recall"]
+        if achieved < args.min_recall:
+            print(f"\n❌ recall@{args.k} at nprobe={settings.vector_ann_nprobe} is {achieved:.3f} < {args.min_recall}")
+            sys.exit(1)
+        print(f"\n✅ recall@{args.k} at nprobe={settings.vector_ann_nprobe} is {achieved:.3f}")
+
+
+if __name__ == "__main__":
+    main()
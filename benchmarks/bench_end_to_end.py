@@ -0,0 +1,462 @@
+"""
+Offline end-to-end benchmark: no network, no OpenAI key, no PostgreSQL required.
+
+OpenAI is replaced by benchmarks/fake_openai.py (hash-seeded embeddings, fixed
+answers, configurable latency) and the database by a scratch SQLite file, or a
+scratch PostgreSQL database with --dsn. Three stages are measured:
+
+- ingest: synthetic markdown documents through IngestionService.ingest
+  (documents/s, chunks/s, MB/s, embedding calls)
+- retrieval: for each corpus size, N synthetic chunks are bulk-loaded, the
+  search indexes are loaded, and RetrievalService.similarity_search is timed
+  with precomputed query embeddings (p50/p95/p99, top-1 self-hit rate)
+- load: POST /chat/ through the ASGI app at each concurrency level
+  (requests/s, latency percentiles); questions are unique, so caches miss
+
+Results are written as JSON. --compare fails (exit 1) when a metric is worse
+than a baseline by more than --tolerance.
+
+Usage:
+    python benchmarks/bench_end_to_end.py --sizes 1000,10000 --output bench_results.json
+    python benchmarks/bench_end_to_end.py --sizes 100000,1000000 --dimensions 256 --skip-load
+    python benchmarks/bench_end_to_end.py --embedding-latency-ms 60 --chat-latency-ms 400 --concurrency 1,8,32
+    python benchmarks/bench_end_to_end.py --compare baseline.json --tolerance 0.25
+    python benchmarks/bench_end_to_end.py --dsn postgresql://postgres:pw@localhost/filir_bench   # wipes its tables!
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_openai import FakeOpenAIServer, fake_embedding  # noqa: E402
+
+DOCUMENT_CHUNKS = 100  # synthetic chunks per document in bulk-loaded corpora
+INSERT_BATCH = 2000
+
+TERMS = (
+    "petition foreclosure mortgagee registry notice servicemember affidavit filing status "
+    "deadline property address signature attestation docket review approval rejection "
+    "amendment payment fee portal account organization administrator upload document"
+).split()
+
+
+def synthetic_vocabulary(size: int = 4000, seed: int = 7) -> list:
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    words = {"".join(rng.choice(letters, rng.integers(3, 10))) for _ in range(size)}
+    return sorted(words) + TERMS
+
+
+def synthetic_text(rng: np.random.Generator, vocabulary: list, words: int) -> str:
+    """Sentences of Zipf-distributed words, with a few form numbers for lexical search."""
+    ranks = np.minimum(rng.zipf(1.2, words), len(vocabulary)) - 1
+    tokens = [vocabulary[rank] for rank in ranks]
+    sentences = []
+    for start in range(0, len(tokens), 14):
+        sentence = " ".join(tokens[start:start + 14])
+        if rng.random() < 0.1:
+            sentence += f" form I-{rng.integers(100, 999)}"
+        sentences.append(sentence.capitalize() + ".")
+    return " ".join(sentences)
+
+
+def synthetic_document(rng: np.random.Generator, vocabulary: list, words: int) -> str:
+    """Markdown with headings, paragraphs and list items."""
+    parts = []
+    written = 0
+    section = 1
+    while written < words:
+        parts.append(f"## Section {section}: {' '.join(rng.choice(TERMS, 3))}\n")
+        for _ in range(int(rng.integers(2, 5))):
+            length = int(rng.integers(40, 160))
+            parts.append(synthetic_text(rng, vocabulary, length) + "\n")
+            written += length
+        parts.append("".join(f"- {synthetic_text(rng, vocabulary, 8)}\n" for _ in range(int(rng.integers(0, 4)))))
+        section += 1
+    return "\n".join(parts)
+
+
+def percentiles(samples_s: list) -> dict:
+    samples_ms = np.asarray(samples_s) * 1000
+    if not len(samples_ms):
+        return {}
+    return {
+        "mean_ms": round(float(samples_ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples_ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples_ms, 99)), 3),
+        "max_ms": round(float(samples_ms.max()), 3)
+    }
+
+
+def configure_environment(args, server: FakeOpenAIServer) -> None:
+    """Settings are read once at import, so everything is set before app modules load."""
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "offline-benchmark"
+    os.environ.setdefault("POSTGRES_PASSWORD", "offline-benchmark")
+    os.environ["EMBEDDING_DIMENSIONS"] = str(args.dimensions)
+    os.environ["INGEST_JOB_WORKERS"] = "0"
+    os.environ["SESSION_PERSIST"] = "false"
+    if os.environ.get("EMBEDDING_CACHE_BACKEND", "memory") != "none":
+        os.environ["EMBEDDING_CACHE_BACKEND"] = "memory"
+
+
+def use_database(sync_url: str, async_url: str):
+    """Point app.database at the benchmark database before any service module imports it."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    import app.database as database
+
+    database.engine = create_engine(sync_url)
+    database.SessionLocal.configure(bind=database.engine)
+    database.async_engine = create_async_engine(async_url)
+    database.AsyncSessionLocal = async_sessionmaker(
+        bind=database.async_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False
+    )
+    return database
+
+
+def clear_tables(database) -> None:
+    from sqlalchemy import delete
+    from app.models import ChunkEmbedding, DocumentChunk
+
+    with database.engine.begin() as conn:
+        conn.execute(delete(DocumentChunk.__table__))
+        conn.execute(delete(ChunkEmbedding.__table__))
+
+
+async def reload_indexes(database) -> dict:
+    from app.config import get_settings
+    from app.services.lexical_index import get_lexical_index
+    from app.services.vector_index import VectorIndex, get_vector_index
+
+    settings = get_settings()
+    timings = {}
+    if settings.use_pgvector:
+        return timings
+    async with database.AsyncSessionLocal() as db:
+        started = time.perf_counter()
+        index = get_vector_index()
+        await index.load(db)
+        timings["vector_index_load_s"] = round(time.perf_counter() - started, 3)
+        if settings.vector_snapshot_enabled and index._snapshot_task is not None:
+            # What another worker's startup costs once this one has published the snapshot
+            await index._snapshot_task
+            started = time.perf_counter()
+            await VectorIndex().load(db)
+            timings["vector_snapshot_load_s"] = round(time.perf_counter() - started, 3)
+        if settings.hybrid_search_enabled:
+            started = time.perf_counter()
+            await get_lexical_index().load(db)
+            timings["lexical_index_load_s"] = round(time.perf_counter() - started, 3)
+    return timings
+
+
+async def bench_ingest(args, database, server: FakeOpenAIServer, vocabulary: list) -> dict:
+    from app.services.ingestion import IngestionService
+
+    rng = np.random.default_rng(args.seed)
+    documents = [
+        (f"ingest-{i:04d}.md", synthetic_document(rng, vocabulary, args.ingest_words).encode("utf-8"))
+        for i in range(args.ingest_documents)
+    ]
+    clear_tables(database)
+    calls_before = dict(server.calls)
+    semaphore = asyncio.Semaphore(args.ingest_concurrency)
+
+    async def ingest(name: str, content: bytes):
+        async with semaphore, database.AsyncSessionLocal() as db:
+            return await IngestionService().ingest(db, name, content)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[ingest(name, content) for name, content in documents])
+    elapsed = time.perf_counter() - started
+
+    chunks = sum(result.chunks_created for result in results)
+    megabytes = sum(len(content) for _, content in documents) / 1e6
+    report = {
+        "documents": len(documents),
+        "chunks": chunks,
+        "megabytes": round(megabytes, 3),
+        "seconds": round(elapsed, 3),
+        "documents_per_s": round(len(documents) / elapsed, 2),
+        "chunks_per_s": round(chunks / elapsed, 1),
+        "megabytes_per_s": round(megabytes / elapsed, 3),
+        "embedding_calls": server.calls["embeddings"] - calls_before["embeddings"],
+        "embedding_inputs": server.calls["embedding_inputs"] - calls_before["embedding_inputs"]
+    }
+    print(
+        f"ingest: {report['documents']} docs, {chunks} chunks in {elapsed:.2f}s "
+        f"({report['chunks_per_s']} chunks/s, {report['megabytes_per_s']} MB/s, "
+        f"{report['embedding_calls']} embedding calls)"
+    )
+    return report
+
+
+def bulk_load(database, size: int, dimensions: int, vocabulary: list, seed: int) -> list:
+    """Insert `size` synthetic chunks with hash-seeded embeddings; returns their texts."""
+    from app.models import DocumentChunk
+
+    table = DocumentChunk.__table__
+    rng = np.random.default_rng(seed)
+    texts = []
+    clear_tables(database)
+    for start in range(0, size, INSERT_BATCH):
+        rows = []
+        for i in range(start, min(size, start + INSERT_BATCH)):
+            text = synthetic_text(rng, vocabulary, int(rng.integers(60, 180)))
+            document_name = f"synthetic-{i // DOCUMENT_CHUNKS:06d}.md"
+            texts.append(text)
+            rows.append({
+                "document_name": document_name,
+                "chunk_text": text,
+                "chunk_index": i % DOCUMENT_CHUNKS,
+                "content_hash": hashlib.sha256(text.encode("utf-8")).hexdigest(),
+                "document_hash": hashlib.sha256(document_name.encode("utf-8")).hexdigest(),
+                "embedding": fake_embedding(text, dimensions).tolist(),
+                "metadata": {"source": document_name}
+            })
+        with database.engine.begin() as conn:
+            conn.execute(table.insert(), rows)
+    return texts
+
+
+async def bench_retrieval(args, database, texts: list) -> dict:
+    from app.config import get_settings
+    from app.services.retrieval import RetrievalService
+
+    settings = get_settings()
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.choice(len(texts), min(args.queries, len(texts)), replace=False)
+    service = RetrievalService()
+    latencies = []
+    self_hits = 0
+    async with database.AsyncSessionLocal() as db:
+        # Warm up (first-call allocations, statement caches)
+        await service.similarity_search(db, texts[0], settings.top_k_results,
+                                        query_embedding=fake_embedding(texts[0], args.dimensions).tolist())
+        for pick in picks:
+            # A short question whose embedding matches the chunk it came from
+            query = " ".join(texts[pick].split()[:12])
+            embedding = fake_embedding(texts[pick], args.dimensions).tolist()
+            started = time.perf_counter()
+            hits = await service.similarity_search(db, query, settings.top_k_results, query_embedding=embedding)
+            latencies.append(time.perf_counter() - started)
+            self_hits += bool(hits) and hits[0][0].chunk_text == texts[pick]
+    return dict(percentiles(latencies), queries=len(picks), top1_self_hit=round(self_hits / len(picks), 4))
+
+
+async def bench_load(args, texts: list, server: FakeOpenAIServer) -> dict:
+    import httpx
+    from app.main import app
+
+    rng = np.random.default_rng(args.seed + 2)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for concurrency in args.concurrency:
+            picks = rng.choice(len(texts), args.requests)
+            # Unique questions so neither the embedding nor the answer cache can answer
+            questions = [f"{' '.join(texts[pick].split()[:12])} ({concurrency}-{i})" for i, pick in enumerate(picks)]
+            queue = asyncio.Queue()
+            for question in questions:
+                queue.put_nowait(question)
+            latencies = []
+            errors = 0
+            calls_before = dict(server.calls)
+
+            async def worker():
+                nonlocal errors
+                while not queue.empty():
+                    question = queue.get_nowait()
+                    started = time.perf_counter()
+                    response = await client.post("/chat/", json={"question": question})
+                    latencies.append(time.perf_counter() - started)
+                    errors += response.status_code != 200
+
+            started = time.perf_counter()
+            await asyncio.gather(*[worker() for _ in range(concurrency)])
+            elapsed = time.perf_counter() - started
+            results[str(concurrency)] = dict(
+                percentiles(latencies),
+                requests=len(questions),
+                errors=errors,
+                requests_per_s=round(len(questions) / elapsed, 2),
+                chat_calls=server.calls["chat"] - calls_before["chat"]
+            )
+            print(
+                f"  load c={concurrency}: {results[str(concurrency)]['requests_per_s']} req/s, "
+                f"p50 {results[str(concurrency)].get('p50_ms')} ms, p95 {results[str(concurrency)].get('p95_ms')} ms, "
+                f"{errors} errors"
+            )
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Metrics worse than the baseline by more than `tolerance` (relative)."""
+    checks = []
+    if "ingest" in results and "ingest" in baseline:
+        checks.append(("ingest.chunks_per_s", results["ingest"]["chunks_per_s"], baseline["ingest"]["chunks_per_s"], True))
+    for size, current in results.get("retrieval", {}).items():
+        previous = baseline.get("retrieval", {}).get(size)
+        if previous:
+            checks.append((f"retrieval.{size}.p95_ms", current["p95_ms"], previous["p95_ms"], False))
+            checks.append((f"retrieval.{size}.top1_self_hit", current["top1_self_hit"], previous["top1_self_hit"], True))
+    for size, levels in results.get("load", {}).items():
+        for concurrency, current in levels.items():
+            previous = baseline.get("load", {}).get(size, {}).get(concurrency)
+            if previous:
+                checks.append((f"load.{size}.c{concurrency}.requests_per_s", current["requests_per_s"], previous["requests_per_s"], True))
+                checks.append((f"load.{size}.c{concurrency}.p95_ms", current["p95_ms"], previous["p95_ms"], False))
+
+    regressions = []
+    for name, current, previous, higher_is_better in checks:
+        if higher_is_better:
+            worse = current < previous * (1 - tolerance)
+        else:
+            worse = current > previous * (1 + tolerance)
+        if worse:
+            regressions.append(f"{name}: {current} vs baseline {previous}")
+    return regressions
+
+
+async def run(args, server: FakeOpenAIServer) -> dict:
+    workdir = tempfile.mkdtemp(prefix="filir-bench-")
+    # Keep the IVF index and vector snapshots of the scratch corpus out of the working directory
+    os.environ["VECTOR_ANN_PATH"] = os.path.join(workdir, "vector_index.ivf.npz")
+    os.environ["VECTOR_SNAPSHOT_DIR"] = os.path.join(workdir, "vector_snapshot")
+    if args.dsn:
+        sync_url = args.dsn
+        async_url = args.dsn.replace("postgresql://", "postgresql+asyncpg://", 1)
+    else:
+        path = os.path.join(workdir, "bench.db")
+        sync_url, async_url = f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}"
+    database = use_database(sync_url, async_url)
+
+    from app.config import get_settings
+    from app.database import init_db
+    import app.models  # noqa: F401  (registers the tables init_db creates)
+
+    settings = get_settings()
+    init_db()
+    vocabulary = synthetic_vocabulary()
+    results = {
+        "config": {
+            "database": "postgresql" if args.dsn else "sqlite",
+            "vector_backend": settings.vector_backend,
+            "embedding_codec": settings.embedding_codec,
+            "hybrid_search": settings.hybrid_search_enabled,
+            "dimensions": args.dimensions,
+            "top_k": settings.top_k_results,
+            "embedding_latency_ms": args.embedding_latency_ms,
+            "chat_latency_ms": args.chat_latency_ms,
+            "sizes": args.sizes,
+            "concurrency": args.concurrency,
+            "seed": args.seed
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "retrieval": {},
+        "load": {}
+    }
+
+    try:
+        if not args.skip_ingest:
+            results["ingest"] = await bench_ingest(args, database, server, vocabulary)
+
+        for size in args.sizes:
+            started = time.perf_counter()
+            texts = bulk_load(database, size, args.dimensions, vocabulary, args.seed)
+            load_s = time.perf_counter() - started
+            index_timings = await reload_indexes(database)
+            retrieval = await bench_retrieval(args, database, texts)
+            results["retrieval"][str(size)] = dict(retrieval, bulk_load_s=round(load_s, 2), **index_timings)
+            print(
+                f"retrieval {size} chunks: p50 {retrieval['p50_ms']} ms, p95 {retrieval['p95_ms']} ms, "
+                f"p99 {retrieval['p99_ms']} ms, top-1 self-hit {retrieval['top1_self_hit']}"
+            )
+            if "vector_snapshot_load_s" in index_timings:
+                print(
+                    f"  index load: {index_timings['vector_index_load_s']} s from the database, "
+                    f"{index_timings['vector_snapshot_load_s']} s from the snapshot"
+                )
+            if not args.skip_load:
+                results["load"][str(size)] = await bench_load(args, texts, server)
+    finally:
+        await database.async_engine.dispose()
+        database.engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000", help="Corpus sizes in chunks, e.g. 1000,10000,100000,1000000")
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200, help="Retrieval queries per corpus size")
+    parser.add_argument("--requests", type=int, default=200, help="/chat/ requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,8,32", help="Concurrent /chat/ clients")
+    parser.add_argument("--ingest-documents", type=int, default=20)
+    parser.add_argument("--ingest-words", type=int, default=5000, help="Words per ingested document")
+    parser.add_argument("--ingest-concurrency", type=int, default=1, help="Documents ingested at once (SQLite serializes writes)")
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=0.0)
+    parser.add_argument("--skip-ingest", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--dsn", help="Scratch PostgreSQL database instead of SQLite (its chunk tables are wiped)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="Baseline results JSON; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before --compare fails")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size]
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level]
+
+    server = FakeOpenAIServer(
+        ("127.0.0.1", 0),
+        args.dimensions,
+        args.embedding_latency_ms / 1000,
+        args.chat_latency_ms / 1000
+    ).start()
+    configure_environment(args, server)
+
+    results = asyncio.run(run(args, server))
+    results["fake_openai_calls"] = dict(server.calls)
+    server.shutdown()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
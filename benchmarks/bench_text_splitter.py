@@ -0,0 +1,119 @@
+"""
+Micro-benchmark for SimpleTextSplitter.
+
+Splits the bundled FILIR guide and a multi-MB synthetic document (markdown
+headings, paragraphs, lists and a long run of text without boundaries) and
+reports throughput and chunk size statistics in tokens. The previous
+character-based splitter is included as a baseline.
+
+Usage:
+    python benchmarks/bench_text_splitter.py
+    python benchmarks/bench_text_splitter.py --synthetic-mb 16 --chunk-size 512 --chunk-overlap 64
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("POSTGRES_PASSWORD", "bench")
+
+from app.services.document_processor import SimpleTextSplitter  # noqa: E402
+from app.services.tokens import count_tokens_batch, get_encoding  # noqa: E402
+
+GUIDE = os.path.join(ROOT, "documents", "FILIR_System_Comprehensive_Guide.md")
+WORDS = (
+    "petition applicant address verification status court filing notice hearing "
+    "tenant landlord eviction form section deadline judge clerk review submit"
+).split()
+
+
+def legacy_split(text: str, chunk_size: int, chunk_overlap: int) -> list:
+    """The previous character-based splitter, for comparison."""
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        chunk = text[start:end]
+        if end < len(text):
+            last_period = chunk.rfind('. ')
+            if last_period > chunk_size // 2:
+                end = start + last_period + 2
+                chunk = text[start:end]
+            else:
+                last_space = chunk.rfind(' ')
+                if last_space > chunk_size // 2:
+                    end = start + last_space
+                    chunk = text[start:end]
+        chunks.append(chunk.strip())
+        start = end - chunk_overlap
+    return [c for c in chunks if c]
+
+
+def synthetic_document(megabytes: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    section = 0
+    while size < megabytes * 1_000_000:
+        section += 1
+        block = [f"\n## Section {section}\n\n"]
+        for _ in range(rng.randint(2, 6)):
+            sentences = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 25))).capitalize() + "."
+                for _ in range(rng.randint(2, 8))
+            ]
+            block.append(" ".join(sentences) + "\n\n")
+        block.append("".join(f"- {' '.join(rng.choices(WORDS, k=6))}\n" for _ in range(rng.randint(0, 5))))
+        if section % 50 == 0:
+            block.append(" ".join(rng.choices(WORDS, k=2000)) + "\n\n")  # no sentence boundaries
+        text = "".join(block)
+        parts.append(text)
+        size += len(text)
+    return "".join(parts)
+
+
+def segments(text: str, size: int = 4000):
+    """Feed text page-sized, as the PDF extractor does."""
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+def report(label: str, text: str, chunks: list, seconds: float) -> None:
+    tokens = count_tokens_batch(chunks) if chunks else [0]
+    mb = len(text.encode("utf-8")) / 1e6
+    print(
+        f"{label:<36}{mb:>8.2f}{seconds:>9.3f}{mb / seconds if seconds else 0:>9.1f}"
+        f"{len(chunks):>9}{sum(tokens) / len(tokens):>9.0f}{max(tokens):>8}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic-mb", type=float, default=4.0)
+    parser.add_argument("--chunk-size", type=int, default=256, help="tokens")
+    parser.add_argument("--chunk-overlap", type=int, default=48, help="tokens")
+    args = parser.parse_args()
+
+    splitter = SimpleTextSplitter(args.chunk_size, args.chunk_overlap)
+    inputs = [("guide", open(GUIDE, encoding="utf-8").read()), ("synthetic", synthetic_document(args.synthetic_mb))]
+
+    print(f"tokenizer: {'tiktoken' if get_encoding() is not None else 'estimate (~4 chars/token)'}")
+    print(f"{'input / splitter':<36}{'MB':>8}{'seconds':>9}{'MB/s':>9}{'chunks':>9}{'avg tok':>9}{'max tok':>8}")
+    for name, text in inputs:
+        started = time.perf_counter()
+        chunks = list(splitter.split_stream(segments(text)))
+        report(f"{name} / token splitter (stream)", text, chunks, time.perf_counter() - started)
+
+        # Character baseline sized to roughly the same number of tokens
+        started = time.perf_counter()
+        chunks = legacy_split(text, args.chunk_size * 4, args.chunk_overlap * 4)
+        report(f"{name} / legacy char splitter", text, chunks, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark embedding storage encodings: JSON float lists vs. binary codecs.
+
+Reports, per encoding: bytes per vector, total payload size, encode time,
+bulk decode ("index load") time and top-10 recall against exact float32 search.
+With --dsn it also writes each encoding to a scratch PostgreSQL table and
+reports the real on-disk table size and full-table load time.
+
+Usage:
+    python benchmarks/bench_vector_codec.py --rows 20000
+    python benchmarks/bench_vector_codec.py --rows 20000 --dsn postgresql://postgres:pw@localhost/filir_db
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.vector_codec import CODECS  # noqa: E402
+
+
+def synthetic_embeddings(rows: int, dimensions: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    matrix = rng.normal(size=(rows, dimensions)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    normalized = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+    scores = queries @ normalized.T
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(a) & set(b)) for a, b in zip(found, truth))
+    return hits / truth.size
+
+
+def bench_offline(embeddings: np.ndarray, queries: np.ndarray, k: int) -> list:
+    truth = top_k(embeddings, queries, k)
+    as_lists = embeddings.tolist()
+    results = []
+
+    started = time.perf_counter()
+    payloads = [json.dumps(vector) for vector in as_lists]
+    encode_s = time.perf_counter() - started
+    started = time.perf_counter()
+    decoded = np.array([json.loads(payload) for payload in payloads], dtype=np.float32)
+    decode_s = time.perf_counter() - started
+    results.append(("json", payloads, encode_s, decode_s, recall(top_k(decoded, queries, k), truth)))
+
+    for name, codec in CODECS.items():
+        started = time.perf_counter()
+        blobs = [codec.encode(vector) for vector in embeddings]
+        encode_s = time.perf_counter() - started
+        started = time.perf_counter()
+        decoded = codec.decode_many(blobs)
+        decode_s = time.perf_counter() - started
+        results.append((name, blobs, encode_s, decode_s, recall(top_k(decoded, queries, k), truth)))
+
+    print(f"{'encoding':<10}{'bytes/vec':>11}{'total MB':>10}{'encode s':>10}{'load s':>9}{'recall@' + str(k):>11}")
+    for name, payloads, encode_s, decode_s, recall_k in results:
+        sizes = [len(payload) for payload in payloads]
+        print(
+            f"{name:<10}{np.mean(sizes):>11.0f}{sum(sizes) / 1e6:>10.1f}"
+            f"{encode_s:>10.2f}{decode_s:>9.3f}{recall_k:>11.4f}"
+        )
+    return results
+
+
+def bench_postgres(dsn: str, results: list) -> None:
+    import psycopg2
+    from psycopg2.extras import execute_values
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    print(f"\n{'encoding':<10}{'table MB':>10}{'load s':>9}")
+    for name, payloads, _, _, _ in results:
+        table = f"bench_codec_{name}"
+        column = "JSON" if name == "json" else "BYTEA"
+        cur.execute(f"DROP TABLE IF EXISTS {table}")
+        cur.execute(f"CREATE TABLE {table} (id SERIAL PRIMARY KEY, embedding {column})")
+        values = [(payload,) if name == "json" else (psycopg2.Binary(payload),) for payload in payloads]
+        execute_values(cur, f"INSERT INTO {table} (embedding) VALUES %s", values, page_size=1000)
+        cur.execute(f"VACUUM ANALYZE {table}")
+        cur.execute("SELECT pg_total_relation_size(%s)", (table,))
+        size_mb = cur.fetchone()[0] / 1e6
+
+        started = time.perf_counter()
+        cur.execute(f"SELECT embedding FROM {table}")
+        rows = cur.fetchall()
+        if name == "json":
+            np.array([row[0] for row in rows], dtype=np.float32)
+        else:
+            CODECS[name].decode_many([bytes(row[0]) for row in rows])
+        load_s = time.perf_counter() - started
+
+        print(f"{name:<10}{size_mb:>10.1f}{load_s:>9.2f}")
+        cur.execute(f"DROP TABLE {table}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dsn", help="PostgreSQL DSN for on-disk table size / load time")
+    args = parser.parse_args()
+
+    embeddings = synthetic_embeddings(args.rows, args.dimensions)
+    queries = synthetic_embeddings(args.queries, args.dimensions, seed=1)
+    print(f"{args.rows} vectors x {args.dimensions} dims\n")
+    results = bench_offline(embeddings, queries, args.k)
+    if args.dsn:
+        bench_postgres(args.dsn, results)
+
+
+if __name__ == "__main__":
+    main()
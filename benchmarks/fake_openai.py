@@ -0,0 +1,157 @@
+"""
+Deterministic stand-in for the OpenAI embeddings and chat completions API.
+
+Embeddings are hash-seeded unit vectors, so the same text always gets the
+same vector and benchmark runs are reproducible. Completions return a fixed
+answer (streamed word by word when `stream` is requested). Artificial latency
+per request can be configured to model the real API.
+
+Point the service at it with OPENAI_BASE_URL:
+    python benchmarks/fake_openai.py --port 8099 --embedding-latency-ms 60 --chat-latency-ms 400
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 python -m uvicorn app.main:app --port 8001
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+ANSWER = "Petitions are filed online through the FILIR portal and reviewed by the Division of Banks."
+
+
+def fake_embedding(text: str, dimensions: int) -> np.ndarray:
+    """Unit vector seeded by the text's sha256."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def approximate_tokens(text: str) -> int:
+    return max(1, (len(text) + 3) // 4)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """HTTP server for /v1/embeddings and /v1/chat/completions; counts calls and inputs."""
+
+    daemon_threads = True
+
+    def __init__(self, address, dimensions: int, embedding_latency: float, chat_latency: float):
+        super().__init__(address, FakeOpenAIHandler)
+        self.dimensions = dimensions
+        self.embedding_latency = embedding_latency
+        self.chat_latency = chat_latency
+        self.calls = {"embeddings": 0, "embedding_inputs": 0, "chat": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, **amounts) -> None:
+        with self._lock:
+            for key, amount in amounts.items():
+                self.calls[key] += amount
+
+    def start(self) -> "FakeOpenAIServer":
+        """Serve from a daemon thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/embeddings"):
+            self.embeddings(body)
+        elif self.path.endswith("/chat/completions"):
+            self.chat(body)
+        else:
+            self.send_json({"error": {"message": f"Unknown endpoint {self.path}"}}, status=404)
+
+    def embeddings(self, body: dict):
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        self.server.count(embeddings=1, embedding_inputs=len(inputs))
+        time.sleep(self.server.embedding_latency)
+        tokens = sum(approximate_tokens(text) for text in inputs)
+        self.send_json({
+            "object": "list",
+            "model": body.get("model"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, self.server.dimensions).tolist()}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    def chat(self, body: dict):
+        self.server.count(chat=1)
+        time.sleep(self.server.chat_latency)
+        prompt_tokens = sum(approximate_tokens(message.get("content") or "") for message in body["messages"])
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": approximate_tokens(ANSWER),
+            "total_tokens": prompt_tokens + approximate_tokens(ANSWER)
+        }
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model")}
+        if not body.get("stream"):
+            self.send_json(dict(base, object="chat.completion", choices=[{
+                "index": 0,
+                "message": {"role": "assistant", "content": ANSWER},
+                "finish_reason": "stop"
+            }], usage=usage))
+            return
+
+        events = [
+            dict(base, object="chat.completion.chunk", choices=[{
+                "index": 0, "delta": {"content": word + " "}, "finish_reason": None
+            }])
+            for word in ANSWER.split()
+        ]
+        events.append(dict(base, object="chat.completion.chunk", choices=[], usage=usage))
+        payload = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        self.send_bytes(payload.encode("utf-8"), "text/event-stream")
+
+    def send_json(self, data: dict, status: int = 200):
+        self.send_bytes(json.dumps(data).encode("utf-8"), "application/json", status)
+
+    def send_bytes(self, payload: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--embedding-latency-ms", type=float, default=0.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        (args.host, args.port),
+        args.dimensions,
+        args.embedding_latency_ms / 1000,
+        args.chat_latency_ms / 1000
+    )
+    print(f"Fake OpenAI API on {server.base_url} ({args.dimensions} dims)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,188 @@
 """
-Bulk ingest all PDF documents from the documents/ folder.
+Bulk ingest all documents from the documents/ folder (recursively).
 This script is for admins to upload petition documents to the chatbot system.
 Users will only ask questions, not upload files.
+
+Files are uploaded concurrently over a pooled HTTP session with retry and
+backoff. Files whose content hash matches what the server already has are
+skipped without uploading.
+
+Usage:
+    python ingest_documents.py                     # upload and wait for each file
+    python ingest_documents.py --jobs              # queue background jobs, then poll them
+    python ingest_documents.py --jobs --job-timeout 600
+    python ingest_documents.py --folder docs --workers 8 --force
 """
 
-import os
+import argparse
+import hashlib
 import sys
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuration
 API_BASE_URL = "http://localhost:8001"
 DOCUMENTS_FOLDER = "documents"
+CONTENT_TYPES = {
+    '.pdf': 'application/pdf',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.md': 'text/markdown',
+    '.json': 'application/json'
+}
+REQUEST_TIMEOUT = (10, 1800)  # (connect, read) seconds; big PDFs take a while to ingest
+JOB_POLL_SECONDS = 1.0
+JOB_TIMEOUT_SECONDS = 3600  # give up on queued jobs that have not finished by then
 
-def ingest_document(file_path: Path):
-    """Upload a single document to the chatbot."""
-    print(f"📄 Processing: {file_path.name}...")
-    
+print_lock = threading.Lock()
+
+
+def log(message: str):
+    with print_lock:
+        print(message, flush=True)
+
+
+def create_session(workers: int, retries: int) -> requests.Session:
+    """Pooled session that retries connection errors, 429, 502, 503 and 504 with exponential backoff."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=1.0,
+        # Overload and gateway errors only: a 500 may come from an ingest that failed
+        # part-way, so it is reported rather than re-posted
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=None,  # POSTs too: an upload that did get through is skipped by content hash
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_documents(folder: Path):
+    """All supported files under `folder`, first one wins when names repeat."""
+    files = {}
+    for path in sorted(folder.rglob("*")):
+        if not path.is_file() or path.suffix.lower() not in CONTENT_TYPES:
+            continue
+        if path.name in files:
+            log(f"⚠️  Skipping {path}: a document named '{path.name}' was already found at {files[path.name]}")
+            continue
+        files[path.name] = path
+    return list(files.values())
+
+
+def server_hashes(session: requests.Session) -> dict:
+    """document_name -> content hash of the file the server last ingested."""
+    response = session.get(f"{API_BASE_URL}/ingest/documents", timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return {doc['document_name']: doc.get('content_hash') for doc in response.json()['documents']}
+
+
+def upload(session: requests.Session, file_path: Path, endpoint: str) -> requests.Response:
+    content_type = CONTENT_TYPES.get(file_path.suffix.lower(), 'application/octet-stream')
+    with open(file_path, 'rb') as f:
+        files = {'file': (file_path.name, f, content_type)}
+        return session.post(f"{API_BASE_URL}{endpoint}", files=files, timeout=REQUEST_TIMEOUT)
+
+
+def ingest_document(session: requests.Session, file_path: Path) -> dict:
+    """Upload a single document and wait for it to be ingested."""
     try:
-        # Determine content type based on file extension
-        ext = file_path.suffix.lower()
-        content_type_map = {
-            '.pdf': 'application/pdf',
-            '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            '.md': 'text/markdown',
-            '.json': 'application/json'
-        }
-        content_type = content_type_map.get(ext, 'application/octet-stream')
-        
-        with open(file_path, 'rb') as f:
-            files = {'file': (file_path.name, f, content_type)}
-            response = requests.post(f"{API_BASE_URL}/ingest/", files=files)
-        
+        response = upload(session, file_path, "/ingest/")
         if response.status_code == 200:
             data = response.json()
-            print(f"   ✅ Success! Created {data['chunks_created']} chunks")
-            return True
-        else:
-            print(f"   ❌ Failed: {response.status_code}")
-            print(f"   {response.text}")
-            return False
+            if data.get('skipped'):
+                log(f"⏭️  {file_path.name}: unchanged on server")
+                return {"status": "skipped", "chunks": 0, "embedded": 0}
+            log(
+                f"✅ {file_path.name}: {data['chunks_created']} chunks "
+                f"({data.get('chunks_embedded', 0)} embedded, {data.get('chunks_reused', 0)} reused)"
+            )
+            return {"status": "ok", "chunks": data['chunks_created'], "embedded": data.get('chunks_embedded', 0)}
+        log(f"❌ {file_path.name}: {response.status_code} {response.text}")
     except Exception as e:
-        print(f"   ❌ Error: {e}")
-        return False
+        log(f"❌ {file_path.name}: {e}")
+    return {"status": "failed", "chunks": 0, "embedded": 0}
 
-def main():
-    """Ingest all PDFs from documents folder."""
-    print("=" * 60)
-    print("FILIR Chatbot - Document Ingestion Tool")
-    print("=" * 60)
-    print()
-    
-    # Check if service is running
+
+def submit_job(session: requests.Session, file_path: Path) -> dict:
+    """Queue a single document as a background job."""
+    try:
+        response = upload(session, file_path, "/ingest/jobs")
+        if response.status_code == 202:
+            job = response.json()
+            log(f"📤 {file_path.name}: queued as job {job['job_id']}")
+            return {"status": "queued", "job_id": job['job_id']}
+        log(f"❌ {file_path.name}: {response.status_code} {response.text}")
+    except Exception as e:
+        log(f"❌ {file_path.name}: {e}")
+    return {"status": "failed", "chunks": 0, "embedded": 0}
+
+
+def wait_for_jobs(session: requests.Session, jobs: dict, timeout: float = JOB_TIMEOUT_SECONDS) -> dict:
+    """
+    Poll queued jobs until each is done or failed. `jobs` maps job_id -> file path.
+
+    Jobs still pending after `timeout` seconds (e.g. no API process runs job
+    workers, or the server stopped answering polls) are reported as failed.
+    """
+    results = {}
+    pending = dict(jobs)
+    deadline = time.monotonic() + timeout
+    while pending and time.monotonic() < deadline:
+        time.sleep(JOB_POLL_SECONDS)
+        for job_id, file_path in list(pending.items()):
+            try:
+                response = session.get(f"{API_BASE_URL}/ingest/jobs/{job_id}", timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+                job = response.json()
+            except Exception as e:
+                log(f"⚠️  Could not poll job for {file_path.name}: {e}")
+                continue
+            if job['status'] == 'done':
+                if job['skipped']:
+                    log(f"⏭️  {file_path.name}: unchanged on server")
+                    results[file_path] = {"status": "skipped", "chunks": 0, "embedded": 0}
+                else:
+                    log(
+                        f"✅ {file_path.name}: {job['chunks_total']} chunks "
+                        f"({job['chunks_embedded']} embedded, {job['chunks_reused']} reused)"
+                    )
+                    results[file_path] = {"status": "ok", "chunks": job['chunks_total'], "embedded": job['chunks_embedded']}
+                del pending[job_id]
+            elif job['status'] == 'failed':
+                log(f"❌ {file_path.name}: {job['error']}")
+                results[file_path] = {"status": "failed", "chunks": 0, "embedded": 0}
+                del pending[job_id]
+        if pending:
+            running = [f"{jobs[job_id].name}" for job_id in pending]
+            log(f"⏳ {len(pending)} job(s) still running: {', '.join(running[:5])}{' ...' if len(running) > 5 else ''}")
+    for job_id, file_path in pending.items():
+        log(f"❌ {file_path.name}: job {job_id} did not finish within {timeout:g}s")
+        results[file_path] = {"status": "failed", "chunks": 0, "embedded": 0}
+    return results
+
+
+def check_service(session: requests.Session):
+    """Exit unless the chatbot service is up."""
     print("🔍 Checking if chatbot service is running...")
     try:
-        response = requests.get(f"{API_BASE_URL}/health")
+        response = session.get(f"{API_BASE_URL}/health", timeout=REQUEST_TIMEOUT)
         if response.status_code != 200:
             print("❌ Service is not healthy!")
             print("   Make sure the service is running:")
@@ -66,44 +194,99 @@ def main():
         print("   Make sure the service is running:")
         print("   python -m uvicorn app.main:app --reload --port 8001")
         sys.exit(1)
+
+
+def main():
+    """Ingest all documents from the documents folder."""
+    global API_BASE_URL
+    parser = argparse.ArgumentParser(description="Bulk ingest documents into the FILIR chatbot")
+    parser.add_argument("--folder", default=DOCUMENTS_FOLDER, help="Folder to scan recursively")
+    parser.add_argument("--url", default=API_BASE_URL, help="Chatbot API base URL")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent uploads")
+    parser.add_argument("--retries", type=int, default=5, help="Retries per request on connection errors, 429, 502, 503 and 504")
+    parser.add_argument("--jobs", action="store_true", help="Queue background jobs and poll them")
+    parser.add_argument(
+        "--job-timeout", type=float, default=JOB_TIMEOUT_SECONDS,
+        help="With --jobs, seconds to wait for queued jobs before counting the rest as failed"
+    )
+    parser.add_argument("--force", action="store_true", help="Upload even if the server has the same content")
+    args = parser.parse_args()
+    API_BASE_URL = args.url.rstrip("/")
+    
+    print("=" * 60)
+    print("FILIR Chatbot - Document Ingestion Tool")
+    print("=" * 60)
+    print()
+    
+    session = create_session(args.workers, args.retries)
+    check_service(session)
     
     # Find all supported document files
-    docs_folder = Path(DOCUMENTS_FOLDER)
+    docs_folder = Path(args.folder)
     if not docs_folder.exists():
-        print(f"❌ Folder '{DOCUMENTS_FOLDER}' not found!")
+        print(f"❌ Folder '{args.folder}' not found!")
         print(f"   Create it and add document files there.")
         sys.exit(1)
     
-    pdf_files = list(docs_folder.glob("*.pdf"))
-    docx_files = list(docs_folder.glob("*.docx"))
-    md_files = list(docs_folder.glob("*.md"))
-    json_files = list(docs_folder.glob("*.json"))
-    all_files = pdf_files + docx_files + md_files + json_files
-    
+    all_files = find_documents(docs_folder)
     if not all_files:
-        print(f"⚠️  No document files found in '{DOCUMENTS_FOLDER}' folder")
+        print(f"⚠️  No document files found in '{args.folder}' folder")
         print(f"   Add your documents (PDF, DOCX, MD, JSON) there and run this script again.")
         sys.exit(0)
     
+    counts = {ext: sum(1 for f in all_files if f.suffix.lower() == ext) for ext in CONTENT_TYPES}
     print(f"📚 Found {len(all_files)} document(s):")
-    print(f"   PDF: {len(pdf_files)}, DOCX: {len(docx_files)}, MD: {len(md_files)}, JSON: {len(json_files)}\n")
+    print("   " + ", ".join(f"{ext[1:].upper()}: {n}" for ext, n in counts.items()) + "\n")
+    
+    started = time.perf_counter()
     
-    # Ingest each file
-    success_count = 0
-    failed_count = 0
+    # Skip files the server already has byte-for-byte
+    to_upload = all_files
+    skipped = 0
+    if not args.force:
+        try:
+            known = server_hashes(session)
+            to_upload = []
+            for file_path in all_files:
+                if known.get(file_path.name) and known[file_path.name] == file_sha256(file_path):
+                    skipped += 1
+                else:
+                    to_upload.append(file_path)
+            print(f"⏭️  {skipped} file(s) unchanged on server, {len(to_upload)} to upload\n")
+        except Exception as e:
+            print(f"⚠️  Could not fetch server hashes, uploading everything: {e}\n")
     
-    for pdf_file in all_files:
-        if ingest_document(pdf_file):
-            success_count += 1
-        else:
-            failed_count += 1
-        print()
+    uploaded_bytes = sum(f.stat().st_size for f in to_upload)
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        task = submit_job if args.jobs else ingest_document
+        futures = {pool.submit(task, session, file_path): file_path for file_path in to_upload}
+        results = {futures[future]: future.result() for future in as_completed(futures)}
+    
+    if args.jobs:
+        queued = {r["job_id"]: path for path, r in results.items() if r["status"] == "queued"}
+        results.update(wait_for_jobs(session, queued, args.job_timeout))
+    
+    elapsed = time.perf_counter() - started
     
     # Summary
+    success_count = sum(1 for r in results.values() if r["status"] == "ok")
+    skipped += sum(1 for r in results.values() if r["status"] == "skipped")
+    failed_count = sum(1 for r in results.values() if r["status"] == "failed")
+    chunks = sum(r.get("chunks", 0) for r in results.values())
+    embedded = sum(r.get("embedded", 0) for r in results.values())
+    
+    print()
     print("=" * 60)
     print("Summary:")
     print(f"  ✅ Successfully ingested: {success_count}")
+    print(f"  ⏭️  Unchanged (skipped): {skipped}")
     print(f"  ❌ Failed: {failed_count}")
+    print(f"  ⏱️  {elapsed:.1f}s with {args.workers} worker(s)")
+    if elapsed > 0:
+        print(
+            f"  🚀 {len(all_files) / elapsed:.2f} files/s, {chunks / elapsed:.1f} chunks/s "
+            f"({embedded} embedded), {uploaded_bytes / 1e6 / elapsed:.2f} MB/s"
+        )
     print("=" * 60)
     
     if success_count > 0:
@@ -113,7 +296,7 @@ def main():
     # List all documents in database
     print("\n📋 Listing all documents in database...")
     try:
-        response = requests.get(f"{API_BASE_URL}/ingest/documents")
+        response = session.get(f"{API_BASE_URL}/ingest/documents", timeout=REQUEST_TIMEOUT)
         if response.status_code == 200:
             data = response.json()
             print(f"\nTotal documents in database: {data['total']}")
@@ -121,6 +304,9 @@ def main():
                 print(f"  • {doc['document_name']}: {doc['chunk_count']} chunks")
     except Exception as e:
         print(f"⚠️  Could not list documents: {e}")
+    
+    sys.exit(1 if failed_count else 0)
+
 
 if __name__ == "__main__":
     try:
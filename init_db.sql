@@ -7,17 +7,98 @@ CREATE TABLE IF NOT EXISTS document_chunks (
     document_name VARCHAR(255) NOT NULL,
     chunk_text TEXT NOT NULL,
     chunk_index INTEGER NOT NULL,
+    content_hash VARCHAR(64),   -- sha256 of the embedded text (chunk_text, or a Q&A entry's question)
+    document_hash VARCHAR(64),  -- sha256 of the uploaded file
     embedding vector(1536),  -- OpenAI text-embedding-3-small creates 1536-dim vectors
     metadata JSONB,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Embedding store keyed by chunk content, reused when documents are re-uploaded
+CREATE TABLE IF NOT EXISTS chunk_embeddings (
+    content_hash VARCHAR(64) NOT NULL,
+    model VARCHAR(100) NOT NULL,
+    embedding vector(1536) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (content_hash, model)
+);
+
+CREATE INDEX IF NOT EXISTS ix_document_chunks_content_hash
+ON document_chunks(content_hash);
+
 -- Create index for faster similarity search
 CREATE INDEX IF NOT EXISTS document_chunks_embedding_idx 
 ON document_chunks 
 USING ivfflat (embedding vector_cosine_ops)
 WITH (lists = 100);
 
+-- Alternatively (PGVECTOR_INDEX_TYPE=hnsw), an HNSW index needs no training data:
+-- CREATE INDEX IF NOT EXISTS document_chunks_embedding_hnsw_idx
+-- ON document_chunks
+-- USING hnsw (embedding vector_cosine_ops)
+-- WITH (m = 16, ef_construction = 64);
+
 -- Create index on document_name for filtering
 CREATE INDEX IF NOT EXISTS document_chunks_name_idx 
 ON document_chunks(document_name);
+
+-- Metadata filters (ChatRequest.filters) on the pgvector backend
+CREATE INDEX IF NOT EXISTS document_chunks_file_type_idx
+ON document_chunks((metadata ->> 'file_type'));
+CREATE INDEX IF NOT EXISTS document_chunks_category_idx
+ON document_chunks((metadata ->> 'category'));
+CREATE INDEX IF NOT EXISTS document_chunks_intent_idx
+ON document_chunks((metadata ->> 'intent'));
+
+-- Full-text index for hybrid retrieval (HYBRID_SEARCH_ENABLED, pgvector backend)
+CREATE INDEX IF NOT EXISTS document_chunks_fts_idx
+ON document_chunks
+USING gin (to_tsvector('english'::regconfig, chunk_text));
+
+-- Background ingestion jobs (POST /ingest/jobs), claimed with FOR UPDATE SKIP LOCKED
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    document_name VARCHAR(255) NOT NULL,
+    file_path TEXT NOT NULL,
+    document_hash VARCHAR(64),
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    stage VARCHAR(16) NOT NULL DEFAULT 'queued',
+    chunks_total INTEGER NOT NULL DEFAULT 0,
+    chunks_to_embed INTEGER NOT NULL DEFAULT 0,
+    chunks_embedded INTEGER NOT NULL DEFAULT 0,
+    chunks_reused INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id VARCHAR(64),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMPTZ,
+    stage_started_at TIMESTAMPTZ,
+    heartbeat_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS ix_ingest_jobs_status ON ingest_jobs(status);
+CREATE INDEX IF NOT EXISTS ix_ingest_jobs_document_name ON ingest_jobs(document_name);
+CREATE INDEX IF NOT EXISTS ix_ingest_jobs_created_at ON ingest_jobs(created_at);
+
+-- Conversation sessions (POST /chat/sessions); expired rows are purged when sessions are created
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id VARCHAR(32) PRIMARY KEY,
+    turns JSON NOT NULL,
+    chunk_ids JSON NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_chat_sessions_updated_at ON chat_sessions(updated_at);
+
+-- Shared query-embedding cache (EMBEDDING_CACHE_BACKEND=postgres); least recently used rows are trimmed
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key VARCHAR(64) PRIMARY KEY,
+    embedding BYTEA NOT NULL,
+    created_at DOUBLE PRECISION NOT NULL,
+    accessed_at DOUBLE PRECISION NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_embedding_cache_accessed_at ON embedding_cache(accessed_at);
@@ -0,0 +1,232 @@
+"""
+Schema migrations for the FILIR ChatBot database.
+Each step is idempotent and converts existing rows in place.
+
+Usage:
+    python migrate_database.py pgvector        # JSON embeddings -> native vector(N) + ANN index
+    python migrate_database.py content-hash    # chunk/document hashes + reusable embedding store
+    python migrate_database.py codec           # JSON embeddings -> BYTEA encoded with EMBEDDING_CODEC
+    python migrate_database.py metadata        # indexes for filtering by file type, category and intent
+"""
+
+import argparse
+import json
+import sys
+from sqlalchemy import bindparam, text
+from app.config import get_settings
+from app.database import engine, vector_index_ddl
+from app.models import ChunkEmbedding
+from app.services.filters import METADATA_FIELDS
+from app.vector_codec import get_codec
+
+settings = get_settings()
+
+
+def column_type(conn, table: str, column: str):
+    """Return the PostgreSQL type name of a column, or None if it does not exist."""
+    return conn.execute(text("""
+        SELECT udt_name FROM information_schema.columns
+        WHERE table_name = :table AND column_name = :column
+    """), {"table": table, "column": column}).scalar()
+
+
+def migrate_pgvector():
+    """Convert the JSON embedding columns to vector(N) and build the ANN index."""
+    dimensions = int(settings.embedding_dimensions)
+    tables = ["document_chunks", "chunk_embeddings"]
+
+    with engine.begin() as conn:
+        print("🔧 Enabling pgvector extension...")
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+
+        types = {table: column_type(conn, table, "embedding") for table in tables}
+        if types["document_chunks"] is None:
+            print("❌ Table 'document_chunks' has no embedding column. Start the service once to create it.")
+            return False
+
+        for table in tables:
+            current = types[table]
+            if current is None:
+                print(f"⚠️  {table} has no embedding column, skipping")
+                continue
+            if current == "vector":
+                print(f"✅ {table}.embedding is already vector")
+                continue
+            print(f"🔄 Converting {table}.embedding from {current} to vector({dimensions})...")
+            # JSON arrays share pgvector's text format ("[0.1, 0.2, ...]")
+            conn.execute(text(f"""
+                ALTER TABLE {table}
+                ALTER COLUMN embedding TYPE vector({dimensions})
+                USING CASE
+                    WHEN embedding IS NULL OR embedding::text = 'null' THEN NULL
+                    ELSE (embedding::text)::vector
+                END
+            """))
+            print("✅ Column converted")
+
+        print(f"🔍 Creating {settings.pgvector_index_type} index...")
+        conn.execute(text(vector_index_ddl()))
+        conn.execute(text("ANALYZE document_chunks"))
+        print("✅ Index ready")
+
+    print("\nSet VECTOR_BACKEND=pgvector in .env and restart the service.")
+    return True
+
+
+def migrate_content_hash():
+    """Add content/document hash columns, backfill them and seed the embedding store."""
+    with engine.begin() as conn:
+        print("🔧 Adding hash columns...")
+        conn.execute(text("ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)"))
+        conn.execute(text("ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS document_hash VARCHAR(64)"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_document_chunks_content_hash ON document_chunks (content_hash)"
+        ))
+
+        print("🔄 Backfilling chunk content hashes...")
+        result = conn.execute(text("""
+            UPDATE document_chunks
+            SET content_hash = encode(sha256(convert_to(chunk_text, 'UTF8')), 'hex')
+            WHERE content_hash IS NULL
+        """))
+        print(f"✅ Hashed {result.rowcount} chunks")
+        # document_hash stays NULL until a document is next uploaded, so the
+        # first re-upload is never skipped but still reuses every vector
+
+    print("📋 Creating chunk_embeddings table...")
+    ChunkEmbedding.__table__.create(bind=engine, checkfirst=True)
+
+    with engine.begin() as conn:
+        print(f"🔄 Seeding embedding store for {settings.openai_embedding_model}...")
+        result = conn.execute(text("""
+            INSERT INTO chunk_embeddings (content_hash, model, embedding)
+            SELECT DISTINCT ON (content_hash) content_hash, :model, embedding
+            FROM document_chunks
+            WHERE content_hash IS NOT NULL AND embedding IS NOT NULL
+            ON CONFLICT DO NOTHING
+        """), {"model": settings.openai_embedding_model})
+        print(f"✅ Stored {result.rowcount} reusable embeddings")
+
+    return True
+
+
+def convert_column_to_codec(table: str, key_columns, codec, batch_size: int = 1000) -> int:
+    """Re-encode `table.embedding` into a BYTEA column, batch by batch, then swap it in."""
+    keys = ", ".join(key_columns)
+    key_match = " AND ".join(f"{column} = :{column}" for column in key_columns)
+    converted = 0
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS embedding_encoded BYTEA"))
+
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(f"""
+                SELECT {keys}, embedding::text AS embedding FROM {table}
+                WHERE embedding_encoded IS NULL AND embedding IS NOT NULL
+                  AND embedding::text <> 'null'
+                LIMIT :limit
+            """), {"limit": batch_size}).mappings().all()
+            if not rows:
+                break
+            conn.execute(
+                text(f"UPDATE {table} SET embedding_encoded = :blob WHERE {key_match}").bindparams(
+                    *[bindparam(column) for column in key_columns]
+                ),
+                [
+                    {**{column: row[column] for column in key_columns},
+                     "blob": codec.encode(json.loads(row["embedding"]))}
+                    for row in rows
+                ]
+            )
+            converted += len(rows)
+            print(f"   {table}: {converted} rows encoded", end="\r")
+
+    with engine.begin() as conn:
+        nullable = conn.execute(text("""
+            SELECT is_nullable FROM information_schema.columns
+            WHERE table_name = :table AND column_name = 'embedding'
+        """), {"table": table}).scalar() == "YES"
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN embedding"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN embedding_encoded TO embedding"))
+        # The new column is nullable; keep the constraint the old one had (chunk_embeddings)
+        if not nullable:
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN embedding SET NOT NULL"))
+    print()
+    return converted
+
+
+def migrate_codec():
+    """Convert JSON (or vector) embedding columns to compact BYTEA using EMBEDDING_CODEC."""
+    if settings.embedding_codec.lower() == "json":
+        print("❌ Set EMBEDDING_CODEC to float32, float16 or int8 first.")
+        return False
+    codec = get_codec(settings.embedding_codec)
+
+    targets = [
+        ("document_chunks", ["id"]),
+        ("chunk_embeddings", ["content_hash", "model"]),
+    ]
+    with engine.connect() as conn:
+        types = {table: column_type(conn, table, "embedding") for table, _ in targets}
+
+    for table, key_columns in targets:
+        current = types[table]
+        if current is None:
+            print(f"⚠️  {table} has no embedding column, skipping")
+            continue
+        if current == "bytea":
+            print(f"✅ {table}.embedding is already BYTEA")
+            continue
+        print(f"🔄 Encoding {table}.embedding ({current} -> {codec.name} BYTEA)...")
+        converted = convert_column_to_codec(table, key_columns, codec)
+        print(f"✅ Converted {converted} rows")
+
+    print(f"\nKeep EMBEDDING_CODEC={codec.name} in .env and restart the service.")
+    return True
+
+
+def migrate_metadata():
+    """Index the chunk metadata fields that retrieval filters on."""
+    with engine.begin() as conn:
+        for field in METADATA_FIELDS:
+            print(f"🔍 Indexing metadata ->> '{field}'...")
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS document_chunks_{field}_idx "
+                f"ON document_chunks ((metadata ->> '{field}'))"
+            ))
+        conn.execute(text("ANALYZE document_chunks"))
+    print("✅ Indexes ready")
+
+    print("\nRe-upload JSON Q&A datasets so their chunks carry category and intent.")
+    return True
+
+
+MIGRATIONS = {
+    "pgvector": migrate_pgvector,
+    "content-hash": migrate_content_hash,
+    "codec": migrate_codec,
+    "metadata": migrate_metadata,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run FILIR ChatBot database migrations")
+    parser.add_argument("migration", choices=sorted(MIGRATIONS), help="Migration to apply")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"FILIR ChatBot - Migration: {args.migration}")
+    print("=" * 60)
+
+    try:
+        success = MIGRATIONS[args.migration]()
+    except Exception as e:
+        print(f"❌ Migration failed: {e}")
+        success = False
+
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
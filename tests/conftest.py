@@ -0,0 +1,71 @@
+import asyncio
+import os
+import sys
+import numpy as np
+import pytest
+
+# Settings are read at import time; tests never reach OpenAI or PostgreSQL
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def embedding(seed: int, dimensions: int = 16) -> list:
+    return np.random.default_rng(seed).normal(size=dimensions).tolist()
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    """Async URL of a fresh SQLite database with every table created."""
+    from sqlalchemy import create_engine
+    from app.database import Base
+    import app.models  # noqa: F401  (registers the tables)
+
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+    return f"sqlite+aiosqlite:///{path}"
+
+
+@pytest.fixture
+def run(database_url):
+    """Run `scenario(session_factory)` in a fresh event loop against the test database."""
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    def run_scenario(scenario) -> None:
+        async def main():
+            engine = create_async_engine(database_url)
+            try:
+                await scenario(async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False))
+            finally:
+                await engine.dispose()
+        asyncio.run(main())
+    return run_scenario
+
+
+@pytest.fixture
+def add_document():
+    """
+    `await add_document(session_factory, name, count, metadata)` commits chunks
+    of a document, as any worker's ingest would; `metadata(index)` gives each
+    chunk's metadata.
+    """
+    from app.models import DocumentChunk
+
+    async def add(session_factory, name: str, count: int, metadata=None) -> list:
+        async with session_factory() as db:
+            chunks = [
+                DocumentChunk(
+                    document_name=name,
+                    chunk_text=f"{name} chunk {index}",
+                    chunk_index=index,
+                    embedding=embedding(sum(map(ord, name)) * 1000 + index),
+                    doc_metadata=metadata(index) if metadata else {}
+                )
+                for index in range(count)
+            ]
+            db.add_all(chunks)
+            await db.commit()
+            return chunks
+    return add
@@ -0,0 +1,110 @@
+import pytest
+from app.config import get_settings
+from app.services.faq_index import FAQEntry, FAQIndex, identifiers, normalize_question
+
+
+@pytest.fixture(autouse=True)
+def always_check(monkeypatch):
+    monkeypatch.setattr(get_settings(), "vector_index_refresh_seconds", 0)
+
+
+def entry(chunk_id: int, question: str, answer: str, category: str = None) -> FAQEntry:
+    return FAQEntry(chunk_id, "faq.json", question, answer, {"file_type": "json", "category": category, "intent": None})
+
+
+def make_index(*entries: FAQEntry) -> FAQIndex:
+    index = FAQIndex(threshold=0.85)
+    rows = [
+        (item.chunk_id, item.document_name, {"question": item.question, "answer": item.answer, **item.fields})
+        for item in entries
+    ]
+    index._state = index._build(index._state, rows)
+    return index
+
+
+def qa(index: int) -> dict:
+    return {"question": f"What is form {index}?", "answer": f"Form {index} is a form."}
+
+
+def test_exact_lookup_ignores_case_punctuation_and_whitespace():
+    index = make_index(entry(1, "How do I reset my password?", "Use the reset link."))
+    match = index.lookup("  how do I RESET my password!! ")
+    assert match.exact and match.entry.chunk_id == 1 and match.similarity == 1.0
+
+
+def test_near_lookup_accepts_typos():
+    index = make_index(entry(1, "Can I log in before verifying my email?", "No."))
+    match = index.lookup("Can I log in before verifying my emal?")
+    assert match is not None and not match.exact
+    assert match.similarity >= 0.85
+
+
+def test_near_lookup_requires_identifiers_to_match():
+    index = make_index(entry(1, "How long does it take to process form I-130?", "About 12 months."))
+    assert index.lookup("How long does it take to process form I-131?") is None
+    assert index.lookup("How long does it take to process form I-130").entry.chunk_id == 1
+
+
+def test_identifiers():
+    assert identifiers(normalize_question("Form I-130 vs. W2 in 2024?")) == {"130", "w2", "2024"}
+
+
+def test_lookup_respects_filters():
+    index = make_index(entry(1, "What are the office hours?", "9 to 5.", category="general"))
+    assert index.lookup("What are the office hours?", {"category": ["billing"]}) is None
+    assert index.lookup("What are the office hours?", {"category": ["general"]}) is not None
+
+
+def test_miss_and_stats():
+    index = make_index(entry(1, "What are the office hours?", "9 to 5."))
+    assert index.lookup("Something unrelated entirely") is None
+    assert index.stats()["misses"] == 1
+
+
+def test_reloads_after_another_workers_commit(run, add_document):
+    async def scenario(session_factory):
+        index = FAQIndex(threshold=0.85)
+        await add_document(session_factory, "faq.json", 2, qa)
+        await add_document(session_factory, "notes.pdf", 2)
+        async with session_factory() as db:
+            assert await index.load(db) == 2
+
+        foreign = await add_document(session_factory, "more.json", 1, lambda i: qa(10 + i))
+        async with session_factory() as db:
+            await index.ensure_fresh(db)
+        assert len(index) == 3
+        assert index.lookup("What is form 10?").entry.chunk_id == foreign[0].id
+
+    run(scenario)
+
+
+def test_foreign_commit_before_own_ingest_still_reloads(run, add_document):
+    async def scenario(session_factory):
+        index = FAQIndex(threshold=0.85)
+        await add_document(session_factory, "faq.json", 2, qa)
+        async with session_factory() as db:
+            await index.load(db)
+
+        foreign = await add_document(session_factory, "more.json", 1, lambda i: qa(10 + i))
+        own = await add_document(session_factory, "own.json", 1, lambda i: qa(20 + i))
+        async with session_factory() as db:
+            await index.replace_document(db, "own.json", [own[0].id], [own[0].doc_metadata])
+            await index.ensure_fresh(db)
+        assert len(index) == 4
+        assert index.lookup("What is form 10?").entry.chunk_id == foreign[0].id
+
+    run(scenario)
+
+
+def test_replace_document_leaves_the_published_state_untouched(run):
+    async def scenario(session_factory):
+        index = make_index(entry(1, "What is form 1?", "Form 1 is a form."), entry(2, "What is form 2?", "Form 2."))
+        published = index._state
+        async with session_factory() as db:
+            await index.replace_document(db, "faq.json", [3], [qa(3)])
+        assert set(published.entries) == {1, 2} and published.signature == (2, 2)
+        assert index.lookup("What is form 1?") is None
+        assert index.lookup("What is form 3?").entry.chunk_id == 3
+        assert index.signature() == (1, 3)
+
+    run(scenario)
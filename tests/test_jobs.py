@@ -0,0 +1,137 @@
+import asyncio
+import io
+from datetime import timedelta
+import pytest
+from app.config import get_settings
+from app.models import IngestJob, utcnow
+from app.services import jobs
+from app.services.jobs import IngestJobQueue
+
+
+@pytest.fixture(autouse=True)
+def job_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "ingest_job_dir", str(tmp_path / "jobs"))
+
+
+async def submit(queue: IngestJobQueue, filename: str) -> IngestJob:
+    async with queue.session_factory() as db:
+        return await queue.submit(db, filename, io.BytesIO(b"# Title\n\nSome text."))
+
+
+async def fetch(queue: IngestJobQueue, job_id: str) -> IngestJob:
+    async with queue.session_factory() as db:
+        return await db.get(IngestJob, job_id)
+
+
+def test_claim_takes_oldest_queued_job_once(run):
+    async def scenario(session_factory):
+        queue = IngestJobQueue(session_factory)
+        first = await submit(queue, "a.md")
+        second = await submit(queue, "b.md")
+
+        claimed = await queue.claim()
+        assert claimed.id == first.id
+        assert (claimed.status, claimed.attempts, claimed.worker_id) == ("running", 1, queue.worker_id)
+        assert (await queue.claim()).id == second.id
+        assert await queue.claim() is None
+
+    run(scenario)
+
+
+def test_one_running_job_per_document(run):
+    async def scenario(session_factory):
+        queue = IngestJobQueue(session_factory)
+        first = await submit(queue, "a.md")
+        await submit(queue, "a.md")
+
+        assert (await queue.claim()).id == first.id
+        assert await queue.claim() is None
+        await queue.update(first.id, status="done", stage="done")
+        assert await queue.claim() is not None
+
+    run(scenario)
+
+
+def test_stale_running_job_is_claimed_again(run):
+    async def scenario(session_factory):
+        queue = IngestJobQueue(session_factory)
+        job = await submit(queue, "a.md")
+        await queue.claim()
+        assert await queue.claim() is None
+
+        stale = utcnow() - timedelta(seconds=get_settings().ingest_job_stale_seconds + 1)
+        await queue.update(job.id, heartbeat_at=stale)
+        reclaimed = await queue.claim()
+        assert (reclaimed.id, reclaimed.attempts) == (job.id, 2)
+
+    run(scenario)
+
+
+def test_cancelled_job_is_requeued(run, monkeypatch):
+    class BlockingIngestion:
+        async def ingest(self, *args, **kwargs):
+            started.set()
+            await asyncio.Event().wait()
+
+    monkeypatch.setattr(jobs, "IngestionService", BlockingIngestion)
+
+    async def scenario(session_factory):
+        nonlocal started
+        started = asyncio.Event()
+        queue = IngestJobQueue(session_factory)
+        job = await submit(queue, "a.md")
+        task = asyncio.create_task(queue.run(await queue.claim()))
+        await started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        requeued = await fetch(queue, job.id)
+        assert (requeued.status, requeued.stage) == ("queued", "queued")
+        assert (await queue.claim()).id == job.id
+
+    started = None
+    run(scenario)
+
+
+def test_failed_job_is_retried_until_max_attempts(run, monkeypatch):
+    class FailingIngestion:
+        async def ingest(self, *args, **kwargs):
+            raise RuntimeError("embedding service unavailable")
+
+    monkeypatch.setattr(jobs, "IngestionService", FailingIngestion)
+    monkeypatch.setattr(get_settings(), "ingest_job_max_attempts", 2)
+
+    async def scenario(session_factory):
+        queue = IngestJobQueue(session_factory)
+        job = await submit(queue, "a.md")
+        await queue.run(await queue.claim())
+        assert (await fetch(queue, job.id)).status == "queued"
+        await queue.run(await queue.claim())
+        failed = await fetch(queue, job.id)
+        assert (failed.status, failed.error) == ("failed", "embedding service unavailable")
+        assert await queue.claim() is None
+
+    run(scenario)
+
+
+def test_worker_survives_a_job_that_cannot_be_recorded(run, monkeypatch):
+    async def scenario(session_factory):
+        queue = IngestJobQueue(session_factory)
+        first = await submit(queue, "a.md")
+        second = await submit(queue, "b.md")
+        ran, done = [], asyncio.Event()
+
+        async def run_job(job):
+            ran.append(job.id)
+            if len(ran) == 1:
+                raise RuntimeError("database went away")
+            done.set()
+
+        monkeypatch.setattr(queue, "run", run_job)
+        queue.start(1)
+        await asyncio.wait_for(done.wait(), timeout=5)
+        await queue.stop()
+        assert ran == [first.id, second.id]
+
+    run(scenario)
@@ -0,0 +1,52 @@
+import pytest
+from app.config import get_settings
+from app.services.lexical_index import LexicalIndex
+
+
+@pytest.fixture(autouse=True)
+def always_check(monkeypatch):
+    monkeypatch.setattr(get_settings(), "vector_index_refresh_seconds", 0)
+
+
+def test_search_ranks_matching_chunks(run, add_document):
+    async def scenario(session_factory):
+        chunks = await add_document(session_factory, "a.pdf", 3)
+        index = LexicalIndex()
+        async with session_factory() as db:
+            assert await index.load(db) == 3
+        assert index.search("chunk 1", top_k=3)[0][0] == chunks[1].id
+
+    run(scenario)
+
+
+def test_reloads_after_another_workers_commit(run, add_document):
+    async def scenario(session_factory):
+        index = LexicalIndex()
+        await add_document(session_factory, "a.pdf", 2)
+        async with session_factory() as db:
+            await index.load(db)
+
+        foreign = await add_document(session_factory, "b.pdf", 2)
+        async with session_factory() as db:
+            await index.ensure_fresh(db)
+        assert len(index) == 4
+        assert index.search("b.pdf", top_k=1)[0][0] in {chunk.id for chunk in foreign}
+
+    run(scenario)
+
+
+def test_foreign_commit_before_own_ingest_still_reloads(run, add_document):
+    async def scenario(session_factory):
+        index = LexicalIndex()
+        await add_document(session_factory, "a.pdf", 2)
+        async with session_factory() as db:
+            await index.load(db)
+
+        await add_document(session_factory, "b.pdf", 2)
+        own = await add_document(session_factory, "c.pdf", 1)
+        async with session_factory() as db:
+            await index.replace_document(db, "c.pdf", [own[0].id], [own[0].chunk_text])
+            await index.ensure_fresh(db)
+        assert len(index) == 5
+
+    run(scenario)
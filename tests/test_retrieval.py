@@ -0,0 +1,22 @@
+import pytest
+from app.services.retrieval import reciprocal_rank_fusion
+
+
+def test_items_ranked_by_both_lists_win():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], [1.0, 1.0], k=60)
+    assert [item for item, _ in fused] == [1, 3, 2, 4]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_weights_scale_each_ranking():
+    fused = reciprocal_rank_fusion([[1, 2], [2, 1]], [1.0, 3.0], k=60)
+    assert [item for item, _ in fused] == [2, 1]
+
+
+def test_zero_weight_ranking_is_ignored():
+    fused = reciprocal_rank_fusion([[1, 2], [9]], [1.0, 0.0], k=60)
+    assert [item for item, _ in fused] == [1, 2]
+
+
+def test_empty_rankings():
+    assert reciprocal_rank_fusion([[], []], [1.0, 1.0]) == []
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from app.vector_codec import EncodedVector, get_codec
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(8, 64)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def test_float32_round_trip_is_lossless(vectors):
+    codec = get_codec("float32")
+    assert np.array_equal(codec.decode(codec.encode(vectors[0].tolist())), vectors[0])
+    decoded = codec.decode_many([codec.encode(vector) for vector in vectors])
+    assert np.array_equal(decoded, vectors)
+
+
+@pytest.mark.parametrize("name, tolerance", [("float16", 1e-3), ("int8", 2e-2)])
+def test_lossy_codecs_stay_close(vectors, name, tolerance):
+    codec = get_codec(name)
+    blobs = [codec.encode(vector) for vector in vectors]
+    decoded = codec.decode_many(blobs)
+    assert decoded.shape == vectors.shape
+    assert np.max(np.abs(decoded - vectors)) < tolerance
+    assert np.allclose(codec.decode(blobs[3]), decoded[3])
+    # Cosine similarity is what retrieval relies on
+    assert np.allclose(decoded @ vectors[0], vectors @ vectors[0], atol=tolerance)
+
+
+def test_smaller_codecs_use_fewer_bytes(vectors):
+    sizes = {name: len(get_codec(name).encode(vectors[0])) for name in ("float32", "float16", "int8")}
+    assert sizes["float32"] > sizes["float16"] > sizes["int8"]
+
+
+def test_encoded_vector_column_round_trip(vectors):
+    column = EncodedVector("float32")
+    blob = column.process_bind_param(vectors[0].tolist(), None)
+    assert np.array_equal(column.process_result_value(blob, None), vectors[0])
+    assert column.process_bind_param(None, None) is None
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        get_codec("bfloat3")
@@ -0,0 +1,110 @@
+import pytest
+from app.config import get_settings
+from app.services.vector_index import VectorIndex
+
+
+@pytest.fixture(autouse=True)
+def always_check(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "vector_index_refresh_seconds", 0)
+    monkeypatch.setattr(settings, "vector_snapshot_enabled", False)
+
+
+def test_search_returns_most_similar_chunks(run, add_document):
+    async def scenario(session_factory):
+        chunks = await add_document(session_factory, "a.pdf", 5)
+        index = VectorIndex()
+        async with session_factory() as db:
+            assert await index.load(db) == 5
+
+        results = index.search(chunks[2].embedding, top_k=3)
+        assert len(results) == 3
+        assert results[0][0] == chunks[2].id
+        assert results[0][1] == pytest.approx(1.0)
+        assert [score for _, score in results] == sorted((score for _, score in results), reverse=True)
+
+    run(scenario)
+
+
+def test_reloads_after_another_workers_commit(run, add_document):
+    async def scenario(session_factory):
+        index = VectorIndex()
+        await add_document(session_factory, "a.pdf", 3)
+        async with session_factory() as db:
+            await index.load(db)
+
+        foreign = await add_document(session_factory, "b.pdf", 2)
+        async with session_factory() as db:
+            await index.ensure_fresh(db)
+        assert len(index) == 5
+        assert index.search(foreign[0].embedding, top_k=1)[0][0] == foreign[0].id
+
+    run(scenario)
+
+
+def test_own_changes_do_not_reload(run, add_document, monkeypatch):
+    async def scenario(session_factory):
+        index = VectorIndex()
+        await add_document(session_factory, "a.pdf", 2)
+        async with session_factory() as db:
+            await index.load(db)
+
+        own = await add_document(session_factory, "b.pdf", 2)
+        async with session_factory() as db:
+            await index.replace_document(
+                db, "b.pdf", [chunk.id for chunk in own], [chunk.embedding for chunk in own]
+            )
+
+            async def fail(db):
+                raise AssertionError("reloaded")
+            monkeypatch.setattr(index, "load", fail)
+            await index.ensure_fresh(db)
+        assert len(index) == 4
+
+    run(scenario)
+
+
+def test_foreign_commit_before_own_ingest_still_reloads(run, add_document):
+    async def scenario(session_factory):
+        index = VectorIndex()
+        await add_document(session_factory, "a.pdf", 3)
+        async with session_factory() as db:
+            await index.load(db)
+
+        foreign = await add_document(session_factory, "b.pdf", 2)
+        own = await add_document(session_factory, "c.pdf", 1)
+        async with session_factory() as db:
+            await index.replace_document(db, "c.pdf", [own[0].id], [own[0].embedding])
+            await index.ensure_fresh(db)
+        assert len(index) == 6
+        assert index.search(foreign[0].embedding, top_k=1)[0][0] == foreign[0].id
+
+    run(scenario)
+
+
+def test_ivf_is_saved_after_training_and_on_save_but_not_per_ingest(run, add_document, monkeypatch, tmp_path):
+    settings = get_settings()
+    path = tmp_path / "vector_index.ivf.npz"
+    monkeypatch.setattr(settings, "vector_ann_enabled", True)
+    monkeypatch.setattr(settings, "vector_ann_min_vectors", 1)
+    monkeypatch.setattr(settings, "vector_ann_path", str(path))
+
+    async def scenario(session_factory):
+        index = VectorIndex()
+        await add_document(session_factory, "a.pdf", 8)
+        async with session_factory() as db:
+            await index.load(db)
+        assert path.exists()
+
+        path.unlink()
+        own = await add_document(session_factory, "b.pdf", 2)
+        async with session_factory() as db:
+            await index.replace_document(
+                db, "b.pdf", [chunk.id for chunk in own], [chunk.embedding for chunk in own]
+            )
+        assert not path.exists()
+
+        await index.save()
+        assert path.exists()
+
+    run(scenario)